@@ -1,24 +1,156 @@
 import json
 import re
-from typing import List, Dict, Any, Optional, Callable, Literal
+from types import SimpleNamespace
+from typing import List, Dict, Any, Awaitable, Optional, Callable, Literal, Set, Tuple
 from pydantic import BaseModel, Field
-from core.llm_clients import llm_client
-from app.modules.auto_generation.prompts import agent_generate_project_p1_system_prompt, agent_generate_project_p2_system_prompt, check_fix_mermaid_code_system_prompt, check_fix_mermaid_code_user_prompt, agent_generate_project_p3_system_prompt
+from core.llm_clients import async_llm_client
+from app.modules.auto_generation.prompts import build_repo_context_messages, agent_generate_project_p1_system_prompt, agent_generate_project_p2_system_prompt, check_fix_mermaid_code_system_prompt, check_fix_mermaid_code_user_prompt, agent_generate_project_p3_system_prompt, agent_describe_api_symbols_system_prompt
 from core.logger import logger_instance
 from core.config import settings
+from utils.repo_snapshot import RepoSnapshot
+from utils.file_content_cache import file_content_cache
+from utils.ingest_progress import ingest_progress
+from utils.mermaid_syntax import validate_mermaid
+from utils.mermaid_cache import mermaid_cache
+from app.modules.auto_generation.budget import AgentBudget, BudgetController, STOP_ITERATIONS, WRAP_UP_MESSAGE
+from app.modules.auto_generation.api_reference import (
+    SYMBOLS_PER_BATCH,
+    ApiSymbol,
+    build_api_symbols,
+    describe_prompt,
+    describe_response_format,
+    flatten,
+    overview_prompt,
+    render_api_reference,
+)
+from app.modules.auto_generation.service_definations import ParseDefinitionsService
 import os
 import asyncio
 
+
+# Identical for every agent: the tool list sits ahead of the messages in the cached prompt prefix
+READ_FILE_TOOL_SCHEMAS = [{
+    "type": "function",
+    "function": {
+        "name": "read_file",
+        "description": "Read the entire contents of a file given its path to get detailed information about it.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "The path to the file from the root of the repository to read like app/main.py or app/models.py."
+                }
+            },
+            "required": ["path"],
+            "additionalProperties": False
+        }
+    }
+}]
+
+
+async def _wrap_up_if_unfinished(
+    budget_controller: BudgetController,
+    full_messages: List[Dict[str, Any]],
+    **create_kwargs: Any,
+) -> None:
+    """
+    Make one final tool-less call when the loop stopped before the model gave its answer.
+
+    Appends the wrap-up turn to full_messages and records the stop reason on the controller.
+    """
+    last = full_messages[-1]
+    if last.get("role") == "assistant" and not last.get("tool_calls"):
+        budget_controller.finish()
+        return
+
+    budget_controller.stop_reason = budget_controller.stop_reason or STOP_ITERATIONS
+    full_messages.append({"role": "user", "content": WRAP_UP_MESSAGE})
+    resp = await async_llm_client.chat.completions.create(
+        messages=full_messages,
+        tool_choice="none",
+        **create_kwargs,
+    )
+    budget_controller.record(resp.usage)
+    full_messages.append(resp.choices[0].message.dict())
+    budget_controller.finish()
+
+
+async def _stream_completion(
+    on_delta: Callable[[str], None],
+    **create_kwargs: Any,
+) -> Tuple[Dict[str, Any], List[Any], Any]:
+    """
+    Run a streaming chat completion, forwarding content deltas as they arrive.
+
+    Args:
+        on_delta: Called with every content fragment
+        **create_kwargs: Arguments for chat.completions.create
+
+    Returns:
+        Tuple of (assistant message dict, tool calls, usage). Tool calls expose the same
+        ``id`` / ``function.name`` / ``function.arguments`` attributes as non-streamed ones.
+    """
+    stream = await async_llm_client.chat.completions.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **create_kwargs,
+    )
+    content_parts: List[str] = []
+    calls: Dict[int, Dict[str, str]] = {}
+    usage = None
+    async for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+            on_delta(delta.content)
+        for tool_call_delta in delta.tool_calls or []:
+            call = calls.setdefault(tool_call_delta.index, {"id": "", "name": "", "arguments": ""})
+            if tool_call_delta.id:
+                call["id"] = tool_call_delta.id
+            if tool_call_delta.function:
+                call["name"] += tool_call_delta.function.name or ""
+                call["arguments"] += tool_call_delta.function.arguments or ""
+
+    tool_calls = [
+        SimpleNamespace(id=call["id"], function=SimpleNamespace(name=call["name"], arguments=call["arguments"]))
+        for _, call in sorted(calls.items())
+    ]
+    assistant_msg: Dict[str, Any] = {"role": "assistant", "content": "".join(content_parts) or None}
+    if tool_calls:
+        assistant_msg["tool_calls"] = [
+            {"id": call.id, "type": "function", "function": {"name": call.function.name, "arguments": call.function.arguments}}
+            for call in tool_calls
+        ]
+    return assistant_msg, tool_calls, usage
+
+
 class P1Agent:
+    DEFAULT_BUDGET = {"max_tokens": 400_000, "max_cost_usd": 0.50, "max_seconds": 240}
+
     def __init__(
         self,
         cursory_explanation: str,
         repo_hash: str,
         max_iterations: int = 10,
         repo_type: Literal["application", "library", "service"] = "application",
+        snapshot: Optional[RepoSnapshot] = None,
+        commit_hash: Optional[str] = None,
+        budget: Optional[AgentBudget] = None,
     ):
         self.repo_hash = repo_hash
-        self.max_iterations = max(max_iterations, self._get_file_count())
+        self.commit_hash = commit_hash
+        self.snapshot = snapshot
+        self.budget = budget or AgentBudget(**self.DEFAULT_BUDGET)
+        self.budget_controller: Optional[BudgetController] = None
+        # Repo-relative paths requested through read_file, recorded as this section's inputs
+        self.files_read: Set[str] = set()
+        # Scale with repo size, but never past the budget's iteration cap
+        self.max_iterations = max(max_iterations, min(self._get_file_count(), self.budget.max_iterations))
         self.repo_type = repo_type
         self.cursory_explanation = cursory_explanation
         self.output_model = self._get_output_model()
@@ -30,6 +162,8 @@ class P1Agent:
         '''
         Get the number of files in the repository recursively.
         '''
+        if self.snapshot is not None:
+            return self.snapshot.file_count
         path = settings.PARENT_DIR + "/" + self.repo_hash
         count = 0
         for _, _ , files in os.walk(path):
@@ -37,25 +171,7 @@ class P1Agent:
         return count
 
     def _get_tool_schemas(self) -> List[Dict[str, Any]]:
-
-        return [{
-            "type": "function",
-            "function": {
-                "name": "read_file",
-                "description": "Read the entire contents of a file given its path to get detailed infomation about it.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "The path to the file from the root of the repository to read like app/main.py or app/models.py."
-                        }
-                    },
-                    "required": ["path"],
-                    "additionalProperties": False
-                }
-            }
-        }]
+        return READ_FILE_TOOL_SCHEMAS
 
     def _get_output_model(self) -> Dict[str, Any]:
         if self.repo_type == "application":
@@ -128,13 +244,9 @@ class P1Agent:
 
 
     def _get_structure_instructions(self) -> str:
-        base_instruction = f"""
-Here is the cursory explanation of the project:
-
-Project Structure and File Roles:
-```
-{self.cursory_explanation}
-```
+        # The project structure itself is in the shared repo context prefix
+        base_instruction = """
+Use the project structure and file roles given above.
 """
         if self.repo_type == "application":
             return base_instruction + """
@@ -172,13 +284,13 @@ The JSON object must have the following structure:
 
         if tool_name == "read_file":
             path = os.path.join(self.repo_path, args.get("path"))
+            self.files_read.add(os.path.normpath(args.get("path")).replace(os.sep, "/").lstrip("/"))
             self.logger.info(f"Reading file: {path}")
             try:
-                # Wrap synchronous file read in asyncio.to_thread for async execution
-                def read_file_sync():
-                    with open(path, 'r', encoding='utf-8') as file:
-                        return file.read()
-                result = await asyncio.to_thread(read_file_sync)
+                # Served from the shared per-commit cache; disk reads run in a worker thread
+                result = await asyncio.to_thread(
+                    file_content_cache.read_text, self.repo_hash, self.commit_hash, self.repo_path, args.get("path")
+                )
             except FileNotFoundError:
                 self.logger.error(f"File not found at path: {path}")
                 result = f"Error: File not found at path '{path}'."
@@ -203,19 +315,27 @@ The JSON object must have the following structure:
         system_msg = {"role": "system", "content": system_content}
         messages = [{"role": "user", "content": structure_instructions}]
         # messages[0]["content"] = messages[0]["content"] + "\n\nALWAYS USE THE TOOLS TO GET THE INFORMATION YOU NEED."
-        full_messages = [system_msg] + messages
+        # Shared repo context first so the provider can serve it from the prompt cache
+        full_messages = build_repo_context_messages(self.cursory_explanation) + [system_msg] + messages
         # print("FORCING TOOL CALLS FOR TESTING")
 
+        self.budget_controller = BudgetController(agent_name="p1", model="gpt-5-mini", budget=self.budget)
         iteration = 0
         while iteration < self.max_iterations:
+            stop_reason = self.budget_controller.stop_reason_for_next_turn()
+            if stop_reason:
+                self.budget_controller.stop_reason = stop_reason
+                break
             iteration += 1
+            self.budget_controller.compact(full_messages)
 
-            resp = llm_client.chat.completions.create(
+            resp = await async_llm_client.chat.completions.create(
                 model="gpt-5-mini",
                 messages=full_messages,
                 tools=self.tool_schemas,
                 response_format=self.output_model,
             )
+            self.budget_controller.record(resp.usage)
 
             choice = resp.choices[0]
             assistant_msg = choice.message.dict()
@@ -240,6 +360,14 @@ The JSON object must have the following structure:
             
             full_messages.extend(tool_msgs)
 
+        await _wrap_up_if_unfinished(
+            self.budget_controller,
+            full_messages,
+            model="gpt-5-mini",
+            tools=self.tool_schemas,
+            response_format=self.output_model,
+        )
+
         # Parse the final assistant message
         final_msg = full_messages[-1]
         if final_msg.get("role") == "assistant" and "content" in final_msg:
@@ -254,14 +382,26 @@ The JSON object must have the following structure:
 
 
 class P2Agent:
+    DEFAULT_BUDGET = {"max_tokens": 600_000, "max_cost_usd": 1.00, "max_seconds": 480}
+
     def __init__(
         self,
         cursory_explanation: str,
         repo_hash: str,
         max_iterations: int = 10,
+        snapshot: Optional[RepoSnapshot] = None,
+        commit_hash: Optional[str] = None,
+        budget: Optional[AgentBudget] = None,
     ):
         self.repo_hash = repo_hash
-        self.max_iterations = max(max_iterations, self._get_file_count())
+        self.commit_hash = commit_hash
+        self.snapshot = snapshot
+        self.budget = budget or AgentBudget(**self.DEFAULT_BUDGET)
+        self.budget_controller: Optional[BudgetController] = None
+        # Repo-relative paths requested through read_file, recorded as this section's inputs
+        self.files_read: Set[str] = set()
+        # Scale with repo size, but never past the budget's iteration cap
+        self.max_iterations = max(max_iterations, min(self._get_file_count(), self.budget.max_iterations))
         self.cursory_explanation = cursory_explanation
         self.output_model = {"type": "text"}
         self.tool_schemas = self._get_tool_schemas()
@@ -272,6 +412,8 @@ class P2Agent:
         '''
         Get the number of files in the repository recursively.
         '''
+        if self.snapshot is not None:
+            return self.snapshot.file_count
         path = settings.PARENT_DIR + "/" + self.repo_hash
         count = 0
         for _, _ , files in os.walk(path):
@@ -279,33 +421,12 @@ class P2Agent:
         return count
 
     def _get_tool_schemas(self) -> List[Dict[str, Any]]:
-        return [{
-            "type": "function",
-            "function": {
-                "name": "read_file",
-                "description": "Read the entire contents of a file given its path to get detailed infomation about it.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "The path to the file from the root of the repository to read like app/main.py or app/models.py."
-                        }
-                    },
-                    "required": ["path"],
-                    "additionalProperties": False
-                }
-            }
-        }]
+        return READ_FILE_TOOL_SCHEMAS
 
     def _get_structure_instructions(self) -> str:
-        base_instruction = f"""
-Here is the cursory explanation of the project:
-
-Project Structure and File Roles:
-```
-{self.cursory_explanation}
-```
+        # The project structure itself is in the shared repo context prefix
+        base_instruction = """
+Use the project structure and file roles given above.
 """
         return base_instruction + """
 You need to identify the core concepts of this repository. 
@@ -357,12 +478,12 @@ Focus on unique aspects of this repository.
 
         if tool_name == "read_file":
             path = os.path.join(self.repo_path, args.get("path"))
+            self.files_read.add(os.path.normpath(args.get("path")).replace(os.sep, "/").lstrip("/"))
             self.logger.info(f"Reading file: {path}")
             try:
-                def read_file_sync():
-                    with open(path, 'r', encoding='utf-8') as file:
-                        return file.read()
-                result = await asyncio.to_thread(read_file_sync)
+                result = await asyncio.to_thread(
+                    file_content_cache.read_text, self.repo_hash, self.commit_hash, self.repo_path, args.get("path")
+                )
             except FileNotFoundError:
                 self.logger.error(f"File not found at path: {path}")
                 result = f"Error: File not found at path '{path}'."
@@ -386,32 +507,39 @@ Focus on unique aspects of this repository.
         structure_instructions = self._get_structure_instructions()
         system_msg = {"role": "system", "content": system_content}
         messages = [{"role": "user", "content": structure_instructions}]
-        full_messages = [system_msg] + messages
+        # Shared repo context first so the provider can serve it from the prompt cache
+        full_messages = build_repo_context_messages(self.cursory_explanation) + [system_msg] + messages
 
+        self.budget_controller = BudgetController(agent_name="p2", model="gpt-5-mini", budget=self.budget)
         iteration = 0
         while iteration < self.max_iterations:
+            stop_reason = self.budget_controller.stop_reason_for_next_turn()
+            if stop_reason:
+                self.budget_controller.stop_reason = stop_reason
+                break
             iteration += 1
+            self.budget_controller.compact(full_messages)
 
-            resp = llm_client.chat.completions.create(
+            # Streamed so the markdown reaches progress subscribers as it is written
+            assistant_msg, tool_calls, usage = await _stream_completion(
+                lambda delta: ingest_progress.publish(self.repo_hash, "agent_delta", agent="p2", iteration=iteration, delta=delta),
                 model="gpt-5-mini",
                 messages=full_messages,
                 tools=self.tool_schemas,
                 response_format=self.output_model,
             )
-
-            choice = resp.choices[0]
-            assistant_msg = choice.message.dict()
+            self.budget_controller.record(usage)
             full_messages.append(assistant_msg)
 
-            if not choice.message.tool_calls:
+            if not tool_calls:
                 break
 
-            tool_call_tasks = [self._execute_tool_call(tool_call) for tool_call in choice.message.tool_calls]
+            tool_call_tasks = [self._execute_tool_call(tool_call) for tool_call in tool_calls]
             tool_msgs = await asyncio.gather(*tool_call_tasks, return_exceptions=True)
             
             for i, tool_msg in enumerate(tool_msgs):
                 if isinstance(tool_msg, Exception):
-                    tool_call = choice.message.tool_calls[i]
+                    tool_call = tool_calls[i]
                     tool_msgs[i] = {
                         "role": "tool",
                         "tool_call_id": tool_call.id,
@@ -420,17 +548,30 @@ Focus on unique aspects of this repository.
             
             full_messages.extend(tool_msgs)
 
+        await _wrap_up_if_unfinished(
+            self.budget_controller,
+            full_messages,
+            model="gpt-5-mini",
+            tools=self.tool_schemas,
+            response_format=self.output_model,
+        )
+
         final_msg = full_messages[-1]
         if final_msg.get("role") == "assistant" and "content" in final_msg:
             return final_msg["content"]
         else:
             return "No valid response generated."
 
-    async def _llm_mermaid_code_fixing(self, mermaid_code: str) -> str:
+    async def _llm_mermaid_code_fixing(self, mermaid_code: str, error_message: Optional[str] = None) -> str:
         """Fix a single Mermaid code snippet by calling the LLM to validate and correct it."""
+        cached_fix = await mermaid_cache.get_fix(mermaid_code)
+        if cached_fix:
+            self.logger.info("Mermaid fix served from cache")
+            return cached_fix
         try:
             system_content = check_fix_mermaid_code_system_prompt
-            user_content = check_fix_mermaid_code_user_prompt + """\n\n  **IMPORTANT STYLING REQUIREMENTS:**
+            validation_errors = f"\n\nThe diagram currently fails validation with:\n```\n{error_message}\n```" if error_message else ""
+            user_content = check_fix_mermaid_code_user_prompt + validation_errors + """\n\n  **IMPORTANT STYLING REQUIREMENTS:**
 - Use high-contrast colors for maximum readability
 - Add step numbers to show process flow sequence
 - Use descriptive labels that are easy to understand
@@ -456,7 +597,7 @@ Provide only the Mermaid diagram code, properly formatted and functional with en
             system_msg = {"role": "system", "content": system_content}
             user_msg = {"role": "user", "content": user_content}
             messages = [system_msg, user_msg]
-            resp = llm_client.chat.completions.create(
+            resp = await async_llm_client.chat.completions.create(
                 model="anthropic/claude-sonnet-4.5",
                 messages=messages,
             )
@@ -465,7 +606,11 @@ Provide only the Mermaid diagram code, properly formatted and functional with en
             # Clean the response to remove any ```mermaid tags
             cleaned_code = re.sub(r'^```mermaid\s*\n?', '', raw_content, flags=re.MULTILINE | re.IGNORECASE)
             cleaned_code = re.sub(r'\n?```\s*$', '', cleaned_code, flags=re.MULTILINE | re.IGNORECASE)
-            return cleaned_code.strip()
+            cleaned_code = cleaned_code.strip()
+            # Only remember fixes that pass validation; otherwise the next run tries again
+            if validate_mermaid(cleaned_code).is_valid:
+                await mermaid_cache.set_fix(mermaid_code, cleaned_code)
+            return cleaned_code
         except Exception as e:
             self.logger.error(f"Error checking and fixing mermaid code: {e}")
             return mermaid_code
@@ -474,8 +619,9 @@ Provide only the Mermaid diagram code, properly formatted and functional with en
         """
         Check and fix all Mermaid code blocks in the provided content.
         
-        Extracts Mermaid blocks using regex, fixes each inner code snippet in parallel via LLM,
-        and replaces the original blocks precisely to avoid corrupting surrounding text.
+        Extracts Mermaid blocks using regex and validates each one offline. Only blocks that
+        fail validation are sent to the LLM fixer (in parallel); the original blocks are
+        replaced precisely to avoid corrupting surrounding text.
         
         Args:
             content (str): The input content potentially containing Mermaid blocks.
@@ -491,10 +637,21 @@ Provide only the Mermaid diagram code, properly formatted and functional with en
         # Extract inner codes
         inners = [m.group(1) for m in matches]
 
-        # Fix inners in parallel
-        fixed_inners = await asyncio.gather(
-            *[self._llm_mermaid_code_fixing(inner) for inner in inners]
+        # Fix only the blocks that fail validation, in parallel
+        validations = [validate_mermaid(inner) for inner in inners]
+        broken = [i for i, result in enumerate(validations) if not result.is_valid]
+        self.logger.info(f"Mermaid blocks: {len(inners)} found, {len(broken)} failing validation")
+        if not broken:
+            return content
+
+        fixes = await asyncio.gather(
+            *[self._llm_mermaid_code_fixing(inners[i], validations[i].error_message) for i in broken]
         )
+        fixed_inners = list(inners)
+        for i, fixed in zip(broken, fixes):
+            if not validate_mermaid(fixed).is_valid:
+                self.logger.warning(f"Mermaid block {i} still fails validation after fixing")
+            fixed_inners[i] = fixed
 
         # Reconstruct content with fixed blocks
         parts = []
@@ -517,15 +674,42 @@ Provide only the Mermaid diagram code, properly formatted and functional with en
         return ''.join(parts)
 
 class P3Agent:
+    """
+    Writes the API documentation / reference section.
+
+    The skeleton (documented symbols, signatures, module and class structure) is rendered
+    from the definitions index and the LLM only writes per-symbol descriptions, in batched
+    calls. When the index is unusable the agent falls back to reading files with read_file.
+    """
+
+    DEFAULT_BUDGET = {"max_tokens": 600_000, "max_cost_usd": 1.00, "max_seconds": 480}
+
     def __init__(
         self,
         cursory_explanation: str,
         repo_hash: str,
         max_iterations: int = 10,
         repo_type: Literal["application", "library", "service"] = "application",
+        snapshot: Optional[RepoSnapshot] = None,
+        commit_hash: Optional[str] = None,
+        budget: Optional[AgentBudget] = None,
+        definitions_service: Optional[ParseDefinitionsService] = None,
+        definitions_ready: Optional[Awaitable[bool]] = None,
+        describe_concurrency: int = 4,
     ):
         self.repo_hash = repo_hash
-        self.max_iterations = max(max_iterations, self._get_file_count())
+        self.definitions_service = definitions_service
+        # Resolves to whether the definitions index was brought up to date with the checkout
+        self.definitions_ready = definitions_ready
+        self.describe_concurrency = describe_concurrency
+        self.commit_hash = commit_hash
+        self.snapshot = snapshot
+        self.budget = budget or AgentBudget(**self.DEFAULT_BUDGET)
+        self.budget_controller: Optional[BudgetController] = None
+        # Repo-relative paths requested through read_file, recorded as this section's inputs
+        self.files_read: Set[str] = set()
+        # Scale with repo size, but never past the budget's iteration cap
+        self.max_iterations = max(max_iterations, min(self._get_file_count(), self.budget.max_iterations))
         self.repo_type = repo_type
         self.cursory_explanation = cursory_explanation
         self.output_model = {"type": "text"}
@@ -537,6 +721,8 @@ class P3Agent:
         '''
         Get the number of files in the repository recursively.
         '''
+        if self.snapshot is not None:
+            return self.snapshot.file_count
         path = settings.PARENT_DIR + "/" + self.repo_hash
         count = 0
         for _, _ , files in os.walk(path):
@@ -544,33 +730,12 @@ class P3Agent:
         return count
 
     def _get_tool_schemas(self) -> List[Dict[str, Any]]:
-        return [{
-            "type": "function",
-            "function": {
-                "name": "read_file",
-                "description": "Read the entire contents of a file given its path to get detailed information about it.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "path": {
-                            "type": "string",
-                            "description": "The path to the file from the root of the repository to read like app/main.py or app/models.py."
-                        }
-                    },
-                    "required": ["path"],
-                    "additionalProperties": False
-                }
-            }
-        }]
+        return READ_FILE_TOOL_SCHEMAS
 
     def _get_structure_instructions(self) -> str:
-        base_instruction = f"""
-Here is the cursory explanation of the project:
-
-Project Structure and File Roles:
-```
-{self.cursory_explanation}
-```
+        # The project structure itself is in the shared repo context prefix
+        base_instruction = """
+Use the project structure and file roles given above.
 """
         if self.repo_type == "application":
             return base_instruction + """
@@ -626,12 +791,12 @@ Output starting with # API Documentation. Focus on files that are likely to be r
 
         if tool_name == "read_file":
             path = os.path.join(self.repo_path, args.get("path"))
+            self.files_read.add(os.path.normpath(args.get("path")).replace(os.sep, "/").lstrip("/"))
             self.logger.info(f"Reading file: {path}")
             try:
-                def read_file_sync():
-                    with open(path, 'r', encoding='utf-8') as file:
-                        return file.read()
-                result = await asyncio.to_thread(read_file_sync)
+                result = await asyncio.to_thread(
+                    file_content_cache.read_text, self.repo_hash, self.commit_hash, self.repo_path, args.get("path")
+                )
             except FileNotFoundError:
                 self.logger.error(f"File not found at path: {path}")
                 result = f"Error: File not found at path '{path}'."
@@ -651,22 +816,137 @@ Output starting with # API Documentation. Focus on files that are likely to be r
             }
 
     async def run(self) -> str:
+        reference = await self._run_from_definitions()
+        if reference is not None:
+            return reference
+        return await self._run_agentic()
+
+    async def _run_from_definitions(self) -> Optional[str]:
+        """
+        Render the API reference from the definitions index, asking the LLM only for prose.
+
+        Returns:
+            The markdown document, or None when the index cannot be used (refresh failed,
+            no supported language or no public symbols)
+        """
+        if self.definitions_service is None:
+            return None
+        try:
+            # Shielded: a P3 timeout must not cancel the refresh the intro also waits for
+            if self.definitions_ready is not None and not await asyncio.shield(self.definitions_ready):
+                self.logger.info(f"Definitions of {self.repo_hash} not refreshed; P3 reads files instead")
+                return None
+            definitions = await self.definitions_service.get_documented_definitions(self.repo_hash)
+            symbols, omitted = build_api_symbols(definitions, self.repo_type)
+            if not symbols:
+                self.logger.info(f"No public definitions for {self.repo_hash}; P3 reads files instead")
+                return None
+            flat = flatten(symbols)
+            snippets = await self.definitions_service.get_code_snippets([symbol.definition_id for symbol in flat])
+            parsed_files = await self.definitions_service.get_parsed_files(self.repo_hash)
+        except Exception as e:
+            self.logger.error(f"Definitions index unavailable for P3 of {self.repo_hash}: {e}")
+            return None
+
+        # Which symbols are documented depends on every indexed file (a change can add, drop
+        # or move a public symbol anywhere), not only on the files rendered this time
+        self.files_read.update(parsed_files)
+
+        self.budget_controller = BudgetController(agent_name="p3", model="gpt-5-mini", budget=self.budget)
+        # Shared repo context first so the provider can serve it from the prompt cache
+        context = build_repo_context_messages(self.cursory_explanation) + [
+            {"role": "system", "content": agent_describe_api_symbols_system_prompt}
+        ]
+        semaphore = asyncio.Semaphore(self.describe_concurrency)
+        batches = [flat[i:i + SYMBOLS_PER_BATCH] for i in range(0, len(flat), SYMBOLS_PER_BATCH)]
+        overview, *_ = await asyncio.gather(
+            self._describe_overview(context, symbols, semaphore),
+            *[self._describe_batch(context, batch, snippets, semaphore) for batch in batches],
+        )
+        self.budget_controller.finish()
+        described = sum(1 for symbol in flat if symbol.description)
+        self.logger.info(
+            f"P3 rendered {len(flat)} symbols of {self.repo_hash} from definitions "
+            f"({described} described in {len(batches)} batches, {omitted} omitted)"
+        )
+        return render_api_reference(symbols, self.repo_type, overview=overview, omitted=omitted)
+
+    def _take_turn(self) -> bool:
+        stop_reason = self.budget_controller.stop_reason_for_next_turn()
+        if stop_reason:
+            self.budget_controller.stop_reason = stop_reason
+            return False
+        return True
+
+    async def _describe_batch(
+        self,
+        context: List[Dict[str, Any]],
+        batch: List[ApiSymbol],
+        snippets: Dict[Any, str],
+        semaphore: asyncio.Semaphore,
+    ) -> None:
+        """Fill in the descriptions of one batch of symbols; left empty if the call fails or the budget is spent."""
+        async with semaphore:
+            if not self._take_turn():
+                return
+            try:
+                resp = await async_llm_client.chat.completions.create(
+                    model="gpt-5-mini",
+                    messages=context + [{"role": "user", "content": describe_prompt(batch, snippets)}],
+                    response_format=describe_response_format(),
+                )
+                self.budget_controller.record(resp.usage)
+                for item in json.loads(resp.choices[0].message.content)["descriptions"]:
+                    if 0 <= item["id"] < len(batch):
+                        batch[item["id"]].description = item["description"]
+            except Exception as e:
+                self.logger.error(f"P3 description batch of {len(batch)} symbols failed: {e}")
+
+    async def _describe_overview(
+        self,
+        context: List[Dict[str, Any]],
+        symbols: List[ApiSymbol],
+        semaphore: asyncio.Semaphore,
+    ) -> Optional[str]:
+        async with semaphore:
+            if not self._take_turn():
+                return None
+            try:
+                resp = await async_llm_client.chat.completions.create(
+                    model="gpt-5-mini",
+                    messages=context + [{"role": "user", "content": overview_prompt(symbols, self.repo_type)}],
+                )
+                self.budget_controller.record(resp.usage)
+                return resp.choices[0].message.content
+            except Exception as e:
+                self.logger.error(f"P3 overview failed: {e}")
+                return None
+
+    async def _run_agentic(self) -> str:
         system_content = agent_generate_project_p3_system_prompt
         structure_instructions = self._get_structure_instructions()
         system_msg = {"role": "system", "content": system_content}
         messages = [{"role": "user", "content": structure_instructions}]
-        full_messages = [system_msg] + messages
+        # Shared repo context first so the provider can serve it from the prompt cache
+        full_messages = build_repo_context_messages(self.cursory_explanation) + [system_msg] + messages
 
+        self.budget_controller = BudgetController(agent_name="p3", model="gpt-5-mini", budget=self.budget)
         iteration = 0
         while iteration < self.max_iterations:
+            stop_reason = self.budget_controller.stop_reason_for_next_turn()
+            if stop_reason:
+                self.budget_controller.stop_reason = stop_reason
+                break
             iteration += 1
+            self.budget_controller.compact(full_messages)
 
-            resp = llm_client.chat.completions.create(
+            resp = await async_llm_client.chat.completions.create(
                 model="gpt-5-mini",
                 messages=full_messages,
                 tools=self.tool_schemas,
                 response_format=self.output_model,
             )
+            self.budget_controller.record(resp.usage)
 
             choice = resp.choices[0]
             assistant_msg = choice.message.dict()
@@ -689,6 +969,14 @@ Output starting with # API Documentation. Focus on files that are likely to be r
             
             full_messages.extend(tool_msgs)
 
+        await _wrap_up_if_unfinished(
+            self.budget_controller,
+            full_messages,
+            model="gpt-5-mini",
+            tools=self.tool_schemas,
+            response_format=self.output_model,
+        )
+
         final_msg = full_messages[-1]
         if final_msg.get("role") == "assistant" and "content" in final_msg:
             return final_msg["content"]
@@ -0,0 +1,269 @@
+"""
+Deterministic API reference skeleton for the P3 documentation section.
+
+Which symbols are documented, their signatures and the module/class structure all come
+from the definitions index; nothing is read from disk and no LLM decides the layout.
+The LLM is only asked for a short description of each symbol, many symbols per call
+(see ``P3Agent``), and ``render_api_reference`` fills them into the skeleton.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.modules.auto_generation.definitions_parser import EXTENSIONS
+from app.modules.auto_generation.repo_classifier import ROUTE_FILE_PATTERN
+
+
+# Above this many symbols the shallowest modules are documented and the rest are counted
+MAX_SYMBOLS = 300
+SYMBOLS_PER_BATCH = 25
+# Code sent along with a symbol when its description is requested
+MAX_EXCERPT_CHARS = 1500
+MAX_DOCSTRING_PROMPT_CHARS = 600
+
+TEST_FILE_PATTERN = re.compile(
+    r"(^|/)(tests?|__tests__|spec|testing|examples?|docs?|migrations)/"
+    r"|(^|/)(test_[^/]*|conftest)\.py$|_test\.(py|go)$|\.(test|spec)\.[jt]sx?$|Tests?\.java$"
+)
+
+TITLES = {
+    "application": "API Documentation",
+    "service": "API Documentation",
+    "library": "API Reference",
+}
+
+
+@dataclass
+class ApiSymbol:
+    """One documented class, function or method, with its members for classes."""
+
+    definition_id: Any
+    kind: str
+    name: str
+    qualified_name: str
+    path: str
+    line: int
+    signature: str
+    docstring: Optional[str] = None
+    members: List["ApiSymbol"] = field(default_factory=list)
+    description: Optional[str] = None
+
+
+def _repo_relative(file_name: str) -> str:
+    # Stored file names are prefixed with the repository name
+    return file_name.split("/", 1)[1] if "/" in file_name else file_name
+
+
+def _is_public(name: str, path: str) -> bool:
+    if name == "__init__":
+        return True
+    if not name or name.startswith("_") or name.startswith("#"):
+        return False
+    if path.endswith(".go"):
+        # Go exports by capitalization
+        return name[0].isupper()
+    return True
+
+
+def build_api_symbols(
+    definitions: Sequence[Dict[str, Any]],
+    repo_type: str,
+    max_symbols: int = MAX_SYMBOLS,
+) -> Tuple[List[ApiSymbol], int]:
+    """
+    Pick the symbols to document and nest methods under their classes.
+
+    Test, example and doc files, private names and functions local to other functions
+    are skipped. For applications and services only route/controller modules are
+    documented when there are any, since their handlers are the API; libraries document
+    every public module. Modules are taken shallowest first until ``max_symbols``.
+
+    Args:
+        definitions: Class and function definitions sorted by file and line, without code
+        repo_type: "application", "library" or "service"
+        max_symbols: Most symbols (members included) to document
+
+    Returns:
+        Tuple of (top-level symbols in module order, number of symbols left out)
+    """
+    by_file: Dict[str, List[Dict[str, Any]]] = {}
+    for definition in definitions:
+        path = _repo_relative(definition["file_name"])
+        if not TEST_FILE_PATTERN.search(path):
+            by_file.setdefault(path, []).append(definition)
+    if repo_type in ("application", "service"):
+        routes = {path: rows for path, rows in by_file.items() if ROUTE_FILE_PATTERN.search(path.lower())}
+        by_file = routes or by_file
+
+    symbols: List[ApiSymbol] = []
+    count = 0
+    omitted = 0
+    for path in sorted(by_file, key=lambda p: (p.count("/"), p)):
+        rows = sorted(by_file[path], key=lambda d: (d["start_end_lines"][0], -d["start_end_lines"][1]))
+        # Open scopes as (end line, class symbol); None marks a function or skipped class
+        scopes: List[Tuple[int, Optional[ApiSymbol]]] = []
+        for row in rows:
+            start, end = row["start_end_lines"][0], row["start_end_lines"][1]
+            while scopes and scopes[-1][0] < start:
+                scopes.pop()
+            parent = scopes[-1][1] if scopes else None
+            is_class = row["node_type"] == "class"
+            # Inside a function or a skipped class: local, not part of the API
+            if (scopes and parent is None) or not _is_public(row["node_name"], path):
+                scopes.append((end, None))
+                continue
+            if count >= max_symbols:
+                omitted += 1
+                scopes.append((end, None))
+                continue
+
+            symbol = ApiSymbol(
+                definition_id=row["_id"],
+                kind="class" if is_class else ("method" if parent is not None else "function"),
+                name=row["node_name"],
+                qualified_name=f"{parent.qualified_name}.{row['node_name']}" if parent is not None else row["node_name"],
+                path=path,
+                line=start,
+                signature=row.get("signature") or row["node_name"],
+                docstring=row.get("docstring"),
+            )
+            (parent.members if parent is not None else symbols).append(symbol)
+            count += 1
+            scopes.append((end, symbol if is_class else None))
+    return symbols, omitted
+
+
+def flatten(symbols: Sequence[ApiSymbol]) -> List[ApiSymbol]:
+    """Symbols and their members, depth first in document order."""
+    flat: List[ApiSymbol] = []
+    for symbol in symbols:
+        flat.append(symbol)
+        flat.extend(flatten(symbol.members))
+    return flat
+
+
+def describe_prompt(batch: Sequence[ApiSymbol], snippets: Dict[Any, str]) -> str:
+    """User prompt asking for the descriptions of one batch of symbols, keyed by index."""
+    items = []
+    for index, symbol in enumerate(batch):
+        code = snippets.get(symbol.definition_id, "")
+        if symbol.kind == "class" and symbol.members:
+            # The members are described on their own; the class header is enough here
+            code = code[: MAX_EXCERPT_CHARS // 3]
+        items.append({
+            "id": index,
+            "kind": symbol.kind,
+            "name": symbol.qualified_name,
+            "file": symbol.path,
+            "signature": symbol.signature,
+            "docstring": (symbol.docstring or "")[:MAX_DOCSTRING_PROMPT_CHARS],
+            "code": code[:MAX_EXCERPT_CHARS],
+        })
+    return (
+        "Write the description of each of these symbols. Answer with one entry per id.\n\n"
+        + json.dumps(items, indent=1)
+    )
+
+
+def describe_response_format() -> Dict[str, Any]:
+    json_schema = {
+        "name": "api_descriptions",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "descriptions": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "integer", "description": "The id of the symbol"},
+                            "description": {"type": "string", "description": "Markdown description of the symbol"},
+                        },
+                        "required": ["id", "description"],
+                        "additionalProperties": False,
+                    },
+                }
+            },
+            "required": ["descriptions"],
+            "additionalProperties": False,
+        },
+    }
+    return {"type": "json_schema", "json_schema": json_schema}
+
+
+def overview_prompt(symbols: Sequence[ApiSymbol], repo_type: str) -> str:
+    """User prompt for the overview paragraph, listing the documented modules."""
+    modules: Dict[str, List[str]] = {}
+    for symbol in symbols:
+        modules.setdefault(symbol.path, []).append(symbol.name)
+    listing = "\n".join(f"- {path}: {', '.join(names[:20])}" for path, names in modules.items())
+    return (
+        f"The API reference of this {repo_type} documents these modules and their top-level symbols:\n"
+        f"{listing}\n\n"
+        "Write the overview section: one or two short paragraphs explaining what the API offers, "
+        "how it is organized and how a developer typically uses it. Mention authentication if it "
+        "is evident from the project structure. Do not add a heading."
+    )
+
+
+def _fence(path: str) -> str:
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), "")
+
+
+def _fallback_description(symbol: ApiSymbol) -> str:
+    # First paragraph of the docstring when the symbol got no description
+    return (symbol.docstring or "").split("\n\n", 1)[0].strip()
+
+
+def _render_symbol(symbol: ApiSymbol, level: int, lines: List[str]) -> None:
+    label = {"class": "class", "method": "method", "function": "function"}[symbol.kind]
+    lines.append(f"{'#' * level} {label} `{symbol.qualified_name}`")
+    lines.append("")
+    lines.append(f"```{_fence(symbol.path)}")
+    lines.append(symbol.signature)
+    lines.append("```")
+    lines.append("")
+    lines.append(f"*Defined in `{symbol.path}` at line {symbol.line + 1}.*")
+    lines.append("")
+    description = (symbol.description or "").strip() or _fallback_description(symbol)
+    if description:
+        lines.append(description)
+        lines.append("")
+    for member in symbol.members:
+        _render_symbol(member, min(level + 1, 6), lines)
+
+
+def render_api_reference(
+    symbols: Sequence[ApiSymbol],
+    repo_type: str,
+    overview: Optional[str] = None,
+    omitted: int = 0,
+) -> str:
+    """
+    Render the API reference markdown: overview, table of modules, then every module
+    with its symbols (signature, location and description), classes holding their methods.
+    """
+    title = TITLES.get(repo_type, "API Reference")
+    modules: Dict[str, List[ApiSymbol]] = {}
+    for symbol in symbols:
+        modules.setdefault(symbol.path, []).append(symbol)
+
+    lines = [f"# {title}", "", "## Overview", ""]
+    if overview and overview.strip():
+        lines += [overview.strip(), ""]
+    lines += ["| Module | Symbols |", "| --- | --- |"]
+    for path, module_symbols in modules.items():
+        lines.append(f"| `{path}` | {', '.join(f'`{s.name}`' for s in module_symbols)} |")
+    lines.append("")
+    if omitted:
+        lines += [f"*{omitted} more symbols in deeper modules are not listed.*", ""]
+
+    for path, module_symbols in modules.items():
+        lines += [f"## `{path}`", ""]
+        for symbol in module_symbols:
+            _render_symbol(symbol, 3, lines)
+    return "\n".join(lines).rstrip() + "\n"
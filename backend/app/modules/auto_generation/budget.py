@@ -0,0 +1,185 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from core.logger import logger_instance
+
+
+# USD per 1M tokens (input, output); unknown models fall back to DEFAULT_PRICE
+MODEL_PRICES = {
+    "gpt-5": (1.25, 10.00),
+    "gpt-5-mini": (0.25, 2.00),
+    "gpt-5-nano": (0.05, 0.40),
+    "gpt-5.1": (1.25, 10.00),
+    "gpt-5.1-codex-mini": (0.25, 2.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "anthropic/claude-sonnet-4.5": (3.00, 15.00),
+}
+DEFAULT_PRICE = (1.25, 10.00)
+# Prompt-cache hits are billed at this fraction of the input price
+CACHED_INPUT_PRICE_FACTOR = 0.1
+
+# Stop reasons recorded on the controller
+STOP_COMPLETED = "completed"
+STOP_TOKENS = "token_budget"
+STOP_COST = "cost_budget"
+STOP_TIME = "time_budget"
+STOP_ITERATIONS = "max_iterations"
+
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """Return the prompt tokens served from the provider's prompt cache, 0 if not reported."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+
+
+def log_prompt_cache_usage(label: str, usage: Any) -> None:
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    cached = cached_prompt_tokens(usage)
+    logger_instance.info(f"{label}: prompt_tokens={prompt} cached_tokens={cached}")
+
+
+@dataclass
+class AgentBudget:
+    """Limits for a single agent run."""
+
+    max_tokens: int = 400_000
+    max_cost_usd: float = 0.50
+    max_seconds: float = 240.0
+    max_iterations: int = 40
+    # Compact old tool results once a single prompt grows past this many tokens
+    compact_prompt_tokens: int = 60_000
+    # Tool results kept verbatim when compacting (most recent first)
+    keep_recent_tool_results: int = 4
+    # Fraction of every limit held back for the final wrap-up call
+    reserve_fraction: float = 0.1
+
+
+@dataclass
+class BudgetController:
+    """
+    Tracks token, cost, wall-clock and iteration usage of one agent run.
+
+    The agent asks ``stop_reason_for_next_turn`` before every LLM call and records each
+    response's ``usage``. When the conversation gets large, ``compact`` shrinks old tool
+    results in place so every turn does not resend every file read so far.
+    """
+
+    agent_name: str
+    model: str
+    budget: AgentBudget = field(default_factory=AgentBudget)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+    iterations: int = 0
+    compactions: int = 0
+    last_prompt_tokens: int = 0
+    stop_reason: Optional[str] = None
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def record(self, usage: Any) -> None:
+        """Add the usage block of one chat completion response."""
+        self.iterations += 1
+        if usage is None:
+            return
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        cached = cached_prompt_tokens(usage)
+
+        input_price, output_price = MODEL_PRICES.get(self.model, DEFAULT_PRICE)
+        self.prompt_tokens += prompt
+        self.completion_tokens += completion
+        self.cached_tokens += cached
+        self.last_prompt_tokens = prompt
+        self.cost_usd += (
+            (prompt - cached) * input_price
+            + cached * input_price * CACHED_INPUT_PRICE_FACTOR
+            + completion * output_price
+        ) / 1_000_000
+        logger_instance.info(
+            f"Agent {self.agent_name} turn {self.iterations}: prompt_tokens={prompt} "
+            f"cached_tokens={cached} completion_tokens={completion}"
+        )
+
+    def stop_reason_for_next_turn(self) -> Optional[str]:
+        """Return why the agent must stop before making another tool-using turn, or None."""
+        headroom = 1 - self.budget.reserve_fraction
+        # The next prompt is at least as large as the last one, so count it against the limit
+        if self.total_tokens + self.last_prompt_tokens > self.budget.max_tokens * headroom:
+            return STOP_TOKENS
+        if self.cost_usd > self.budget.max_cost_usd * headroom:
+            return STOP_COST
+        if self.elapsed_seconds > self.budget.max_seconds * headroom:
+            return STOP_TIME
+        if self.iterations >= self.budget.max_iterations:
+            return STOP_ITERATIONS
+        return None
+
+    def compact(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        Replace the content of older tool results with a one-line stub, in place.
+
+        Runs only once the last prompt exceeded ``compact_prompt_tokens`` (half of it once
+        more than half of the token budget is spent). Compaction rewrites earlier messages
+        and so invalidates the provider's prompt cache from that point on; doing it in one
+        large step, rather than a little every turn, keeps the cached prefix stable between
+        compactions. Tool messages are kept (their ``tool_call_id`` must still answer the
+        assistant's tool calls); only their payload is dropped. The first line of a tool
+        result (the file path for read_file) is preserved.
+        """
+        threshold = self.budget.compact_prompt_tokens
+        if self.total_tokens > self.budget.max_tokens // 2:
+            threshold //= 2
+        if self.last_prompt_tokens < threshold:
+            return
+
+        tool_indexes = [i for i, m in enumerate(messages) if m.get("role") == "tool"]
+        old = tool_indexes[: max(0, len(tool_indexes) - self.budget.keep_recent_tool_results)]
+        dropped = 0
+        for i in old:
+            content = messages[i].get("content") or ""
+            if content.endswith("[content omitted to save context; read it again if needed]"):
+                continue
+            first_line = content.split("\n", 1)[0]
+            messages[i]["content"] = f"{first_line}\n\n[content omitted to save context; read it again if needed]"
+            dropped += len(content)
+        if dropped:
+            self.compactions += 1
+            logger_instance.info(
+                f"Agent {self.agent_name}: compacted {len(old)} old tool results ({dropped} chars) "
+                f"after prompt of {self.last_prompt_tokens} tokens"
+            )
+
+    def finish(self, stop_reason: str = STOP_COMPLETED) -> None:
+        if self.stop_reason is None:
+            self.stop_reason = stop_reason
+        logger_instance.info(f"Agent {self.agent_name} stopped: {self.summary()}")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "stop_reason": self.stop_reason,
+            "iterations": self.iterations,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost_usd": round(self.cost_usd, 4),
+            "seconds": round(self.elapsed_seconds, 1),
+            "compactions": self.compactions,
+        }
+
+
+WRAP_UP_MESSAGE = (
+    "The research budget for this task is used up. Do not call any more tools. "
+    "Using only the information gathered so far, produce the final answer now in the required format."
+)
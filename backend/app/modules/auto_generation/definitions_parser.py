@@ -0,0 +1,464 @@
+"""
+Tree-sitter definition and reference extraction shared by ParseDefinitionsService.
+
+Languages are registered by grammar package and file extension. A grammar package is
+imported the first time a file of its language is parsed, so startup does not load any
+of them and a missing package only disables its language. Compiled ``Language`` objects
+and queries are built once per process and ``Parser`` instances once per thread (they
+are not thread-safe), then reused for every file. Large repositories are parsed across
+a process pool whose workers keep their own warm parsers, so extraction scales with
+cores. Each file is parsed once for both its definitions and its references (call sites
+and imports). Every class and function also carries its signature (the header up to its
+body) and its docstring or leading doc comment, so documentation can be rendered without
+reading the files again. Worker results are plain dicts (cheap to pickle).
+"""
+
+import importlib
+import inspect
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from tree_sitter import Language, Parser, Query
+
+from core.logger import logger_instance
+
+try:
+    from tree_sitter import QueryCursor
+except ImportError:  # tree-sitter < 0.25: Query runs matches itself
+    QueryCursor = None
+
+
+# Files below this count are parsed in the calling process; the pool is not worth it
+MIN_FILES_FOR_POOL = 32
+FILES_PER_TASK = 16
+
+# Grammar entry points by language name: (package, function returning the language pointer)
+GRAMMARS = {
+    "python": ("tree_sitter_python", "language"),
+    "typescript": ("tree_sitter_typescript", "language_typescript"),
+    "tsx": ("tree_sitter_typescript", "language_tsx"),
+    "javascript": ("tree_sitter_javascript", "language"),
+    "go": ("tree_sitter_go", "language"),
+    "java": ("tree_sitter_java", "language"),
+}
+
+EXTENSIONS = {
+    ".py": "python",
+    ".ts": "typescript",
+    ".mts": "typescript",
+    ".cts": "typescript",
+    ".tsx": "tsx",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".mjs": "javascript",
+    ".cjs": "javascript",
+    ".go": "go",
+    ".java": "java",
+}
+
+_TS_JS_FUNCTIONS = """
+    (function_declaration name: (identifier) @name) @function
+    (generator_function_declaration name: (identifier) @name) @function
+    (method_definition name: (property_identifier) @name) @function
+    (variable_declarator name: (identifier) @name value: [(arrow_function) (function_expression)]) @function
+"""
+
+# Definition query per language. The capture name of the outer node is the definition
+# kind ("file", "class" or "function"); "name" captures the identifier. Interfaces,
+# structs, enums and records are reported as classes.
+DEFINITION_QUERIES = {
+    "python": """
+        (module) @file
+        (class_definition name: (identifier) @name) @class
+        (function_definition name: (identifier) @name) @function
+    """,
+    "typescript": """
+        (program) @file
+        (class_declaration name: (type_identifier) @name) @class
+        (abstract_class_declaration name: (type_identifier) @name) @class
+        (interface_declaration name: (type_identifier) @name) @class
+    """ + _TS_JS_FUNCTIONS,
+    "javascript": """
+        (program) @file
+        (class_declaration name: (identifier) @name) @class
+    """ + _TS_JS_FUNCTIONS,
+    "go": """
+        (source_file) @file
+        (type_declaration (type_spec name: (type_identifier) @name type: [(struct_type) (interface_type)])) @class
+        (function_declaration name: (identifier) @name) @function
+        (method_declaration name: (field_identifier) @name) @function
+    """,
+    "java": """
+        (program) @file
+        (class_declaration name: (identifier) @name) @class
+        (interface_declaration name: (identifier) @name) @class
+        (enum_declaration name: (identifier) @name) @class
+        (record_declaration name: (identifier) @name) @class
+        (method_declaration name: (identifier) @name) @function
+        (constructor_declaration name: (identifier) @name) @function
+    """,
+}
+DEFINITION_QUERIES["tsx"] = DEFINITION_QUERIES["typescript"]
+
+_TS_JS_REFERENCES = """
+    (call_expression function: [(identifier) @call (member_expression property: (property_identifier) @call)])
+    (new_expression constructor: [(identifier) @call (member_expression property: (property_identifier) @call)])
+    (import_statement source: (string) @import)
+"""
+
+# Reference query per language: "call" captures the called name (the last segment of a
+# qualified call), "import" the imported module or path
+REFERENCE_QUERIES = {
+    "python": """
+        (call function: [(identifier) @call (attribute attribute: (identifier) @call)])
+        (import_statement name: [(dotted_name) @import (aliased_import name: (dotted_name) @import)])
+        (import_from_statement module_name: [(dotted_name) (relative_import)] @import)
+    """,
+    "typescript": _TS_JS_REFERENCES,
+    "tsx": _TS_JS_REFERENCES,
+    "javascript": _TS_JS_REFERENCES,
+    "go": """
+        (call_expression function: [(identifier) @call (selector_expression field: (field_identifier) @call)])
+        (import_spec path: (interpreted_string_literal) @import)
+    """,
+    "java": """
+        (method_invocation name: (identifier) @call)
+        (object_creation_expression type: (type_identifier) @call)
+        (import_declaration [(scoped_identifier) (identifier)] @import)
+    """,
+}
+REFERENCE_KINDS = ("call", "import")
+DEFINITION_KINDS = ("file", "class", "function")
+
+COMMENT_TYPES = {"comment", "line_comment", "block_comment"}
+# Nodes a definition is wrapped in; doc comments precede the outermost one
+_DEFINITION_WRAPPERS = {"decorated_definition", "export_statement", "lexical_declaration", "variable_declaration"}
+MAX_SIGNATURE_CHARS = 500
+MAX_DOCSTRING_CHARS = 2000
+
+_languages: Dict[str, Language] = {}
+# Parsers keep per-parse state, so each thread (to_thread workers included) gets its own
+_parsers = threading.local()
+_queries: Dict[str, Query] = {}
+_reference_queries: Dict[str, Query] = {}
+_available: Dict[str, bool] = {}
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_language(lang: str) -> Language:
+    """Return the compiled grammar for lang, importing its package on first use."""
+    language = _languages.get(lang)
+    if language is None:
+        package, entry_point = GRAMMARS[lang]
+        language = Language(getattr(importlib.import_module(package), entry_point)())
+        _languages[lang] = language
+    return language
+
+
+def is_available(lang: str) -> bool:
+    """Whether the grammar package of lang is installed (checked once per process)."""
+    available = _available.get(lang)
+    if available is None:
+        try:
+            get_query(lang)
+            get_reference_query(lang)
+            available = True
+        except (ImportError, AttributeError) as e:
+            logger_instance.warning(f"Definitions for {lang} disabled, grammar not available: {e}")
+            available = False
+        _available[lang] = available
+    return available
+
+
+def language_for_path(path: str) -> Optional[str]:
+    """Language of a file from its extension, None when unsupported or its grammar is missing."""
+    lang = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if lang is None or not is_available(lang):
+        return None
+    return lang
+
+
+def get_parser(lang: str) -> Parser:
+    """Return this thread's parser for lang. Parsers are not shared across threads."""
+    parsers = getattr(_parsers, "by_lang", None)
+    if parsers is None:
+        parsers = _parsers.by_lang = {}
+    parser = parsers.get(lang)
+    if parser is None:
+        parser = Parser(get_language(lang))
+        parsers[lang] = parser
+    return parser
+
+
+def get_query(lang: str) -> Query:
+    """Return the compiled definition query for lang, built once per process."""
+    query = _queries.get(lang)
+    if query is None:
+        query = Query(get_language(lang), DEFINITION_QUERIES[lang])
+        _queries[lang] = query
+    return query
+
+
+def get_reference_query(lang: str) -> Query:
+    """Return the compiled call/import query for lang, built once per process."""
+    query = _reference_queries.get(lang)
+    if query is None:
+        query = Query(get_language(lang), REFERENCE_QUERIES[lang])
+        _reference_queries[lang] = query
+    return query
+
+
+def _warm_worker(langs: Sequence[str]) -> None:
+    for lang in langs:
+        get_parser(lang)
+        get_query(lang)
+        get_reference_query(lang)
+
+
+def _matches(query: Query, node) -> List[Tuple[int, Dict[str, Any]]]:
+    if QueryCursor is not None:
+        return QueryCursor(query).matches(node)
+    return query.matches(node)
+
+
+def _first(captured: Any):
+    # Captures are lists of nodes on tree-sitter >= 0.23.1, single nodes before
+    if isinstance(captured, list):
+        return captured[0] if captured else None
+    return captured
+
+
+def _get_pool(langs: Sequence[str]) -> ProcessPoolExecutor:
+    global _pool
+    # Concurrent ingests call this from several to_thread workers; build the pool once
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the server process has threads (event loop executors), which fork does not copy safely
+            _pool = ProcessPoolExecutor(
+                max_workers=max(2, (os.cpu_count() or 2) - 1),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+                initargs=(tuple(langs),),
+            )
+        return _pool
+
+
+def iter_definitions(source: bytes, lang: str, file_name: str, tree=None) -> Iterator[Dict[str, Any]]:
+    """
+    Parse one file and yield its file, class and function definitions in source order.
+
+    Matching runs in tree-sitter's C query engine over the precompiled definition query,
+    so there is no per-node Python work and no recursion.
+
+    Args:
+        source: Raw file contents
+        lang: Language name (a key of GRAMMARS)
+        file_name: Repo-prefixed path stored on every definition
+        tree: Already parsed tree of source, parsed here if not given
+
+    Yields:
+        Dicts with the fields of ``Definition``
+    """
+    if tree is None:
+        tree = get_parser(lang).parse(source)
+    for _, captures in _matches(get_query(lang), tree.root_node):
+        kind = next((k for k in DEFINITION_KINDS if k in captures), None)
+        node = _first(captures.get(kind)) if kind else None
+        if node is None:
+            continue
+        if kind == "file":
+            name = file_name.split("/")[-1]
+            signature = None
+        else:
+            name_node = _first(captures.get("name"))
+            name = name_node.text.decode("utf-8") if name_node is not None else ""
+            signature = definition_signature(node, source)
+        yield {
+            "node_type": kind,
+            "node_name": name,
+            "code_snippet": _text(source, node.start_byte, node.end_byte),
+            "start_end_lines": [node.start_point[0], node.end_point[0]],
+            "file_name": file_name,
+            "signature": signature,
+            "docstring": definition_docstring(node, source, lang),
+        }
+
+
+def _text(source: bytes, start: int, end: int) -> str:
+    return source[start:end].decode("utf-8", errors="replace")
+
+
+def definition_signature(node, source: bytes) -> str:
+    """
+    Header of a class or function definition: everything before its body, on one line.
+
+    Python decorators and the ``const``/``let`` of JS/TS function variables are kept;
+    definitions without a body field (Go type declarations) keep their first line.
+    """
+    start = node
+    body = node.child_by_field_name("body")
+    if node.type == "variable_declarator":
+        value = node.child_by_field_name("value")
+        body = value.child_by_field_name("body") if value is not None else None
+        if node.parent is not None and node.parent.type in ("lexical_declaration", "variable_declaration"):
+            start = node.parent
+    decorators = []
+    if node.parent is not None and node.parent.type == "decorated_definition":
+        decorators = [_text(source, d.start_byte, d.end_byte) for d in node.parent.named_children if d.type == "decorator"]
+
+    if body is not None:
+        header = _text(source, start.start_byte, body.start_byte)
+    else:
+        header = _text(source, start.start_byte, node.end_byte).split("\n", 1)[0]
+    header = " ".join(header.split())
+    header = header.replace("( ", "(").replace(" )", ")").replace(",)", ")").rstrip(":{; ")
+    return "\n".join(decorators + [header])[:MAX_SIGNATURE_CHARS]
+
+
+def _clean_comment(text: str) -> str:
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        for marker in ("/**", "/*", "*/", "///", "//", "#"):
+            if line.startswith(marker):
+                line = line[len(marker):]
+        if line.endswith("*/"):
+            line = line[:-2]
+        if line.startswith("*"):
+            line = line[1:]
+        lines.append(line[1:] if line.startswith(" ") else line)
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def definition_docstring(node, source: bytes, lang: str) -> Optional[str]:
+    """
+    Docstring of a definition: the leading string literal of a Python body, else the
+    comments directly above the definition (JSDoc, Go doc comments, Javadoc).
+    """
+    if lang == "python":
+        body = node if node.type == "module" else node.child_by_field_name("body")
+        first = body.named_children[0] if body is not None and body.named_child_count else None
+        if first is None or first.type != "expression_statement" or not first.named_child_count:
+            return None
+        literal = first.named_children[0]
+        if literal.type != "string":
+            return None
+        text = _text(source, literal.start_byte, literal.end_byte).lstrip("rRbBuUfF")
+        quote = text[:3] if text[:3] in ('"""', "'''") else text[:1]
+        docstring = inspect.cleandoc(text[len(quote):len(text) - len(quote)])
+        return docstring[:MAX_DOCSTRING_CHARS] or None
+
+    target = node
+    while target.parent is not None and target.parent.type in _DEFINITION_WRAPPERS:
+        target = target.parent
+    comments = []
+    line = target.start_point[0]
+    sibling = target.prev_sibling
+    # Only comments touching the definition (no blank line in between) document it
+    while sibling is not None and sibling.type in COMMENT_TYPES and sibling.end_point[0] >= line - 1:
+        comments.append(_clean_comment(_text(source, sibling.start_byte, sibling.end_byte)))
+        line = sibling.start_point[0]
+        sibling = sibling.prev_sibling
+    docstring = "\n".join(reversed(comments)).strip()
+    return docstring[:MAX_DOCSTRING_CHARS] or None
+
+
+def extract_definitions(source: bytes, lang: str, file_name: str) -> List[Dict[str, Any]]:
+    """List form of ``iter_definitions``."""
+    return list(iter_definitions(source, lang, file_name))
+
+
+def iter_references(tree, lang: str, file_name: str, definitions: Sequence[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the call sites and imports of one parsed file.
+
+    Each call is attributed to the innermost class or function definition spanning its
+    line (None at module level). A name called several times on one line is reported once.
+
+    Args:
+        tree: Parsed tree of the file
+        lang: Language name (a key of GRAMMARS)
+        file_name: Repo-prefixed path stored on every reference
+        definitions: Definitions of the same file, from ``iter_definitions``
+
+    Yields:
+        Dicts with kind ("call" or "import"), symbol, line, caller and file_name
+    """
+    scopes = [
+        (d["start_end_lines"][0], d["start_end_lines"][1], d["node_type"], d["node_name"])
+        for d in definitions
+        if d["node_type"] != "file"
+    ]
+    seen = set()
+    for _, captures in _matches(get_reference_query(lang), tree.root_node):
+        kind = next((k for k in REFERENCE_KINDS if k in captures), None)
+        node = _first(captures.get(kind)) if kind else None
+        if node is None:
+            continue
+        symbol = node.text.decode("utf-8", errors="replace").strip("\"'`")
+        line = node.start_point[0]
+        if not symbol or (kind, symbol, line) in seen:
+            continue
+        seen.add((kind, symbol, line))
+        caller = None
+        if kind == "call":
+            # Innermost scope: shortest span, then latest start, functions before classes
+            spans = [
+                (end - start, -start, node_type != "function", name)
+                for start, end, node_type, name in scopes
+                if start <= line <= end
+            ]
+            caller = min(spans)[3] if spans else None
+        yield {"kind": kind, "symbol": symbol, "line": line, "caller": caller, "file_name": file_name}
+
+
+def extract_file(source: bytes, lang: str, file_name: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Parse one file once and return (definitions, references)."""
+    tree = get_parser(lang).parse(source)
+    definitions = list(iter_definitions(source, lang, file_name, tree=tree))
+    return definitions, list(iter_references(tree, lang, file_name, definitions))
+
+
+def _parse_batch(jobs: Sequence[Tuple[str, str, str]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Worker entry point: jobs are (absolute path, language, file_name)."""
+    definitions: List[Dict[str, Any]] = []
+    references: List[Dict[str, Any]] = []
+    for abs_path, lang, file_name in jobs:
+        try:
+            with open(abs_path, "rb") as f:
+                source = f.read()
+            file_definitions, file_references = extract_file(source, lang, file_name)
+            definitions.extend(file_definitions)
+            references.extend(file_references)
+        except (OSError, UnicodeDecodeError):
+            continue
+    return definitions, references
+
+
+def parse_files(jobs: Sequence[Tuple[str, str, str]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Extract definitions and references from many files, across the process pool when there are enough.
+
+    Blocking; call it through ``asyncio.to_thread`` from async code.
+
+    Args:
+        jobs: (absolute path, language, file_name) for every file to parse
+
+    Returns:
+        (definitions, references) of all files, in job order
+    """
+    if len(jobs) < MIN_FILES_FOR_POOL or (os.cpu_count() or 1) < 2:
+        return _parse_batch(jobs)
+
+    batches = [jobs[i:i + FILES_PER_TASK] for i in range(0, len(jobs), FILES_PER_TASK)]
+    definitions: List[Dict[str, Any]] = []
+    references: List[Dict[str, Any]] = []
+    langs = sorted({lang for _, lang, _ in jobs})
+    for batch_definitions, batch_references in _get_pool(langs).map(_parse_batch, batches):
+        definitions.extend(batch_definitions)
+        references.extend(batch_references)
+    return definitions, references
@@ -0,0 +1,180 @@
+import asyncio
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core.llm_clients import async_llm_client
+from core.logger import logger_instance
+from app.modules.git_repo_setup.models import MerkleTreeData
+
+
+def _depth(path: str) -> int:
+    return 0 if path in (".", "") else path.count("/") + 1
+
+
+def _parent(path: str) -> str:
+    return path.rpartition("/")[0] or "."
+
+
+class DirectorySummarizer:
+    """
+    Fills ``MerkleDirectoryRecord.role`` bottom-up from the roles of each directory's children.
+
+    Directories are summarized deepest first, so a parent's prompt holds its files'
+    roles and its subdirectories' summaries rather than every file below it. Only
+    directories without a role are summarized: roles of directories whose Merkle hash
+    is unchanged are carried over by ``_preserve_unchanged_roles``, so on an update only
+    the changed directories (and their ancestors) cost an LLM call.
+    """
+
+    def __init__(self, model: str = "gpt-5-mini", concurrency: int = 8, max_children: int = 200, max_role_chars: int = 300):
+        self.model = model
+        self.concurrency = concurrency
+        self.max_children = max_children
+        self.max_role_chars = max_role_chars
+        self.logger = logger_instance
+
+    async def summarize(self, merkle_tree: MerkleTreeData) -> int:
+        """
+        Summarize every directory of ``merkle_tree`` that has no role yet, in place.
+
+        Args:
+            merkle_tree: Merkle tree whose file records already carry roles
+
+        Returns:
+            Number of directories that received a new role
+        """
+        file_roles = {record.path: record.role for record in merkle_tree.files if record.role}
+        dirs = {record.path: record for record in merkle_tree.directories}
+        pending = [record for record in merkle_tree.directories if not record.role]
+        if not pending:
+            return 0
+
+        by_depth: Dict[int, List] = defaultdict(list)
+        for record in pending:
+            by_depth[_depth(record.path)].append(record)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def summarize_one(record) -> None:
+            async with semaphore:
+                record.role = await self._summarize_directory(record, file_roles, dirs)
+
+        # Children must be summarized before their parent, so one depth level at a time
+        for depth in sorted(by_depth, reverse=True):
+            await asyncio.gather(*[summarize_one(record) for record in by_depth[depth]])
+
+        summarized = sum(1 for record in pending if record.role)
+        self.logger.info(f"Summarized {summarized} of {len(merkle_tree.directories)} directories")
+        return summarized
+
+    async def _summarize_directory(self, record, file_roles: Dict[str, str], dirs: Dict) -> Optional[str]:
+        lines = []
+        for name in record.children[: self.max_children]:
+            child_path = name if record.path == "." else f"{record.path}/{name}"
+            if child_path in dirs:
+                role = dirs[child_path].role or "(no summary)"
+                lines.append(f"{name}/: {role[: self.max_role_chars]}")
+            elif child_path in file_roles:
+                role = " ".join(file_roles[child_path].split())
+                lines.append(f"{name}: {role[: self.max_role_chars]}")
+        if not lines:
+            return None
+        if len(record.children) > self.max_children:
+            lines.append(f"... and {len(record.children) - self.max_children} more entries")
+
+        label = "the repository root" if record.path == "." else f"the directory `{record.path}/`"
+        prompt = (
+            f"Below are the entries of {label} with the role of each file and subdirectory.\n\n"
+            + "\n".join(lines)
+            + "\n\nIn one or two sentences, describe the role and responsibility of this directory "
+            "as a whole. Be concise and technical; do not list the files."
+        )
+        try:
+            response = await async_llm_client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a helpful assistant that summarizes the purpose of directories in a software project.",
+                    },
+                    {"role": "user", "content": prompt},
+                ],
+            )
+            return (response.choices[0].message.content or "").strip() or None
+        except Exception as e:
+            self.logger.error(f"Directory summary failed for {record.path}: {e}")
+            return None
+
+
+def build_zoomable_explanation(
+    merkle_tree: MerkleTreeData,
+    repo_name: str,
+    max_depth: int,
+    expand: Iterable[str] = (),
+) -> str:
+    """
+    Render directory summaries down to ``max_depth`` with file roles only where needed.
+
+    Every directory at depth <= ``max_depth`` (root is 0) is listed with its total file
+    count and summary; deeper directories are folded into their ancestors. File roles
+    are listed for directories shallower than ``max_depth`` and for any directory under
+    one of the ``expand`` prefixes, which are always shown in full.
+
+    Args:
+        merkle_tree: Merkle tree with file and directory roles
+        repo_name: Name printed on the first line
+        max_depth: Deepest directory level to show
+        expand: Repo-relative directory paths to show in full detail
+
+    Returns:
+        The explanation in the same "dir/ (N files)" layout as the compact cursory explanation
+    """
+    expand = tuple(p.strip("/") for p in expand if p.strip("/"))
+
+    def expanded(path: str) -> bool:
+        return any(path == p or path.startswith(p + "/") for p in expand)
+
+    files_by_dir: Dict[str, List] = defaultdict(list)
+    total_files: Dict[str, int] = defaultdict(int)
+    for record in merkle_tree.files:
+        parent = _parent(record.path)
+        files_by_dir[parent].append(record)
+        ancestor = parent
+        while True:
+            total_files[ancestor] += 1
+            if ancestor == ".":
+                break
+            ancestor = _parent(ancestor)
+
+    root_role = next((d.role for d in merkle_tree.directories if d.path == "."), None)
+    lines = [f"{repo_name}/ ({total_files['.']} files)" + (f": {root_role}" if root_role else "")]
+    for record in sorted(merkle_tree.directories, key=lambda d: d.path):
+        depth = _depth(record.path)
+        if depth > max_depth and not expanded(record.path):
+            continue
+        if record.path != ".":
+            summary = f": {' '.join(record.role.split())}" if record.role else ""
+            lines.append(f"{record.path}/ ({total_files[record.path]} files){summary}")
+        if depth < max_depth or expanded(record.path):
+            for file_record in sorted(files_by_dir.get(record.path, []), key=lambda f: f.path):
+                if file_record.role:
+                    name = file_record.path.rpartition("/")[2]
+                    lines.append(f" {name}: {' '.join(file_record.role.split())}")
+    return "\n".join(lines)
+
+
+def fit_explanation(
+    merkle_tree: MerkleTreeData,
+    repo_name: str,
+    count_tokens: Callable[[str], int],
+    max_tokens: int,
+    expand: Iterable[str] = (),
+) -> str:
+    """Return the most detailed zoomable explanation that fits in ``max_tokens``."""
+    deepest = max((_depth(d.path) for d in merkle_tree.directories), default=0) + 1
+    explanation = ""
+    for depth in range(deepest, -1, -1):
+        explanation = build_zoomable_explanation(merkle_tree, repo_name, depth, expand)
+        if count_tokens(explanation) <= max_tokens:
+            break
+    return explanation
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Literal, Union
+from typing import Any, Dict, List, Literal, Optional, Union
 
 
 
@@ -31,8 +31,13 @@ class ProjectIntroModel(BaseModel):
     repo_type: Literal["application", "library", "service"] = Field(description="The type of the project repository")
     repo_info: Union[ApplicationModel, LibraryModel, ServiceModel] = Field(description="The information of the project repository")
     cursory_explanation: str = Field(description="The cursory explanation of the project, which is a tree hierarchy of the project files with their roles")
+    compact_explanation: Optional[str] = Field(default=None, description="The same file roles in the token-efficient path-grouped encoding used in LLM prompts")
     github_url: str = Field(description="The URL of the project repository")
     name: str = Field(description="The name of the project repository")
+    section_errors: Dict[str, str] = Field(default_factory=dict, description="Agents (p1, p2, p3) that failed or timed out during generation, with the reason. Their sections are empty and are regenerated on the next run")
+    agent_runs: Dict[str, Dict[str, Any]] = Field(default_factory=dict, description="Per-agent budget usage of the last generation: stop_reason, iterations, tokens, cost_usd and seconds")
+    section_dependencies: Dict[str, List[str]] = Field(default_factory=dict, description="Repo-relative paths each agent (p1, p2, p3) read while generating its section; a section is regenerated only when one of them changes")
+    commit_hash: Optional[str] = Field(default=None, description="Commit the intro was generated from")
     created_at: datetime = Field(default_factory=datetime.utcnow, description="Creation timestamp")
     updated_at: datetime = Field(default_factory=datetime.utcnow, description="Update timestamp")
 
@@ -47,6 +52,8 @@ class Definition(BaseModel):
     code_snippet:str = Field(description="The code snippet of the definition")
     start_end_lines:List[int] = Field(description="The start and end lines of the definition")
     file_name: str = Field(description="The name of the file")
+    signature: Optional[str] = Field(default=None, description="The header of the class or function up to its body")
+    docstring: Optional[str] = Field(default=None, description="The docstring or leading doc comment of the definition")
 
 class Definitions(BaseModel):
     definitions: List[Definition] = Field(description="The definitions of the project")
@@ -86,4 +86,26 @@ check_fix_mermaid_code_user_prompt = f"""{previous_mermaid_mistakes_compressed}
 \n\nCheck the following diagrams is they have wrong syntax fix them, do not change the logic of the diagram just fix the syntax. Return only the mermaid code.
 """
 
-agent_generate_project_p3_system_prompt = """You are a technical documentation specialist focused on creating precise and comprehensive API documentation and references for software projects. Your audience consists of developers who need actionable, technical details. Use markdown formatting with code blocks for examples and specifications. Base your documentation on the provided project structure. If required use tools for details of specific files. If needed you can use multiple tool calls simultaneously. Assume the audience includes both beginners and experienced engineers. Do not write any greeting or goodbyes. Just start with the documentation and end with the documentation. Do not suggest fixes or improvements to the codebase. Use correct typography hierarchy"""
\ No newline at end of file
+agent_generate_project_p3_system_prompt = """You are a technical documentation specialist focused on creating precise and comprehensive API documentation and references for software projects. Your audience consists of developers who need actionable, technical details. Use markdown formatting with code blocks for examples and specifications. Base your documentation on the provided project structure. If required use tools for details of specific files. If needed you can use multiple tool calls simultaneously. Assume the audience includes both beginners and experienced engineers. Do not write any greeting or goodbyes. Just start with the documentation and end with the documentation. Do not suggest fixes or improvements to the codebase. Use correct typography hierarchy"""
+agent_describe_api_symbols_system_prompt = """You are a technical documentation specialist writing the descriptions of an API reference. Signatures, parameters and the module and class structure are already rendered from the source; you only write prose. For every symbol you are given, write one to three sentences in markdown describing what it does, what its parameters mean and what it returns or raises, based on its signature, docstring and code. For route handlers, describe the endpoint. Be precise and technical. Do not repeat the signature, do not add headings, greetings or examples, and do not suggest fixes or improvements to the codebase."""
+
+# Shared leading prefix for every call that needs the repository context. It must stay
+# byte-identical for a given cursory explanation so provider-side prompt caching can reuse
+# it across P1, P2, P3, the classifier and the mermaid generator; task-specific
+# instructions always go after it.
+repo_context_system_prompt = """You are assisting with the documentation of a single software repository. Below is the repository's project structure with a short role description of every file. Use it as the shared context for the task that follows.
+
+Project Structure and File Roles:
+```
+{cursory_explanation}
+```"""
+
+
+def build_repo_context_messages(cursory_explanation: str) -> list:
+    """Return the stable leading messages carrying the repository context."""
+    return [
+        {
+            "role": "system",
+            "content": repo_context_system_prompt.format(cursory_explanation=cursory_explanation),
+        }
+    ]
@@ -0,0 +1,159 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from core.logger import logger_instance
+from utils.repo_snapshot import RepoSnapshot
+
+try:
+    import tomllib
+    _MANIFEST_ERRORS = (ValueError, UnicodeDecodeError, tomllib.TOMLDecodeError)
+except ImportError:  # Python < 3.11: TOML manifests are not scored
+    tomllib = None
+    _MANIFEST_ERRORS = (ValueError, UnicodeDecodeError)
+
+
+REPO_TYPES = ("application", "library", "service")
+
+# Manifests are only inspected this many directories deep (monorepo subprojects)
+MAX_MANIFEST_DEPTH = 2
+
+FRONTEND_PACKAGES = {"react", "next", "vue", "nuxt", "svelte", "@sveltejs/kit", "@angular/core", "solid-js", "react-native", "expo", "electron"}
+SERVER_PACKAGES = {"express", "fastify", "koa", "@nestjs/core", "hapi", "@hapi/hapi", "restify"}
+PYTHON_SERVER_PACKAGES = {"fastapi", "flask", "django", "starlette", "aiohttp", "tornado", "sanic", "uvicorn", "gunicorn", "grpcio"}
+FRONTEND_DIRS = {"frontend", "web", "client", "ui", "webapp", "public", "pages", "components"}
+ROUTE_FILE_PATTERN = re.compile(r"(^|/)(routes?|routers?|controllers?|handlers|views|endpoints|api)(/|\.py$|\.ts$|\.js$|\.go$)")
+DEPLOY_DIRS = {"k8s", "kubernetes", "helm", "charts", "deploy", "deployment"}
+
+
+@dataclass
+class RepoTypeScores:
+    scores: Dict[str, float] = field(default_factory=lambda: {t: 0.0 for t in REPO_TYPES})
+    evidence: List[str] = field(default_factory=list)
+
+    def add(self, repo_type: str, weight: float, reason: str) -> None:
+        self.scores[repo_type] += weight
+        self.evidence.append(f"{repo_type}+{weight:g}: {reason}")
+
+    @property
+    def ranked(self) -> List[str]:
+        return sorted(REPO_TYPES, key=lambda t: self.scores[t], reverse=True)
+
+    def confident_type(self, min_score: float = 3.0, min_margin: float = 2.0) -> Optional[str]:
+        """Return the top type if it wins clearly, else None (ambiguous)."""
+        first, second = self.ranked[:2]
+        if self.scores[first] >= min_score and self.scores[first] - self.scores[second] >= min_margin:
+            return first
+        return None
+
+
+def _depth(rel_path: str) -> int:
+    return rel_path.count("/")
+
+
+def _package_names(requirements: str) -> set:
+    names = set()
+    for line in requirements.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line and not line.startswith("-"):
+            names.add(re.split(r"[\s<>=!~;\[]", line, 1)[0].lower())
+    return names
+
+
+def score_repo_type(snapshot: RepoSnapshot) -> RepoTypeScores:
+    """
+    Score the repository as application, library or service from manifests and layout.
+
+    Only manifests up to MAX_MANIFEST_DEPTH directories deep are read; everything else
+    is derived from the paths already in the snapshot, so this costs a handful of small
+    file reads and no LLM call.
+    """
+    result = RepoTypeScores()
+    paths = list(snapshot.files)
+    top_dirs = {p.split("/", 1)[0].lower() for p in paths if "/" in p}
+
+    has_frontend = False
+    has_server = False
+    for rel_path in paths:
+        if _depth(rel_path) > MAX_MANIFEST_DEPTH:
+            continue
+        name = rel_path.rsplit("/", 1)[-1]
+        try:
+            if name == "package.json" and "node_modules" not in rel_path:
+                has_frontend, has_server = _score_package_json(snapshot.read_text(rel_path) or "{}", rel_path, result, has_frontend, has_server)
+            elif name == "pyproject.toml" and tomllib is not None:
+                has_server = _score_pyproject(snapshot.read_text(rel_path) or "", rel_path, result) or has_server
+            elif name == "requirements.txt":
+                servers = _package_names(snapshot.read_text(rel_path) or "") & PYTHON_SERVER_PACKAGES
+                if servers:
+                    has_server = True
+                    result.add("service", 1.5, f"{rel_path} depends on {', '.join(sorted(servers))}")
+            elif name == "setup.py" and _depth(rel_path) == 0:
+                result.add("library", 1.5, "setup.py at the root")
+            elif name == "Cargo.toml" and tomllib is not None:
+                _score_cargo(snapshot.read_text(rel_path) or "", rel_path, result)
+            elif name == "go.mod" and _depth(rel_path) == 0:
+                if any(p == "main.go" or p.startswith("cmd/") for p in paths):
+                    result.add("service", 1.0, "Go module with a main package")
+                else:
+                    result.add("library", 2.0, "Go module without a main package")
+            elif name.lower() in ("dockerfile", "docker-compose.yml", "docker-compose.yaml", "compose.yaml"):
+                result.add("service", 1.0, f"{rel_path}")
+        except _MANIFEST_ERRORS as e:
+            logger_instance.info(f"Repo classifier skipped unparsable {rel_path}: {e}")
+
+    if any(ROUTE_FILE_PATTERN.search(p.lower()) for p in paths):
+        result.add("service", 1.0, "route/controller modules")
+    if top_dirs & FRONTEND_DIRS or any(p.endswith((".tsx", ".jsx", ".vue", ".svelte")) for p in paths):
+        has_frontend = True
+        result.add("application", 1.5, "frontend sources")
+    if top_dirs & DEPLOY_DIRS:
+        result.add("service", 1.0, "deployment manifests")
+    if has_frontend and has_server:
+        result.add("application", 2.0, "frontend and backend in one repository")
+    if top_dirs & {"examples", "docs"} and not has_frontend and not has_server:
+        result.add("library", 0.5, "examples/docs without a server or frontend")
+    return result
+
+
+def _score_package_json(text: str, rel_path: str, result: RepoTypeScores, has_frontend: bool, has_server: bool):
+    manifest = json.loads(text)
+    deps = set((manifest.get("dependencies") or {}).keys())
+    if manifest.get("bin"):
+        result.add("application", 1.5, f"{rel_path} declares bin")
+    if (manifest.get("main") or manifest.get("exports") or manifest.get("module")) and not manifest.get("private"):
+        result.add("library", 2.0, f"{rel_path} exports an entry point for consumers")
+    if manifest.get("private"):
+        result.add("application", 0.5, f"{rel_path} is private")
+    if deps & FRONTEND_PACKAGES:
+        has_frontend = True
+        result.add("application", 2.0, f"{rel_path} uses {', '.join(sorted(deps & FRONTEND_PACKAGES))}")
+    if deps & SERVER_PACKAGES:
+        has_server = True
+        result.add("service", 2.0, f"{rel_path} uses {', '.join(sorted(deps & SERVER_PACKAGES))}")
+    return has_frontend, has_server
+
+
+def _score_pyproject(text: str, rel_path: str, result: RepoTypeScores) -> bool:
+    manifest = tomllib.loads(text)
+    project = manifest.get("project") or {}
+    poetry = (manifest.get("tool") or {}).get("poetry") or {}
+    scripts = project.get("scripts") or project.get("gui-scripts") or poetry.get("scripts")
+    dependencies = [str(d) for d in project.get("dependencies") or []] + list((poetry.get("dependencies") or {}).keys())
+    servers = _package_names("\n".join(dependencies)) & PYTHON_SERVER_PACKAGES
+    if servers:
+        result.add("service", 2.0, f"{rel_path} depends on {', '.join(sorted(servers))}")
+    if scripts:
+        result.add("application", 1.5, f"{rel_path} declares console scripts")
+    elif (project.get("name") or poetry.get("name")) and not servers:
+        result.add("library", 2.5, f"{rel_path} is a distributable package without entry points")
+    return bool(servers)
+
+
+def _score_cargo(text: str, rel_path: str, result: RepoTypeScores) -> None:
+    manifest = tomllib.loads(text)
+    if "lib" in manifest and "bin" not in manifest:
+        result.add("library", 2.0, f"{rel_path} declares a [lib] target")
+    elif "bin" in manifest:
+        result.add("application", 1.5, f"{rel_path} declares [[bin]] targets")
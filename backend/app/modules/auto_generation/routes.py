@@ -1,5 +1,6 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Request
-from typing import Dict, List, Any
+from fastapi import APIRouter, HTTPException, status, Request, Query, Response
+from fastapi.responses import JSONResponse
+from typing import Dict, List, Any, Optional
 from core.logger import logger_instance
 import json
 from app.modules.auto_generation.service import AutoGenerationService
@@ -8,7 +9,7 @@ from app.modules.auto_generation.schema import (
     GenerateIntroResponse,
     ErrorResponse,
 )
-from app.modules.auto_generation.service_definations import ParseDefinitionsService
+from app.modules.auto_generation.service_definations import parse_definitions_service
 from app.modules.auto_generation.models import Definition
 
 # Create router
@@ -17,6 +18,8 @@ router = APIRouter(prefix="/auto-generation", tags=["auto-generation"])
 # Initialize service
 auto_gen_service = AutoGenerationService()
 
+MAX_DEFINITIONS_PAGE_SIZE = 5000
+
 
 # @router.post("/generate-intro", response_model=GenerateIntroResponse)
 # async def generate_project_intro(
@@ -223,11 +226,54 @@ auto_gen_service = AutoGenerationService()
 #             detail=f"Internal server error: {str(e)}",
 #         )
 
+@router.get("/definitions/{repo_hash}/search")
+async def search_definitions(
+    repo_hash: str,
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(default=10, ge=1, le=100),
+) -> List[Dict]:
+    """Fuzzy search the short info of a repo's definitions by name, best matches first."""
+    try:
+        return await parse_definitions_service.search_definitions(repo_hash, q, limit=limit)
+    except Exception as e:
+        logger_instance.error(f"Unexpected error in search_definitions: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(e)}",
+        )
+
 @router.get("/definitions/{repo_hash}")
-async def get_definitions(repo_hash: str, req: Request, parse_definitions: ParseDefinitionsService = Depends(ParseDefinitionsService)) -> List[Dict]:
+async def get_definitions(
+    repo_hash: str,
+    req: Request,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_DEFINITIONS_PAGE_SIZE),
+    cursor: Optional[str] = None,
+) -> List[Dict]:
+    """
+    List the short info (type, name, file, lines) of a repo's definitions for the @-mention picker.
+
+    Pass ``limit`` to page; the next page's cursor is returned in the ``X-Next-Cursor``
+    header (absent on the last page). Responses carry an ETag of the definitions version
+    (commit, schema version and last save), and ``If-None-Match`` with that ETag returns 304.
+    """
     try:
-        definitions = await parse_definitions.get_all_node_short_info(repo_hash)
-        return definitions
+        version = await parse_definitions_service.get_definitions_version(repo_hash)
+        etag = f'"{version}"' if version else None
+        if etag and etag in [tag.strip().removeprefix("W/") for tag in req.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        definitions, next_cursor = await parse_definitions_service.get_node_short_info_page(repo_hash, limit=limit, cursor=cursor)
+        if not definitions and not cursor:
+            raise Exception(f"Definitions not found for hash: {repo_hash}")
+
+        headers = {"Cache-Control": "private, no-cache"}
+        if etag:
+            headers["ETag"] = etag
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        return JSONResponse(content=definitions, headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger_instance.error(f"Unexpected error in get_definitions: {str(e)}")
         raise HTTPException(
@@ -1,14 +1,17 @@
+import asyncio
 import concurrent.futures
 import tiktoken
 import os
 import hashlib
 import json
+import time
+from collections import defaultdict
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
 from pymongo.asynchronous.collection import AsyncCollection
 from pymongo.errors import PyMongoError
-from core.clients import mongodb_client
-from core.llm_clients import llm_client
+from core.clients import mongodb_client, redis_client
+from core.llm_clients import llm_client, async_llm_client
 from core.config import settings
 from core.logger import logger_instance
 from app.modules.auto_generation.models import ProjectIntroModel, ApplicationModel, LibraryModel, ServiceModel
@@ -17,6 +20,19 @@ from app.modules.git_repo_setup.management_services import GitRepoManagementServ
 from pydantic import BaseModel, Field
 from typing import Literal
 from app.modules.auto_generation.agents import P1Agent, P2Agent, P3Agent
+from app.modules.auto_generation.budget import log_prompt_cache_usage
+from app.modules.auto_generation.prompts import build_repo_context_messages
+from app.modules.auto_generation.directory_summaries import DirectorySummarizer, fit_explanation
+from app.modules.auto_generation.repo_classifier import score_repo_type
+from app.modules.auto_generation.service_definations import parse_definitions_service
+from app.modules.git_repo_setup.models import GitRepoModel
+from utils.repo_snapshot import RepoSnapshot
+from utils.file_content_cache import file_content_cache
+from utils.ingest_progress import ingest_progress
+
+
+# Shared across every ingest on this worker so concurrent intros cannot flood the LLM providers
+_AGENT_CONCURRENCY = 4
 
 
 class AutoGenerationService:
@@ -27,12 +43,20 @@ class AutoGenerationService:
     c.    cursory explanation for each code file
     """
 
+    # Per-agent wall-clock limits in seconds; P2 includes the mermaid fixing pass
+    AGENT_TIMEOUTS = {"p1": 300, "p2": 600, "p3": 600}
+    # Above this size the prompt explanation switches to depth-limited directory summaries
+    MAX_EXPLANATION_TOKENS = 60_000
+    _agent_semaphore = asyncio.Semaphore(_AGENT_CONCURRENCY)
+
     def __init__(self):
         self.tokenizer = tiktoken.get_encoding("cl100k_base")  # GPT-4 tokenizer
         self.max_tokens = 50_000_000  # 50M tokens limit
         self.logger = logger_instance
         self.mermaid_validator = MermaidGenerationValidator()
         self.git_repo_management_service = GitRepoManagementService()
+        self.directory_summarizer = DirectorySummarizer()
+        self.parse_definitions_service = parse_definitions_service
 
         # Database setup
         self.db_name = settings.DB_NAME
@@ -71,7 +95,12 @@ class AutoGenerationService:
             git_repo_updated = await self.git_repo_management_service.check_git_repo_updated(github_url)
             latest_commit_hash = git_repo_updated.get("latest_commit_hash")
 
-            if existing_intro and git_repo_updated.get("exists") and git_repo_updated.get("updated"):
+            if (
+                existing_intro
+                and git_repo_updated.get("exists")
+                and git_repo_updated.get("updated")
+                and not existing_intro.get("section_errors")
+            ):
                 self.logger.info(f"Found existing intro for repo: {repo_hash}")
                 # Return existing data with additional metadata
                 return {
@@ -84,60 +113,103 @@ class AutoGenerationService:
             self.logger.info(
                 f"Generating new cursory explanation for repo: {repo_hash}"
             )
-            cursory_explanation = await self._generate_cursory_explanation(github_url, repo_hash, latest_commit_hash)
-
-            if cursory_explanation.startswith("Error:"):
-                return f"Error in generate_intro: {cursory_explanation}"
-
-            # Define JSON schema for repo type classification
-            json_schema = {
-                "name": "repo_type",
-                "strict": True,
-                "schema": {
-                    "type": "object",
-                    "properties": {
-                        "repo_type": {
-                            "type": "string",
-                            "enum": ["application", "library", "service"],
-                            "description": "The type of the repository: application, library, or service."
-                        }
-                    },
-                    "required": ["repo_type"],
-                    "additionalProperties": False,
-                }
-            }
-            response_format = {
-                "type": "json_schema",
-                "json_schema": json_schema
-            }
+            ingest_progress.publish(repo_hash, "stage", stage="cursory_explanation", status="started")
+            cursory_result = await self._generate_cursory_explanation(github_url, repo_hash, latest_commit_hash)
+
+            if "error" in cursory_result:
+                return f"Error in generate_intro: Error: {cursory_result['error']}"
+            cursory_explanation = cursory_result["cursory_explanation"]
+            # Prompts get the compact encoding; the box-drawing tree is kept for display
+            compact_explanation = cursory_result.get("compact_explanation") or cursory_explanation
+            snapshot = cursory_result["snapshot"]
+            ingest_progress.publish(repo_hash, "stage", stage="cursory_explanation", status="completed")
+            if latest_commit_hash:
+                # The checkout is at the new commit now; cached files of older commits are dead
+                file_content_cache.invalidate(repo_hash, keep_commit=latest_commit_hash)
+
+            # On an update, sections whose recorded inputs are untouched by the diff are reused
+            merkle_diff = cursory_result.get("merkle_diff")
+            incremental = bool(existing_intro) and merkle_diff is not None
+            carried = self._sections_to_carry_forward(existing_intro, merkle_diff) if incremental else set()
+            if incremental:
+                self.logger.info(
+                    f"Incremental intro update for repo {repo_hash}: reusing {sorted(carried) or 'no'} sections"
+                )
 
-            response = llm_client.chat.completions.create(
-                model="gpt-5.1-codex-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a classifier that determines the type of a software repository. The type must be exactly one of: 'application', 'library', or 'service'. Output your final answer as a JSON object: {\"repo_type\": \"your_classification\"}."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Application type repository generally have contains full runnable products, often includes frontend, backend, or mobile app code. Library or SDK repo provides reusable functions, utilities, or language specific SDKs for other apps. Service repositories are standalone backend service or microservice with its own API and logic. Classify this repository based on the following description: {cursory_explanation}"
-                    },
-                ],
-                response_format=response_format,
-            )
-            repo_type = json.loads(response.choices[0].message.content)["repo_type"]
-
-            # call P1Agent
-            p1_agent = P1Agent(cursory_explanation=cursory_explanation, repo_hash=repo_hash, repo_type=repo_type)
-            p1_response = await p1_agent.run()
-            # call P2Agent
-            p2_agent = P2Agent(cursory_explanation=cursory_explanation, repo_hash=repo_hash)
-            p2_response = await p2_agent.run()
-            # check fix mermaid code
-            p2_improved_response = await p2_agent.check_fix_mermaid_code(p2_response)
-            # call P3Agent
-            p3_agent = P3Agent(cursory_explanation=cursory_explanation, repo_hash=repo_hash, repo_type=repo_type)
-            p3_response = await p3_agent.run()
+            agents: Dict[str, Any] = {}
+            pending: Dict[str, Awaitable] = {}
+            # The checkout is current now: refresh the definitions index while P2 and the classifier
+            # run. P3 renders its skeleton from it, and callers skip their own parse when it succeeded.
+            definitions_ready = asyncio.create_task(self._refresh_definitions(github_url, repo_hash))
+            # P2 does not depend on the repo type, so start it while the classifier runs
+            if "p2" not in carried:
+                agents["p2"] = P2Agent(cursory_explanation=compact_explanation, repo_hash=repo_hash, snapshot=snapshot, commit_hash=latest_commit_hash)
+                pending["p2"] = asyncio.create_task(
+                    self._run_agent("p2", self._run_p2_agent(agents["p2"]), self.AGENT_TIMEOUTS["p2"], repo_hash)
+                )
+            try:
+                if incremental and existing_intro.get("repo_type"):
+                    repo_type = existing_intro["repo_type"]
+                else:
+                    repo_type = await self._classify_repo_type(compact_explanation, snapshot, repo_hash, latest_commit_hash)
+                ingest_progress.publish(repo_hash, "stage", stage="classify", status="completed", repo_type=repo_type)
+            except BaseException:
+                for task in pending.values():
+                    task.cancel()
+                definitions_ready.cancel()
+                raise
+
+            if "p1" not in carried:
+                agents["p1"] = P1Agent(cursory_explanation=compact_explanation, repo_hash=repo_hash, repo_type=repo_type, snapshot=snapshot, commit_hash=latest_commit_hash)
+                pending["p1"] = self._run_agent("p1", agents["p1"].run(), self.AGENT_TIMEOUTS["p1"], repo_hash)
+            if "p3" not in carried:
+                agents["p3"] = P3Agent(
+                    cursory_explanation=compact_explanation,
+                    repo_hash=repo_hash,
+                    repo_type=repo_type,
+                    snapshot=snapshot,
+                    commit_hash=latest_commit_hash,
+                    definitions_service=self.parse_definitions_service,
+                    definitions_ready=definitions_ready,
+                )
+                pending["p3"] = self._run_agent("p3", agents["p3"].run(), self.AGENT_TIMEOUTS["p3"], repo_hash)
+            results = dict(zip(pending.keys(), await asyncio.gather(*pending.values())))
+
+            definitions_refreshed = await definitions_ready
+            file_content_cache.log_stats(f"intro agents for {repo_hash}")
+
+            previous_info = (existing_intro or {}).get("repo_info") or {}
+            previous_dependencies = (existing_intro or {}).get("section_dependencies") or {}
+            previous_runs = (existing_intro or {}).get("agent_runs") or {}
+
+            # Budget usage and stop reason of each agent run; the files each section read
+            agent_runs = {}
+            section_dependencies = {}
+            for agent_name in ("p1", "p2", "p3"):
+                agent = agents.get(agent_name)
+                if agent is None:
+                    agent_runs[agent_name] = {**previous_runs.get(agent_name, {}), "stop_reason": "carried_forward"}
+                    section_dependencies[agent_name] = previous_dependencies.get(agent_name, [])
+                    continue
+                section_dependencies[agent_name] = sorted(agent.files_read)
+                if agent.budget_controller is None:
+                    continue
+                agent_runs[agent_name] = agent.budget_controller.summary()
+                if agent_runs[agent_name]["stop_reason"] is None:
+                    agent_runs[agent_name]["stop_reason"] = "aborted"
+
+            # Keep whatever sections succeeded; failed ones fall back to the previous content
+            # (if any) and are recorded so the next run regenerates them
+            section_errors = {name: result[1] for name, result in results.items() if result[1]}
+            p1_response = results["p1"][0] if "p1" in results else previous_info
+            p2_improved_response = results["p2"][0] if "p2" in results else previous_info.get("p2_info", "")
+            p3_response = results["p3"][0] if "p3" in results else previous_info.get("p3_info", "")
+            if not isinstance(p1_response, dict):
+                p1_response = previous_info if existing_intro else {}
+            if not isinstance(p2_improved_response, str):
+                p2_improved_response = previous_info.get("p2_info", "")
+            if not isinstance(p3_response, str):
+                p3_response = previous_info.get("p3_info", "")
 
             # save to database
             if repo_type == "application":
@@ -153,8 +225,13 @@ class AutoGenerationService:
                         p3_info=p3_response,
                     ),
                     cursory_explanation=cursory_explanation,
+                    compact_explanation=compact_explanation,
                     github_url=github_url,
                     name=name,
+                    section_errors=section_errors,
+                    agent_runs=agent_runs,
+                    section_dependencies=section_dependencies,
+                    commit_hash=latest_commit_hash,
                 )
             elif repo_type == "library":
                 project_intro_model = ProjectIntroModel(
@@ -169,8 +246,13 @@ class AutoGenerationService:
                         p3_info=p3_response,
                     ),
                     cursory_explanation=cursory_explanation,
+                    compact_explanation=compact_explanation,
                     github_url=github_url,
                     name=name,
+                    section_errors=section_errors,
+                    agent_runs=agent_runs,
+                    section_dependencies=section_dependencies,
+                    commit_hash=latest_commit_hash,
                 )
             elif repo_type == "service":
                 project_intro_model = ProjectIntroModel(
@@ -184,8 +266,13 @@ class AutoGenerationService:
                         p3_info=p3_response,
                     ),
                     cursory_explanation=cursory_explanation,
+                    compact_explanation=compact_explanation,
                     github_url=github_url,
                     name=name,
+                    section_errors=section_errors,
+                    agent_runs=agent_runs,
+                    section_dependencies=section_dependencies,
+                    commit_hash=latest_commit_hash,
                 )
             else:
                 raise ValueError(f"Unsupported repo_type: {repo_type}")
@@ -193,6 +280,7 @@ class AutoGenerationService:
             # save to database
             project_data = project_intro_model.dict()
             save_success = await self._save_project_intro(project_data)
+            ingest_progress.publish(repo_hash, "stage", stage="save_intro", status="completed" if save_success else "failed")
             if not save_success:
                 self.logger.error(f"Failed to save project intro to database for repo: {repo_hash}")
                 raise ValueError(f"Failed to save project intro to database for repo: {repo_hash}")
@@ -200,6 +288,7 @@ class AutoGenerationService:
             # Add metadata flags for consistency
             project_data["saved_to_db"] = True
             project_data["retrieved_from_db"] = False  # Newly generated, not retrieved
+            project_data["definitions_refreshed"] = definitions_refreshed
 
             return project_data
 
@@ -207,10 +296,171 @@ class AutoGenerationService:
             self.logger.error(f"Error generating intro: {str(e)}")
             return {"error": str(e), "repo_hash": repo_hash}
 
-    async def _generate_cursory_explanation(self, github_url: str, repo_hash: str, latest_commit_hash: str) -> str:
+    def _sections_to_carry_forward(self, existing_intro: Dict[str, Any], merkle_diff: Dict[str, Any]) -> set:
+        """
+        Decide which agent sections of a stored intro can be reused as-is.
+
+        A section is reused when it was generated without error, its read_file dependencies
+        were recorded and are not empty, none of them was modified or removed in merkle_diff,
+        and no file was added. A section that read nothing cannot tell whether the diff
+        concerns it, and an added file may be one it should now cover, so both regenerate.
+
+        Args:
+            existing_intro: Stored ProjectIntroModel document
+            merkle_diff: Diff between the stored and the current merkle tree ({} if unchanged)
+
+        Returns:
+            Set of agent names ("p1", "p2", "p3") whose sections are carried forward
+        """
+        files_diff = (merkle_diff or {}).get("files", {})
+        if files_diff.get("added"):
+            return set()
+        changed_paths = {
+            file_info.get("path")
+            for change in ("modified", "removed")
+            for file_info in files_diff.get(change, [])
+        }
+        dependencies = existing_intro.get("section_dependencies") or {}
+        section_errors = existing_intro.get("section_errors") or {}
+
+        carried = set()
+        for agent_name in ("p1", "p2", "p3"):
+            if agent_name in section_errors or not dependencies.get(agent_name):
+                continue
+            if changed_paths.intersection(dependencies[agent_name]):
+                continue
+            carried.add(agent_name)
+        return carried
+
+    async def _classify_repo_type(self, cursory_explanation: str, snapshot: RepoSnapshot, repo_hash: str, commit_hash: Optional[str]) -> str:
+        """
+        Classify the repository as an application, library or service.
+
+        Manifests and layout are scored locally first; the LLM is only asked when the
+        heuristic is ambiguous. The result is cached in Redis per commit.
+        """
+        cache_key = f"repo_type:{repo_hash}:{commit_hash}" if commit_hash else None
+        if cache_key:
+            try:
+                cached = await redis_client.get(cache_key)
+                if cached:
+                    self.logger.info(f"Repo type for {repo_hash} served from cache: {cached}")
+                    return cached
+            except Exception as e:
+                self.logger.error(f"Repo type cache read failed: {e}")
+
+        scores = await asyncio.to_thread(score_repo_type, snapshot)
+        repo_type = scores.confident_type()
+        if repo_type:
+            self.logger.info(f"Repo type for {repo_hash} classified heuristically as {repo_type}: {scores.scores}")
+        else:
+            self.logger.info(f"Repo type heuristic ambiguous for {repo_hash} ({scores.scores}); asking the LLM")
+            repo_type = await self._classify_repo_type_llm(cursory_explanation)
+
+        if cache_key:
+            try:
+                await redis_client.set(cache_key, repo_type, ex=30 * 24 * 3600)
+            except Exception as e:
+                self.logger.error(f"Repo type cache write failed: {e}")
+        return repo_type
+
+    async def _classify_repo_type_llm(self, cursory_explanation: str) -> str:
+        """Classify the repository as an application, library or service from its cursory explanation."""
+        # Define JSON schema for repo type classification
+        json_schema = {
+            "name": "repo_type",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "repo_type": {
+                        "type": "string",
+                        "enum": ["application", "library", "service"],
+                        "description": "The type of the repository: application, library, or service."
+                    }
+                },
+                "required": ["repo_type"],
+                "additionalProperties": False,
+            }
+        }
+        response_format = {
+            "type": "json_schema",
+            "json_schema": json_schema
+        }
+
+        response = await async_llm_client.chat.completions.create(
+            model="gpt-5.1-codex-mini",
+            # Shared repo context first (same prefix as the P1/P2/P3 agents), task after it
+            messages=build_repo_context_messages(cursory_explanation) + [
+                {
+                    "role": "system",
+                    "content": "You are a classifier that determines the type of a software repository. The type must be exactly one of: 'application', 'library', or 'service'. Output your final answer as a JSON object: {\"repo_type\": \"your_classification\"}."
+                },
+                {
+                    "role": "user",
+                    "content": "Application type repository generally have contains full runnable products, often includes frontend, backend, or mobile app code. Library or SDK repo provides reusable functions, utilities, or language specific SDKs for other apps. Service repositories are standalone backend service or microservice with its own API and logic. Classify this repository based on the project structure and file roles given above."
+                },
+            ],
+            response_format=response_format,
+        )
+        log_prompt_cache_usage("repo type classifier", response.usage)
+        return json.loads(response.choices[0].message.content)["repo_type"]
+
+    async def _refresh_definitions(self, github_url: str, repo_hash: str) -> bool:
+        """Bring the definitions index in line with the checkout; only changed files are reparsed."""
+        ingest_progress.publish(repo_hash, "stage", stage="definitions", status="started")
+        try:
+            refreshed = bool(await self.parse_definitions_service.parse_definitions(repo_hash=repo_hash, github_url=github_url))
+        except Exception as e:
+            self.logger.error(f"Definitions refresh for {repo_hash} failed: {e}")
+            refreshed = False
+        ingest_progress.publish(repo_hash, "stage", stage="definitions", status="completed" if refreshed else "failed")
+        return refreshed
+
+    async def _run_p2_agent(self, p2_agent: P2Agent) -> str:
+        """Run P2 and then fix the mermaid blocks in its output."""
+        p2_response = await p2_agent.run()
+        return await p2_agent.check_fix_mermaid_code(p2_response)
+
+    async def _run_agent(self, name: str, coro: Awaitable[Any], timeout: float, repo_hash: str) -> Tuple[Any, Optional[str]]:
+        """
+        Run one documentation agent under the shared concurrency budget and its own timeout.
+
+        Args:
+            name: Agent name used in logs and in the returned error
+            coro: The agent coroutine to await
+            timeout: Seconds the agent may run once it holds a slot
+            repo_hash: Repository being documented, for progress events
+
+        Returns:
+            Tuple of (result, error). On failure the result is None and error describes why.
+        """
+        async with self._agent_semaphore:
+            start = time.perf_counter()
+            ingest_progress.publish(repo_hash, "agent", agent=name, status="started")
+            try:
+                result = await asyncio.wait_for(coro, timeout=timeout)
+                self.logger.info(f"Agent {name} finished in {time.perf_counter() - start:.1f}s")
+                ingest_progress.publish(repo_hash, "agent_output", agent=name, output=result)
+                return result, None
+            except asyncio.TimeoutError:
+                self.logger.error(f"Agent {name} timed out after {timeout}s")
+                error = f"Timed out after {timeout}s"
+            except Exception as e:
+                self.logger.error(f"Agent {name} failed: {str(e)}")
+                error = str(e)
+            ingest_progress.publish(repo_hash, "agent", agent=name, status="failed", error=error)
+            return None, error
+
+    async def _generate_cursory_explanation(self, github_url: str, repo_hash: str, latest_commit_hash: str) -> Dict[str, Any]:
         """
         Input: Repo hash
-        Output: Tree hierarchy string of file names with their roles (cursory explanation)
+        Output: Dict with keys:
+            - cursory_explanation: Tree hierarchy string of file names with their roles
+            - compact_explanation: The same roles in the compact encoding used in prompts
+            - snapshot: RepoSnapshot of the checkout, reused by the documentation agents
+            - merkle_diff: Diff against the stored merkle tree ({} if unchanged); absent on first ingest
+            - error: error message if failed
         """
         try:
             repo_path = settings.PARENT_DIR + "/" + repo_hash
@@ -218,11 +468,12 @@ class AutoGenerationService:
             repo_data = await self.git_repo_management_service.get_updated_repo_by_hash(repo_hash)
             repo_name = github_url.split("/")[-1].replace(".git", "")
             if repo_data.get("not_found"):
-                # Step 1: Get all files excluding common irrelevant directories
-                useful_files = self._get_useful_files(repo_path)
+                # Step 1: Scan the checkout once and keep the useful files
+                snapshot = self.git_repo_management_service.merkle_service.scan_repo(repo_path)
+                useful_files = self._get_useful_files(repo_path, snapshot)
                 
                 # Step 2: Calculate total tokens
-                total_tokens = self._calculate_total_tokens(useful_files)
+                total_tokens = await asyncio.to_thread(self._calculate_total_tokens, useful_files, snapshot)
                 if total_tokens > self.max_tokens:
                     raise ValueError(
                         f"Total tokens ({total_tokens}) exceed 50M limit. Cannot process repository."
@@ -232,27 +483,45 @@ class AutoGenerationService:
                 organized_files = self._organize_files_logically(useful_files)
                 # self.logger.info(f"Organized files: {organized_files}")
                 # Step 4: Generate role descriptions
-                file_roles = self._generate_file_roles(organized_files)
+                file_roles = await asyncio.to_thread(self._generate_file_roles, organized_files, snapshot, repo_hash)
                 # self.logger.info(f"File roles: {file_roles}")
 
                 # Step 5: Save git_repo document
-                await self.git_repo_management_service.upsert_git_repo_model(github_url, repo_hash, repo_path, latest_commit_hash, file_roles)
+                upsert_result = await self.git_repo_management_service.upsert_git_repo_model(github_url, repo_hash, repo_path, latest_commit_hash, file_roles, snapshot=snapshot)
                 self.logger.info(f"Saved git_repo document for repo: {repo_hash}")
+                # Hashes and token counts stay cached on the entries; later reads go through file_content_cache
+                snapshot.release_contents()
+                repo_model = upsert_result.get("upserted_repo")
 
                 # Step 6: Convert to tree hierarchy
                 
                 tree_output = self._create_tree_hierarchy(repo_path, file_roles, repo_name)
+                compact_output = self._create_compact_hierarchy(repo_path, file_roles, repo_name)
+                self._log_explanation_tokens(repo_hash, tree_output, compact_output)
+                compact_output = await self._fit_prompt_explanation(repo_model, compact_output, repo_name)
                 # self.logger.info(f"Tree output: {tree_output}")
-                return tree_output
+                return {"cursory_explanation": tree_output, "compact_explanation": compact_output, "snapshot": snapshot}
+
+            if "error" in repo_data:
+                return {"error": repo_data["error"]}
 
             if repo_data.get("changed"):
                 repo_path = repo_data["local_path"]
+                snapshot = repo_data["snapshot"]
                 
                 # Step 1: Get all files excluding common irrelevant directories
-                useful_files = self._get_useful_files(repo_path)
+                useful_files = self._get_useful_files(repo_path, snapshot)
                 
-                # Step 2: Calculate total tokens
-                total_tokens = self._calculate_total_tokens(useful_files)
+                merkle_diff = repo_data.get("merkle_diff")
+                repo_model = repo_data.get("repo_model")
+
+                # Step 2: Calculate total tokens, reusing counts of unchanged content
+                known_counts = {
+                    record["hash"]: record["token_count"]
+                    for record in ((repo_model or {}).get("merkle_tree") or {}).get("files", [])
+                    if record.get("token_count") is not None
+                }
+                total_tokens = await asyncio.to_thread(self._calculate_total_tokens, useful_files, snapshot, known_counts)
                 if total_tokens > self.max_tokens:
                     raise ValueError(
                         f"Total tokens ({total_tokens}) exceed 50M limit. Cannot process repository."
@@ -261,9 +530,6 @@ class AutoGenerationService:
                 # Step 3: Organize files in logical order
                 organized_files = self._organize_files_logically(useful_files)
                 # self.logger.info(f"Organized files: {organized_files}")
-                
-                merkle_diff = repo_data.get("merkle_diff")
-                repo_model = repo_data.get("repo_model")
 
                 # Step 4: Filter files to only include changed/new files from merkle_diff
                 changed_files = self._get_changed_files_from_merkle_diff(merkle_diff, repo_path)
@@ -273,18 +539,23 @@ class AutoGenerationService:
                 self.logger.info(f"Files to process for role generation: {len(files_to_process)}")
                 
                 # Step 5: Generate role descriptions only for changed files
-                file_roles = self._generate_file_roles(files_to_process)
+                file_roles = await asyncio.to_thread(self._generate_file_roles, files_to_process, snapshot, repo_hash)
                 # self.logger.info(f"File roles: {file_roles}")
                 
                 # Step 6: Update git repo document
-                update_result = await self.git_repo_management_service.update_git_repo_model(repo_path, repo_model, merkle_diff, file_roles)
+                update_result = await self.git_repo_management_service.update_git_repo_model(repo_path, repo_model, merkle_diff, file_roles, snapshot=snapshot)
+                # Hashes and token counts stay cached on the entries; later reads go through file_content_cache
+                snapshot.release_contents()
                 
                 # Step 7: Convert to tree hierarchy using aggregated roles from updated repo model
                 updated_repo_model = update_result.get("updated_repo_model", repo_model) if isinstance(update_result, dict) else repo_model
                 all_roles = self.git_repo_management_service.get_all_role_map(updated_repo_model, repo_path)
                 tree_output = self._create_tree_hierarchy(repo_path, all_roles, repo_name)
+                compact_output = self._create_compact_hierarchy(repo_path, all_roles, repo_name)
+                self._log_explanation_tokens(repo_hash, tree_output, compact_output)
+                compact_output = await self._fit_prompt_explanation(updated_repo_model, compact_output, repo_name)
                 # self.logger.info(f"Tree output: {tree_output}")
-                return tree_output
+                return {"cursory_explanation": tree_output, "compact_explanation": compact_output, "snapshot": snapshot, "merkle_diff": merkle_diff or {}}
             else:
                 # Repo unchanged: build tree from existing roles
                 repo_path = repo_data["local_path"]
@@ -293,39 +564,41 @@ class AutoGenerationService:
                 all_roles = self.git_repo_management_service.get_all_role_map(repo_model, repo_path)
                 self.logger.info(f"Aggregated roles count: {len(all_roles)}")
                 tree_output = self._create_tree_hierarchy(repo_path, all_roles, repo_name)
-                return tree_output
+                compact_output = self._create_compact_hierarchy(repo_path, all_roles, repo_name)
+                self._log_explanation_tokens(repo_hash, tree_output, compact_output)
+                compact_output = await self._fit_prompt_explanation(repo_model, compact_output, repo_name)
+                # Stat-only scan; no file contents are read unless an agent asks for them
+                snapshot = self.git_repo_management_service.merkle_service.scan_repo(repo_path)
+                return {"cursory_explanation": tree_output, "compact_explanation": compact_output, "snapshot": snapshot, "merkle_diff": {}}
 
         except Exception as e:
-            return f"Error: {str(e)}"
+            return {"error": str(e)}
 
-    def _get_useful_files(self, repo_path: str) -> List[str]:
+    def _get_useful_files(self, repo_path: str, snapshot: Optional[RepoSnapshot] = None) -> List[str]:
         """Get list of useful files, filtering out irrelevant ones."""
         try:
-            # Use os.walk for cross-platform file listing
-            all_files = []
-            for root, dirs, files in os.walk(repo_path):
-                # Skip irrelevant directories
-                dirs[:] = [
-                    d
-                    for d in dirs
-                    if d
-                    not in {
-                        ".git",
-                        "node_modules",
-                        "__pycache__",
-                        ".next",
-                        "build",
-                        "dist",
-                        ".venv",
-                        "venv",
-                        ".env",
-                    }
-                    and not d.startswith(".")
-                ]
+            if snapshot is None:
+                snapshot = self.git_repo_management_service.merkle_service.scan_repo(repo_path)
+
+            irrelevant_dirs = {
+                ".git",
+                "node_modules",
+                "__pycache__",
+                ".next",
+                "build",
+                "dist",
+                ".venv",
+                "venv",
+                ".env",
+            }
 
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    all_files.append(file_path)
+            # Skip files living under irrelevant directories
+            all_files = []
+            for entry in snapshot.iter_files():
+                dir_parts = entry.rel_path.split("/")[:-1]
+                if any(d in irrelevant_dirs or d.startswith(".") for d in dir_parts):
+                    continue
+                all_files.append(snapshot.abs_path(entry.rel_path))
 
             # Filter for useful file extensions and exclude irrelevant files
             useful_extensions = {
@@ -420,20 +693,56 @@ class AutoGenerationService:
         except Exception as e:
             raise Exception(f"Error getting useful files: {str(e)}")
 
-    def _calculate_total_tokens(self, file_paths: List[str]) -> int:
-        """Calculate total tokens for all files combined."""
+    def _calculate_total_tokens(self, file_paths: List[str], snapshot: RepoSnapshot, known_counts: Optional[Dict[str, int]] = None) -> int:
+        """
+        Calculate total tokens for all files combined.
+
+        Counts are cached on the snapshot entries (and from there persisted on the merkle
+        file records), keyed by content hash: counts from a previous ingest are reused and
+        only new or changed content is batch-encoded, in parallel. Counting stops as soon as
+        the running total crosses the limit. The summed file size is logged next to it as an
+        upper bound (a file never has more cl100k tokens than bytes).
+        """
+        entries = [e for e in (snapshot.get(p) for p in file_paths) if e is not None]
+        upper_bound = sum(e.size for e in entries)
+        self.logger.info(f"Token upper bound (file bytes): {upper_bound}, limit: {self.max_tokens}")
+
+        known_counts = known_counts or {}
         total_tokens = 0
+        pending = []
+        for entry in entries:
+            if entry.token_count is None:
+                file_hash = snapshot.file_hash(entry.rel_path)
+                if file_hash is None:
+                    # Unreadable files are skipped
+                    entry.token_count = 0
+                elif file_hash in known_counts:
+                    entry.token_count = known_counts[file_hash]
+                else:
+                    pending.append(entry)
+                    continue
+            total_tokens += entry.token_count
 
-        for file_path in file_paths:
+        self.logger.info(f"Token counts reused: {len(entries) - len(pending)}, to count: {len(pending)}")
+
+        num_threads = min(8, os.cpu_count() or 1)
+        batch_size = 256
+        for i in range(0, len(pending), batch_size):
+            if total_tokens > self.max_tokens:
+                break
+            batch = pending[i : i + batch_size]
+            texts = [snapshot.read_text(entry.rel_path) or "" for entry in batch]
             try:
-                if os.path.exists(file_path) and os.path.isfile(file_path):
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        content = f.read()
-                        tokens = len(self.tokenizer.encode(content))
-                        total_tokens += tokens
-            except Exception:
-                # Skip files that can't be read
+                counts = [
+                    len(tokens)
+                    for tokens in self.tokenizer.encode_ordinary_batch(texts, num_threads=num_threads)
+                ]
+            except Exception as e:
+                self.logger.error(f"Batch token counting failed, skipping batch: {e}")
                 continue
+            for entry, count in zip(batch, counts):
+                entry.token_count = count
+                total_tokens += count
 
         return total_tokens
 
@@ -540,13 +849,16 @@ class AutoGenerationService:
         self.logger.info(f"Extracted {len(changed_files)} changed files from merkle_diff")
         return changed_files
 
-    def _generate_file_roles(self, file_paths: List[str]) -> Dict[str, str]:
+    def _generate_file_roles(self, file_paths: List[str], snapshot: RepoSnapshot, repo_hash: Optional[str] = None) -> Dict[str, str]:
         """Generate brief role descriptions for each file using OpenAI.
 
         This implementation processes file batches concurrently using a
         ThreadPoolExecutor to speed up analysis for large repositories.
+        Each completed file is published as a progress event for repo_hash.
         """
         file_roles: Dict[str, str] = {}
+        if repo_hash:
+            ingest_progress.publish(repo_hash, "stage", stage="file_roles", status="started", total=len(file_paths))
 
         # Process files in batches to avoid token limits
         batch_size = 1
@@ -571,11 +883,13 @@ class AutoGenerationService:
             files_info: List[str] = []
             for file_path in batch_files:
                 try:
-                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        content_preview = f.read()
-                        files_info.append(
-                            f"File: {os.path.basename(file_path)}\nPath: {file_path}\nPreview:\n{content_preview}"
-                        )
+                    # Contents were already read once by the snapshot for hashing/token counting
+                    content_preview = snapshot.read_text(file_path)
+                    if content_preview is None:
+                        raise OSError(f"Could not read {file_path}")
+                    files_info.append(
+                        f"File: {os.path.basename(file_path)}\nPath: {file_path}\nPreview:\n{content_preview}"
+                    )
                 except Exception:
                     files_info.append(
                         f"File: {os.path.basename(file_path)}\nPath: {file_path}\nPreview: Could not read file"
@@ -650,15 +964,26 @@ Return a JSON object where each key is a filename and each value is a brief desc
                 try:
                     result = future.result()
                     file_roles.update(result)
+                    if repo_hash:
+                        for file_path, role in result.items():
+                            ingest_progress.publish(
+                                repo_hash,
+                                "file_role",
+                                path=snapshot.rel_path(file_path),
+                                role=role,
+                                completed=len(file_roles),
+                                total=len(file_paths),
+                            )
                 except Exception as e:
                     # Shouldn't happen because process_batch catches exceptions, but be defensive
                     self.logger.error(f"Batch processing raised an exception: {e}")
 
+        if repo_hash:
+            ingest_progress.publish(repo_hash, "stage", stage="file_roles", status="completed", total=len(file_paths))
         return file_roles
 
     def _create_tree_hierarchy(self, repo_path: str, file_roles: Dict[str, str], repo_name: str) -> str:
         """Create a tree hierarchy string representation of file roles."""
-        from collections import defaultdict
 
         # Normalize paths to be relative to repo_path
         repo_hash = os.path.basename(repo_path.rstrip(os.sep))
@@ -766,6 +1091,91 @@ Return a JSON object where each key is a filename and each value is a brief desc
 
         return "\n".join(tree_lines)
 
+    def _create_compact_hierarchy(self, repo_path: str, file_roles: Dict[str, str], repo_name: str) -> str:
+        """
+        Encode file roles for LLM prompts with as few tokens as possible.
+
+        Files are grouped under one "dir/ (N files)" header per directory, so a directory
+        path is written once instead of being re-indented with box-drawing prefixes for
+        every file; each file is then one " name: role" line with the role collapsed onto
+        a single line. A directory holding a single file is written inline as
+        "dir/name: role". Root-level files come first.
+        """
+
+        by_dir: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        for full_path, description in file_roles.items():
+            try:
+                rel_path = os.path.relpath(full_path, repo_path).replace(os.sep, "/")
+            except ValueError:
+                rel_path = os.path.basename(full_path)
+            dir_name, _, file_name = rel_path.rpartition("/")
+            by_dir[dir_name].append((file_name, " ".join(str(description).split())))
+
+        lines = [f"{repo_name}/ ({len(file_roles)} files; paths relative to the repo root)"]
+        for dir_name in sorted(by_dir):
+            files = sorted(by_dir[dir_name])
+            if not dir_name:
+                lines.extend(f"{name}: {role}" for name, role in files)
+            elif len(files) == 1:
+                lines.append(f"{dir_name}/{files[0][0]}: {files[0][1]}")
+            else:
+                lines.append(f"{dir_name}/ ({len(files)} files)")
+                lines.extend(f" {name}: {role}" for name, role in files)
+        return "\n".join(lines)
+
+    async def _summarize_directories(self, repo_model: Any) -> Optional[GitRepoModel]:
+        """Fill missing directory roles of repo_model bottom-up and save them; returns the model."""
+        if isinstance(repo_model, dict):
+            repo_model = GitRepoModel(**repo_model)
+        if not repo_model or not repo_model.merkle_tree:
+            return repo_model
+        try:
+            if await self.directory_summarizer.summarize(repo_model.merkle_tree):
+                save_result = await self.git_repo_management_service.save_git_repo_db(repo_model)
+                if "error" in save_result:
+                    self.logger.error(f"Failed to save directory summaries: {save_result['error']}")
+        except Exception as e:
+            self.logger.error(f"Directory summarization skipped: {e}")
+        return repo_model
+
+    async def _fit_prompt_explanation(self, repo_model: Any, compact_output: str, repo_name: str) -> str:
+        """
+        Keep the compact explanation if it fits MAX_EXPLANATION_TOKENS, otherwise zoom out.
+
+        For large repos the flat per-file listing is replaced by directory summaries down
+        to the deepest level that fits, with file roles only above that level; the agents
+        can still read any file for detail. Directory summaries cost an LLM call each, so
+        they are only generated (for directories still missing one) when the fit needs them.
+        """
+        def count_tokens(text: str) -> int:
+            return len(self.tokenizer.encode(text, disallowed_special=()))
+
+        tokens = count_tokens(compact_output)
+        if tokens <= self.MAX_EXPLANATION_TOKENS:
+            return compact_output
+        repo_model = await self._summarize_directories(repo_model)
+        if not repo_model or not repo_model.merkle_tree:
+            return compact_output
+        explanation = fit_explanation(repo_model.merkle_tree, repo_name, count_tokens, self.MAX_EXPLANATION_TOKENS)
+        self.logger.info(
+            f"Compact explanation of {tokens} tokens exceeds {self.MAX_EXPLANATION_TOKENS}; "
+            f"using directory summaries ({count_tokens(explanation)} tokens)"
+        )
+        return explanation
+
+    def _log_explanation_tokens(self, repo_hash: str, tree_output: str, compact_output: str) -> None:
+        try:
+            tree_tokens = len(self.tokenizer.encode(tree_output, disallowed_special=()))
+            compact_tokens = len(self.tokenizer.encode(compact_output, disallowed_special=()))
+        except Exception as e:
+            self.logger.error(f"Could not count cursory explanation tokens: {e}")
+            return
+        saved = 1 - compact_tokens / tree_tokens if tree_tokens else 0
+        self.logger.info(
+            f"Cursory explanation for {repo_hash}: tree={tree_tokens} cl100k tokens, "
+            f"compact={compact_tokens} cl100k tokens ({saved:.0%} fewer)"
+        )
+
     async def get_project_intro(self, repo_path: str) -> Optional[Dict]:
         """
         Retrieve project introduction from database.
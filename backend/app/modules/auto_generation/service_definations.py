@@ -1,157 +1,551 @@
-from tree_sitter import Query, Language, Parser
-import tree_sitter_python as tspython
+import asyncio
+import base64
 import json
-from typing import Dict, List, Literal
+from typing import Any, Dict, List, Literal, Optional, Tuple
 import os
+import re
+import subprocess
 from hashlib import sha256
-import uuid
 from pydantic import BaseModel, Field
+from pymongo import ASCENDING, DeleteMany, UpdateOne
 from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import PyMongoError
 from app.modules.auto_generation.models import  Definition
 from datetime import datetime, timezone
 from core.config import settings
 from core.clients import mongodb_client
 from core.logger import logger_instance
-from app.modules.auto_generation.service import AutoGenerationService
-from utils.git_repo_setup_utils import git_clone_files, remove_cloned_files
+from app.modules.git_repo_setup.management_services import GitRepoManagementService, MerkleHashService
+from app.modules.auto_generation import definitions_parser
+from app.modules.auto_generation.symbol_index import DefinitionKey, definition_key_cache, symbol_index_cache
 
 
 
 
+# Bump when parsing extracts something new, so existing repos get one full reparse
+DEFINITIONS_SCHEMA_VERSION = 3
+
+
 class ParseDefinitionsService:
     def __init__(self):
-        self.auto_generation = AutoGenerationService()
+        self.merkle_service = MerkleHashService()
+        self.git_repo_management_service = GitRepoManagementService()
         # Database setup
         self.db_name = settings.DB_NAME
         self.db = mongodb_client[self.db_name]
+        # One document per definition, and one per parsed file with the hash it was parsed from
         self.collection: AsyncCollection = self.db["definitions"]
+        self.files_collection: AsyncCollection = self.db["definition_files"]
+        # Commit, schema version and time of each repo's last definitions save (its version and ETag)
+        self.versions_collection: AsyncCollection = self.db["definition_versions"]
+        # One document per call site or import, replaced per file together with its definitions
+        self.references_collection: AsyncCollection = self.db["references"]
+        self._indexes_created = False
+
+    async def _ensure_indexes(self) -> None:
+        """Ensure indexes exist. Called lazily on first DB operation."""
+        if not self._indexes_created:
+            try:
+                await self.collection.create_index(
+                    [("repo_hash", ASCENDING), ("file_name", ASCENDING), ("node_name", ASCENDING), ("start_line", ASCENDING)],
+                    unique=True,
+                    name="repo_file_node_line",
+                )
+                # Covers the short-info listing and the definition key map: filter, sort and
+                # projection are all served by the index
+                await self.collection.create_index(
+                    [
+                        ("repo_hash", ASCENDING),
+                        ("file_name", ASCENDING),
+                        ("start_line", ASCENDING),
+                        ("node_name", ASCENDING),
+                        ("node_type", ASCENDING),
+                        ("end_line", ASCENDING),
+                        ("_id", ASCENDING),
+                    ],
+                    name="short_info",
+                )
+                await self.versions_collection.create_index("repo_hash", unique=True)
+                await self.references_collection.create_index(
+                    [("repo_hash", ASCENDING), ("symbol", ASCENDING), ("kind", ASCENDING), ("file_name", ASCENDING), ("line", ASCENDING)],
+                    name="repo_symbol",
+                )
+                await self.references_collection.create_index(
+                    [("repo_hash", ASCENDING), ("file_name", ASCENDING)], name="repo_file"
+                )
+                await self.files_collection.create_index(
+                    [("repo_hash", ASCENDING), ("path", ASCENDING)], unique=True, name="repo_path"
+                )
+                self._indexes_created = True
+            except PyMongoError as e:
+                logger_instance.error(f"Could not create definitions indexes: {e}")
+
+    async def initialize(self) -> None:
+        """
+        Migrate legacy documents, then create the indexes. Called once at application startup,
+        so requests and ingests never pay for the migration scan.
+
+        The migration runs first: legacy documents have no file or node name, so several of
+        them per repo would break the build of the unique ``repo_file_node_line`` index.
+        """
+        try:
+            await self._migrate_legacy_documents()
+        except PyMongoError as e:
+            logger_instance.error(f"Could not migrate legacy definitions: {e}")
+        await self._ensure_indexes()
+
+    async def _migrate_legacy_documents(self) -> None:
+        """
+        Split old one-document-per-repo entries (a ``definitions`` array) into per-definition documents.
+
+        Re-runs used to insert another document per repo, so documents are replayed oldest
+        first and the newest one wins. No file hashes are recorded, so the next ingest of the
+        repo reparses it in full.
+        """
+        async for legacy in self.collection.find({"definitions": {"$exists": True}}).sort("updated_at", ASCENDING):
+            definitions = [Definition(**definition) for definition in legacy.get("definitions") or []]
+            await self.collection.delete_one({"_id": legacy["_id"]})
+            await self.collection.delete_many({"repo_hash": legacy["repo_hash"], "definitions": {"$exists": False}})
+            await self.save_definitions(
+                repo_hash=legacy["repo_hash"],
+                definitions=definitions,
+                file_hashes={},
+                commit_hash="legacy",
+                stale_files=[],
+            )
+            logger_instance.info(f"Migrated {len(definitions)} legacy definitions for {legacy['repo_hash']}")
 
     async def parse_definitions(self, repo_hash: str, github_url: str):
+        """
+        Bring the stored definitions of a repo in line with its ingest checkout.
+
+        The checkout under ``PARENT_DIR/<repo_hash>`` is reused (cloned only if missing).
+        Current file hashes come from the repo's stored merkle tree and are diffed against
+        the per-file hashes recorded with the definitions, so only added or modified files
+        are reparsed and definitions of removed files are deleted in place. The first run
+        for a repo, or a repo without recorded hashes, parses every file.
+        """
         try:
-            definitions_repo: List[Definition] = []
-            
-            # get random id, so that files dont get deleted because of other cause
-            random_id = str(uuid.uuid4())
-            
-            git_clone_files(repo_hash= repo_hash, random_id=random_id, github_url=github_url)
+            await self._ensure_indexes()
             repo_name = github_url.split("/")[-1].replace(".git", "")
-            code_file_paths = self._get_all_code_files(repo_hash, random_id)
-
-            for code_file_path in code_file_paths:
-                lang = self.get_language(code_file_path)
-                if lang != "not_code_file":
-                    parser = self.get_parser(lang)
-                else:
-                    continue
-                with open(code_file_path, "r", encoding="utf-8") as file:
-                    code = file.read()
-                tree = parser.parse(bytes(code, "utf8"))
-                root = tree.root_node
-                clean_code_file_path = self.clean_paths(code_file_path, repo_hash, random_id, repo_name)
-                definitions_repo.extend(self._get_definitions_per_file(root, lang=lang, code=code, clean_code_file_path = clean_code_file_path))
-
-            # save to db
-            save_success = await self.save_definitions(repo_hash=repo_hash, definitions=definitions_repo )
+            checkout_dir = await self._ensure_checkout(repo_hash, github_url)
+            commit_hash = await self._get_commit_hash(repo_hash, checkout_dir)
+
+            current_hashes = await self._get_current_file_hashes(repo_hash, checkout_dir)
+            stored_hashes = await self._get_stored_file_hashes(repo_hash)
+
+            if stored_hashes is None:
+                changed_paths = list(current_hashes)
+                removed_paths = []
+                stale_paths = None
+            else:
+                merkle_diff = self.merkle_service.compare_merkle_trees(
+                    {"files": [{"path": p, "hash": h} for p, h in stored_hashes.items()]},
+                    {"files": [{"path": p, "hash": h} for p, h in current_hashes.items()]},
+                )["files"]
+                changed_paths = [f["path"] for f in merkle_diff["added"] + merkle_diff["modified"]]
+                removed_paths = [f["path"] for f in merkle_diff["removed"]]
+                stale_paths = [f["path"] for f in merkle_diff["modified"] + merkle_diff["removed"]]
+                if not changed_paths and not stale_paths:
+                    logger_instance.info(f"Definitions already up to date for {repo_hash}")
+                    return True
+
+            jobs = [
+                (os.path.join(checkout_dir, rel_path), self.get_language(rel_path), self.clean_paths(rel_path, repo_name))
+                for rel_path in changed_paths
+            ]
+
+            # Parsing is CPU bound: run it off the event loop, across worker processes for big repos
+            parsed, references = await asyncio.to_thread(definitions_parser.parse_files, jobs)
+            definitions_repo: List[Definition] = [Definition(**definition) for definition in parsed]
+            logger_instance.info(
+                f"Parsed {len(jobs)} code files into {len(definitions_repo)} definitions and {len(references)} references for {repo_hash}"
+            )
+
+            # save to db; references first, since file hashes are written last by save_definitions
+            stale_files = None if stale_paths is None else [self.clean_paths(p, repo_name) for p in stale_paths]
+            await self.save_references(repo_hash=repo_hash, references=references, commit_hash=commit_hash, stale_files=stale_files)
+            save_success = await self.save_definitions(
+                repo_hash=repo_hash,
+                definitions=definitions_repo,
+                file_hashes={path: current_hashes[path] for path in changed_paths},
+                commit_hash=commit_hash,
+                removed_paths=removed_paths,
+                stale_files=stale_files,
+            )
             if not save_success:
                 raise Exception("Failed to save definitions to database")
+            symbol_index_cache.invalidate(repo_hash)
+            definition_key_cache.invalidate(repo_hash)
             return save_success
         except Exception as e:
             logger_instance.error(f"Error getting definitions: {e}")
             raise e from e
-        finally:
-            remove_cloned_files(repo_hash=repo_hash, random_id=random_id)
-
-    async def save_definitions(self, repo_hash: str, definitions: List[Definition]):
-        definitions_dict = [definition.model_dump() for definition in definitions]
-        result = await self.collection.insert_one({
-            "repo_hash": repo_hash,
-            "definitions": definitions_dict,
-            "created_at": datetime.now(timezone.utc),
-            "updated_at": datetime.now(timezone.utc)
-        })
-        return result.acknowledged
+
+    async def save_definitions(
+        self,
+        repo_hash: str,
+        definitions: List[Definition],
+        file_hashes: Dict[str, str],
+        commit_hash: str,
+        removed_paths: Optional[List[str]] = None,
+        stale_files: Optional[List[str]] = None,
+        batch_size: int = 1000,
+    ):
+        """
+        Upsert one document per definition, tagged with the commit it was parsed at.
+
+        Definitions are keyed by (repo_hash, file_name, node_name, start_line), so re-running a
+        parse updates documents in place instead of adding duplicates. Afterwards, definitions
+        of ``stale_files`` that were not written at ``commit_hash`` (removed symbols, removed
+        files) are deleted. With ``stale_files`` None (full parse) every definition and file
+        hash of the repo not written by this save is deleted after the upserts.
+
+        ``file_hashes`` holds the hashes of the files parsed in this run and ``removed_paths``
+        the files whose hash records are dropped, so the write cost follows the diff.
+        """
+        # Mongo stores milliseconds; truncate so documents written here compare equal to now
+        now = datetime.now(timezone.utc)
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        # A full parse may run at the stored commit (schema bump), so what it did not write is
+        # told apart by the write time rather than the commit
+        not_written_now = {"repo_hash": repo_hash, "updated_at": {"$ne": now}}
+
+        operations = []
+        for definition in definitions:
+            record = definition.model_dump()
+            key = {
+                "repo_hash": repo_hash,
+                "file_name": record["file_name"],
+                "node_name": record["node_name"],
+                "start_line": record["start_end_lines"][0],
+            }
+            operations.append(UpdateOne(
+                key,
+                {
+                    "$set": {**record, "end_line": record["start_end_lines"][1], "commit_hash": commit_hash, "updated_at": now},
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+            ))
+        if stale_files is None:
+            operations.append(DeleteMany(not_written_now))
+        elif stale_files:
+            operations.append(DeleteMany({
+                "repo_hash": repo_hash,
+                "file_name": {"$in": stale_files},
+                "commit_hash": {"$ne": commit_hash},
+            }))
+
+        # Upserts go before the delete (ordered), so a reparsed file never reads as empty
+        for i in range(0, len(operations), batch_size):
+            await self.collection.bulk_write(operations[i:i + batch_size], ordered=True)
+
+        file_operations = [
+            UpdateOne(
+                {"repo_hash": repo_hash, "path": path},
+                {"$set": {"hash": file_hash, "commit_hash": commit_hash, "updated_at": now}},
+                upsert=True,
+            )
+            for path, file_hash in file_hashes.items()
+        ]
+        if stale_files is None:
+            file_operations.append(DeleteMany(not_written_now))
+        elif removed_paths:
+            file_operations.append(DeleteMany({"repo_hash": repo_hash, "path": {"$in": removed_paths}}))
+        for i in range(0, len(file_operations), batch_size):
+            await self.files_collection.bulk_write(file_operations[i:i + batch_size], ordered=True)
+
+        await self.versions_collection.update_one(
+            {"repo_hash": repo_hash},
+            {"$set": {"commit_hash": commit_hash, "schema_version": DEFINITIONS_SCHEMA_VERSION, "updated_at": now}},
+            upsert=True,
+        )
+        return True
+
+    async def save_references(
+        self,
+        repo_hash: str,
+        references: List[Dict],
+        commit_hash: str,
+        stale_files: Optional[List[str]] = None,
+        batch_size: int = 1000,
+    ) -> None:
+        """
+        Replace the call sites and imports of the reparsed files.
+
+        References are not keyed like definitions: every reparsed file gets all of its
+        references rewritten, so the old ones of ``stale_files`` (or of the whole repo
+        when None) are deleted before the new ones are inserted.
+        """
+        if stale_files is None:
+            await self.references_collection.delete_many({"repo_hash": repo_hash})
+        elif stale_files:
+            await self.references_collection.delete_many({"repo_hash": repo_hash, "file_name": {"$in": stale_files}})
+
+        documents = [{**reference, "repo_hash": repo_hash, "commit_hash": commit_hash} for reference in references]
+        for i in range(0, len(documents), batch_size):
+            await self.references_collection.insert_many(documents[i:i + batch_size], ordered=False)
+
+    async def find_references(self, repo_hash: str, symbol: str, limit: int = 100) -> Dict[str, List[Dict]]:
+        """
+        Look up where a symbol is called and which files import it.
+
+        Qualified names are reduced to their last segment ("Class.method" -> "method"),
+        since call sites are indexed by the called name only.
+
+        Returns:
+            Dict with "calls" (file_name, line, caller) and "imports" (file_name, line, symbol)
+        """
+        await self._ensure_indexes()
+        name = re.split(r"\.|::|->|#", symbol.strip())[-1].strip("()")
+        projection = {"_id": 0, "file_name": 1, "line": 1, "caller": 1, "symbol": 1}
+        calls = await self.references_collection.find(
+            {"repo_hash": repo_hash, "symbol": name, "kind": "call"}, projection=projection
+        ).sort([("file_name", ASCENDING), ("line", ASCENDING)]).limit(limit).to_list(length=None)
+        imports = await self.references_collection.find(
+            {"repo_hash": repo_hash, "kind": "import", "symbol": {"$regex": f"(^|[./]){re.escape(name)}$"}},
+            projection=projection,
+        ).sort([("file_name", ASCENDING), ("line", ASCENDING)]).limit(limit).to_list(length=None)
+        return {"calls": calls, "imports": imports}
+
+    async def get_file_imports(self, repo_hash: str, rel_path: str) -> List[str]:
+        """Modules imported by the file at rel_path (relative to the repository root)."""
+        await self._ensure_indexes()
+        cursor = self.references_collection.find(
+            {"repo_hash": repo_hash, "kind": "import", "file_name": {"$regex": f"^[^/]+/{re.escape(rel_path.strip('/'))}$"}},
+            projection={"_id": 0, "symbol": 1},
+        ).sort("line", ASCENDING)
+        return [doc["symbol"] async for doc in cursor]
+
+    async def _ensure_checkout(self, repo_hash: str, github_url: str) -> str:
+        checkout_dir = os.path.join(settings.PARENT_DIR, repo_hash)
+        if not os.path.isdir(checkout_dir):
+            logger_instance.info(f"No checkout for {repo_hash}; cloning before parsing definitions")
+            clone_result = await asyncio.to_thread(self.git_repo_management_service.clone_repo, github_url)
+            if "error" in clone_result:
+                raise Exception(clone_result["error"])
+            checkout_dir = clone_result["local_path"]
+        return checkout_dir
+
+    async def _get_current_file_hashes(self, repo_hash: str, checkout_dir: str) -> Dict[str, str]:
+        """Hashes of the checkout's code files, from the stored merkle tree when it has them."""
+        file_hashes = await self.git_repo_management_service.get_file_hashes(repo_hash)
+        if not file_hashes:
+            snapshot = await asyncio.to_thread(self.merkle_service.scan_repo, checkout_dir)
+            file_hashes = {
+                entry.rel_path: snapshot.file_hash(entry.rel_path)
+                for entry in snapshot.iter_files()
+                if self.get_language(entry.rel_path) != "not_code_file"
+            }
+        return {
+            path: file_hash
+            for path, file_hash in file_hashes.items()
+            if file_hash and self.get_language(path) != "not_code_file"
+        }
+
+    async def _get_stored_file_hashes(self, repo_hash: str) -> Optional[Dict[str, str]]:
+        version = await self.versions_collection.find_one({"repo_hash": repo_hash}, projection={"schema_version": 1, "_id": 0})
+        if (version or {}).get("schema_version") != DEFINITIONS_SCHEMA_VERSION:
+            # Stored data predates what the parser extracts now: parse everything again
+            return None
+        stored = {}
+        async for record in self.files_collection.find({"repo_hash": repo_hash}, projection={"path": 1, "hash": 1, "_id": 0}):
+            stored[record["path"]] = record["hash"]
+        return stored or None
+
+    async def _get_commit_hash(self, repo_hash: str, checkout_dir: str) -> str:
+        commit_hash = await self.git_repo_management_service.get_stored_commit_hash(repo_hash)
+        if commit_hash:
+            return commit_hash
+        result = await asyncio.to_thread(
+            subprocess.run, ["git", "-C", checkout_dir, "rev-parse", "HEAD"], capture_output=True, text=True
+        )
+        return result.stdout.strip() or datetime.now(timezone.utc).isoformat()
 
     async def get_all_node_short_info(self, repo_hash: str):
         """
         fetch the node type, node name, file name, start and end lines
         """
-        definitions = await self.collection.find_one({"repo_hash": repo_hash})
-        if definitions is None:
+        all_node_info, _ = await self.get_node_short_info_page(repo_hash)
+        if not all_node_info:
             raise Exception(f"Definitions not found for hash: {repo_hash}")
-        all_node_info = []
-        for definition in definitions["definitions"]:
-            all_node_info.append({"node_type":definition["node_type"], 
-            "node_name":definition["node_name"], 
-            "file_name":definition["file_name"], 
-            "start_end_lines":definition["start_end_lines"]})
         return all_node_info
 
+    async def get_node_short_info_page(
+        self, repo_hash: str, limit: Optional[int] = None, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Page through the short info of a repo's definitions in (file_name, start_line, node_name) order.
+
+        The query is covered by the ``short_info`` index, so no definition document (or code
+        snippet) is read. Paging is keyset based: ``cursor`` is the opaque value returned as
+        the next cursor of the previous page.
+
+        Args:
+            repo_hash: Repository hash
+            limit: Page size; None returns every definition
+            cursor: Next cursor of the previous page, None for the first page
+
+        Returns:
+            (short info dicts, next cursor or None on the last page)
+
+        Raises:
+            ValueError: If cursor is malformed
+        """
+        await self._ensure_indexes()
+        query: Dict = {"repo_hash": repo_hash}
+        if cursor:
+            file_name, start_line, node_name = self._decode_cursor(cursor)
+            query["$or"] = [
+                {"file_name": {"$gt": file_name}},
+                {"file_name": file_name, "start_line": {"$gt": start_line}},
+                {"file_name": file_name, "start_line": start_line, "node_name": {"$gt": node_name}},
+            ]
+        find = self.collection.find(
+            query,
+            projection={"file_name": 1, "start_line": 1, "node_name": 1, "node_type": 1, "end_line": 1, "_id": 0},
+        ).sort([("file_name", ASCENDING), ("start_line", ASCENDING), ("node_name", ASCENDING)])
+        if limit is not None:
+            find = find.limit(limit + 1)
+        rows = await find.to_list(length=None)
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = self._encode_cursor(last["file_name"], last["start_line"], last["node_name"])
+        page = [
+            {
+                "node_type": row["node_type"],
+                "node_name": row["node_name"],
+                "file_name": row["file_name"],
+                "start_end_lines": [row["start_line"], row["end_line"]],
+            }
+            for row in rows
+        ]
+        return page, next_cursor
+
+    async def search_definitions(self, repo_hash: str, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Fuzzy search a repo's definitions by name for @-mention autocomplete.
+
+        Served from the cached in-memory ``SymbolIndex`` of the repo, rebuilt from the
+        short-info index when the definitions version changed.
+        """
+        version = await self.get_definitions_version(repo_hash)
+        index = await symbol_index_cache.get(
+            repo_hash, version, lambda: self.get_all_node_short_info(repo_hash)
+        )
+        return index.search(query, limit=limit)
+
+    async def get_definitions_version(self, repo_hash: str) -> Optional[str]:
+        """
+        Version of the stored definitions of repo_hash, None if never parsed.
+
+        Made of the commit, the schema version and the time of the last save, so a reparse
+        at the same commit (schema bump), which rewrites every document, changes it too.
+        """
+        await self._ensure_indexes()
+        doc = await self.versions_collection.find_one(
+            {"repo_hash": repo_hash}, projection={"commit_hash": 1, "schema_version": 1, "updated_at": 1, "_id": 0}
+        )
+        if not doc or not doc.get("commit_hash"):
+            return None
+        updated_at = doc.get("updated_at")
+        saved = updated_at.strftime("%Y%m%d%H%M%S%f") if updated_at else "0"
+        return f"{doc['commit_hash']}-v{doc.get('schema_version', 0)}-{saved}"
+
+    @staticmethod
+    def _encode_cursor(file_name: str, start_line: int, node_name: str) -> str:
+        raw = json.dumps([file_name, start_line, node_name], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, int, str]:
+        try:
+            file_name, start_line, node_name = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return str(file_name), int(start_line), str(node_name)
+        except Exception as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
     async def get_all_node_full_info(self, repo_hash: str):
-        definitions = await self.collection.find_one({"repo_hash": repo_hash})
-        if definitions is None:
+        await self._ensure_indexes()
+        cursor = self.collection.find(
+            {"repo_hash": repo_hash}, projection={"_id": 0, "repo_hash": 0, "start_line": 0}
+        ).sort([("file_name", ASCENDING), ("start_line", ASCENDING)])
+        definitions = await cursor.to_list(length=None)
+        if not definitions:
             raise Exception(f"Definitions not found for hash: {repo_hash}")
-        return definitions["definitions"]
-
-    def clean_paths(self, code_file_path: str, repo_hash: str, random_id: str, repo_name: str):
-        clean_code_file_path = repo_name + "/" + code_file_path.replace(os.getenv("PARENT_DIR") + "/" + repo_hash + "/" + random_id + "/", "")
-        return clean_code_file_path
-
-    def _get_all_code_files(self, repo_hash: str, random_id: str):
-        repo_dir = os.getenv("PARENT_DIR") + "/" + repo_hash + "/" + random_id + "/"
-        file_path_list = []
-        for root, _, files in os.walk(repo_dir):
-            for file in files:
-                file_path_list.append(os.path.join(root, file))
-        return file_path_list
-
-
-    def _get_definitions_per_file(self, node, lang, code, clean_code_file_path):
-        definitions_per_file: List[Definition] = []
-        # node_types = ["file", "class", "function"]
-        if node.type == self.get_node_type("file", lang):
-            definitions_per_file.append(Definition(node_type="file", 
-                                                    node_name = clean_code_file_path.split("/")[-1],
-                                                    code_snippet = code[node.start_byte:node.end_byte], 
-                                                    start_end_lines = [node.start_point[0], node.end_point[0]],
-                                                    file_name = clean_code_file_path))
-                                                    
-        elif node.type == self.get_node_type("class", lang):
-            definitions_per_file.append(Definition(node_type="class", 
-                                                    node_name = node.child_by_field_name("name").text.decode("utf-8"),
-                                                    code_snippet = code[node.start_byte:node.end_byte], 
-                                                    start_end_lines = [node.start_point[0], node.end_point[0]],
-                                                    file_name = clean_code_file_path))
-        elif node.type == self.get_node_type("function", lang):
-            definitions_per_file.append(Definition(node_type="function",
-                                                    node_name = node.child_by_field_name("name").text.decode("utf-8"),
-                                                    code_snippet = code[node.start_byte:node.end_byte], 
-                                                    start_end_lines = [node.start_point[0], node.end_point[0]],
-                                                    file_name = clean_code_file_path))
-
-        for node in node.children:
-            definitions_per_file.extend(self._get_definitions_per_file(node, lang, code=code, clean_code_file_path = clean_code_file_path))
-
-        return definitions_per_file
-    
-    def get_node_type(self, type, lang):
-        if lang == "python":
-            if type == "class":
-                return "class_definition"
-            if type == "function":
-                return "function_definition"
-            if type == "file":
-                return "module"
-        else:
-            pass
+        return definitions
+
+    async def get_definitions_by_keys(self, repo_hash: str, keys: List[DefinitionKey]) -> Dict[DefinitionKey, Dict]:
+        """
+        Fetch the definitions with the given (node_type, file_name, node_name, start line, end line) keys.
+
+        Keys are resolved to document ids through the repo's cached ``DefinitionKeyIndex``
+        (loaded once per definitions version from the covering index), then every
+        definition is fetched in a single ``_id`` lookup. Unknown keys are left out.
+        """
+        if not keys:
+            return {}
+        version = await self.get_definitions_version(repo_hash)
+        key_index = await definition_key_cache.get(repo_hash, version, lambda: self._load_definition_keys(repo_hash))
+        ids = {key: key_index.get(key) for key in keys}
+        wanted = [definition_id for definition_id in ids.values() if definition_id is not None]
+        if not wanted:
+            return {}
+        docs = {}
+        async for doc in self.collection.find({"_id": {"$in": wanted}}, projection={"repo_hash": 0, "start_line": 0}):
+            docs[doc.pop("_id")] = doc
+        return {key: docs[definition_id] for key, definition_id in ids.items() if definition_id in docs}
+
+    async def get_documented_definitions(self, repo_hash: str) -> List[Dict]:
+        """
+        Class and function definitions of a repo with signature and docstring, without code.
+
+        Sorted by file and line (served by the short_info index); used to render the API
+        reference. Fetch code for the definitions that are kept with ``get_code_snippets``.
+        """
+        await self._ensure_indexes()
+        cursor = self.collection.find(
+            {"repo_hash": repo_hash, "node_type": {"$in": ["class", "function"]}},
+            projection={"code_snippet": 0, "repo_hash": 0, "commit_hash": 0, "created_at": 0, "updated_at": 0},
+        ).sort([("file_name", ASCENDING), ("start_line", ASCENDING)])
+        return await cursor.to_list(length=None)
+
+    async def get_code_snippets(self, definition_ids: List[Any]) -> Dict[Any, str]:
+        """Code snippets of the given definition ids, in a single lookup."""
+        if not definition_ids:
+            return {}
+        cursor = self.collection.find({"_id": {"$in": list(definition_ids)}}, projection={"_id": 1, "code_snippet": 1})
+        return {doc["_id"]: doc.get("code_snippet", "") async for doc in cursor}
+
+    async def get_parsed_files(self, repo_hash: str) -> List[str]:
+        """Repo-relative paths of every file the definitions index was built from, with or without definitions."""
+        await self._ensure_indexes()
+        cursor = self.files_collection.find({"repo_hash": repo_hash}, projection={"path": 1, "_id": 0})
+        return [record["path"] async for record in cursor]
+
+    async def _load_definition_keys(self, repo_hash: str) -> List[Dict]:
+        await self._ensure_indexes()
+        cursor = self.collection.find(
+            {"repo_hash": repo_hash},
+            projection={"_id": 1, "node_type": 1, "file_name": 1, "node_name": 1, "start_line": 1, "end_line": 1},
+        ).hint("short_info")
+        return await cursor.to_list(length=None)
+
+    def clean_paths(self, rel_path: str, repo_name: str):
+        return repo_name + "/" + rel_path.replace(os.sep, "/")
 
     def get_language(self, file_path:str):
-        extension = file_path.split('.')[-1]
-        if extension == "py":
-            return "python"
-        else:
-            return "not_code_file"
-        
+        # Extension -> grammar registry; grammars are imported on first use
+        return definitions_parser.language_for_path(file_path) or "not_code_file"
+
     def get_parser(self, lang):
-        if lang == "python":
-            PY_LANGUAGE = Language(tspython.language())
-            return Parser(PY_LANGUAGE)
+        # Built once per process and reused
+        return definitions_parser.get_parser(lang)
+
+
+# Shared by the routes, the ingest flows and chat, so indexes are ensured once per process
+parse_definitions_service = ParseDefinitionsService()
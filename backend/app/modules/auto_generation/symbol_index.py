@@ -0,0 +1,266 @@
+"""
+In-memory indexes over a repo's definitions, cached per repo and definitions version.
+
+``SymbolIndex`` serves fuzzy @-mention autocomplete. ``DefinitionKeyIndex`` maps the full
+key of a mentioned definition to its document id, so resolving mentions fetches only
+their snippets.
+
+Each repo gets a ``SymbolIndex`` built from the short info of its definitions (no code
+snippets). Distinct names are searched in tiers: exact, prefix (bisect over the sorted
+names), substring (trigram postings), subsequence (``gtdef`` -> ``get_definitions``) and
+finally trigram similarity for typos. Lower tiers only run while the page is not full,
+and scans walk the names shortest first and stop once the page is full, so common
+queries (even one or two characters) touch a handful of names. Indexes are keyed by the
+definitions version (commit, schema version and last save), so any reparse invalidates
+them in every worker, including a full reparse at the same commit that rewrites every
+document id.
+"""
+
+import asyncio
+import bisect
+import heapq
+import re
+from collections import Counter, OrderedDict, defaultdict
+from itertools import chain
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from core.logger import logger_instance
+
+
+EXACT_SCORE = 100.0
+PREFIX_SCORE = 80.0
+SUBSTRING_SCORE = 60.0
+SUBSEQUENCE_SCORE = 40.0
+SIMILAR_SCORE = 20.0
+
+# Share of the query's trigrams a name must contain to count as a typo match
+MIN_TRIGRAM_SIMILARITY = 0.5
+# Subsequence matches are ranked by name length first; only the shortest are scored in full
+MAX_SUBSEQUENCE_CANDIDATES = 200
+MAX_CACHED_REPOS = 32
+
+_BOUNDARY = re.compile(r"[_\-./\s]")
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _subsequence_pattern(query: str) -> "re.Pattern":
+    # c1[^\nc2]*c2[^\nc3]*c3...: each gap stops at the first next character, so the match is
+    # the greedy subsequence match and the engine never backtracks across a name
+    parts = []
+    for i, char in enumerate(query):
+        parts.append(re.escape(char))
+        if i + 1 < len(query):
+            parts.append(f"[^\\n{re.escape(query[i + 1])}]*")
+    return re.compile("".join(parts))
+
+
+def _subsequence_bonus(name: str, lowered: str, query: str) -> Optional[float]:
+    """Greedy subsequence match of query in lowered; None if absent, else a bonus in [0, 19]."""
+    position = -1
+    bonus = 0.0
+    for char in query:
+        found = lowered.find(char, position + 1)
+        if found == -1:
+            return None
+        if found == 0 or _BOUNDARY.match(name[found - 1]) or (name[found].isupper() and not name[found - 1].isupper()):
+            bonus += 2.0
+        elif found == position + 1:
+            bonus += 1.0
+        position = found
+    return min(19.0, bonus * 10.0 / max(len(query), 1) + 9.0 * len(query) / len(lowered))
+
+
+class SymbolIndex:
+    """Search structure over the distinct node names of one repo's definitions."""
+
+    def __init__(self, definitions: List[Dict]):
+        self.definitions = definitions
+        rows_by_name: Dict[str, List[int]] = defaultdict(list)
+        display: Dict[str, str] = {}
+        for row_id, definition in enumerate(definitions):
+            lowered = definition["node_name"].lower()
+            rows_by_name[lowered].append(row_id)
+            # Original casing marks camelCase boundaries; lower() may change the length of some names
+            if len(definition["node_name"]) == len(lowered):
+                display.setdefault(lowered, definition["node_name"])
+
+        self.names: List[str] = sorted(rows_by_name)
+        self.display = [display.get(name, name) for name in self.names]
+        self.rows = [rows_by_name[name] for name in self.names]
+        # All names in one string, so substring and subsequence scans run in the regex engine.
+        # Shortest names first: within a tier shorter names rank higher, so the first hits
+        # of a scan are the best ones and it can stop as soon as the page is full
+        self.scan_order = sorted(range(len(self.names)), key=lambda name_id: (len(self.names[name_id]), name_id))
+        self.blob = "\n".join(self.names[name_id] for name_id in self.scan_order)
+        self.line_starts: List[int] = []
+        offset = 0
+        for name_id in self.scan_order:
+            self.line_starts.append(offset)
+            offset += len(self.names[name_id]) + 1
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        for name_id, name in enumerate(self.names):
+            for trigram in _trigrams(name):
+                self.postings[trigram].add(name_id)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Return up to ``limit`` definitions whose name best matches ``query``.
+
+        Results are ordered by tier score, then shorter names, then file and line.
+        """
+        query = query.strip().lower()
+        if not query or not self.names:
+            return []
+        scores: Dict[int, float] = {}
+
+        def take(name_id: int, score: float) -> None:
+            if score > scores.get(name_id, -1.0):
+                scores[name_id] = score
+
+        # Exact and prefix: contiguous range of the sorted names
+        start = bisect.bisect_left(self.names, query)
+        end = bisect.bisect_left(self.names, query + "\uffff", start)
+        if end - start > limit:
+            # Prefix matches tie on score, so the shortest names are the best ones
+            prefix_ids = heapq.nsmallest(limit, range(start, end), key=lambda name_id: (len(self.names[name_id]), name_id))
+        else:
+            prefix_ids = range(start, end)
+        for name_id in prefix_ids:
+            take(name_id, EXACT_SCORE if self.names[name_id] == query else PREFIX_SCORE)
+
+        if len(scores) < limit:
+            for name_id in self._substring_candidates(query, limit - len(scores), scores):
+                take(name_id, SUBSTRING_SCORE)
+        if len(scores) < limit:
+            # Already shortest first
+            matched = self._scan(_subsequence_pattern(query), MAX_SUBSEQUENCE_CANDIDATES, scores)
+            for name_id in matched:
+                bonus = _subsequence_bonus(self.display[name_id], self.names[name_id], query)
+                if bonus is not None:
+                    take(name_id, SUBSEQUENCE_SCORE + bonus)
+        if len(scores) < limit and len(query) >= 3:
+            for name_id, similarity in self._similar_names(query):
+                take(name_id, SIMILAR_SCORE + 19.0 * similarity)
+
+        ranked = sorted(scores, key=lambda name_id: (-scores[name_id], len(self.names[name_id]), self.names[name_id]))
+        results: List[Dict] = []
+        for name_id in ranked:
+            for row_id in self.rows[name_id]:
+                results.append(self.definitions[row_id])
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def _substring_candidates(self, query: str, wanted: int, skip: Dict[int, float]) -> List[int]:
+        if len(query) < 3:
+            # Too short for trigrams, and matches most names: scan until the page is full
+            return self._scan(re.compile(re.escape(query)), wanted, skip)
+        postings = sorted((self.postings.get(t, set()) for t in _trigrams(query)), key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                return []
+        return [name_id for name_id in candidates if query in self.names[name_id]]
+
+    def _scan(self, pattern: "re.Pattern", max_hits: int, skip: Dict[int, float]) -> List[int]:
+        """
+        Ids of up to ``max_hits`` names not in ``skip`` containing a match of pattern (which
+        must not match newlines), shortest names first.
+        """
+        name_ids: List[int] = []
+        position = 0
+        while len(name_ids) < max_hits:
+            match = pattern.search(self.blob, position)
+            if match is None:
+                break
+            line = bisect.bisect_right(self.line_starts, match.start()) - 1
+            name_id = self.scan_order[line]
+            if name_id not in skip:
+                name_ids.append(name_id)
+            # Continue at the next name; one hit per name is enough
+            if line + 1 >= len(self.line_starts):
+                break
+            position = self.line_starts[line + 1]
+        return name_ids
+
+    def _similar_names(self, query: str) -> List[Tuple[int, float]]:
+        query_trigrams = _trigrams(query)
+        counts = Counter(chain.from_iterable(self.postings.get(trigram, ()) for trigram in query_trigrams))
+        min_count = MIN_TRIGRAM_SIMILARITY * len(query_trigrams)
+        return [
+            (name_id, count / len(query_trigrams))
+            for name_id, count in counts.items()
+            if count >= min_count
+        ]
+
+
+DefinitionKey = Tuple[str, str, str, int, int]
+
+
+class DefinitionKeyIndex:
+    """(node_type, file_name, node_name, start line, end line) -> definition document id."""
+
+    def __init__(self, rows: List[Dict]):
+        self.ids: Dict[DefinitionKey, Any] = {
+            (row["node_type"], row["file_name"], row["node_name"], row["start_line"], row["end_line"]): row["_id"]
+            for row in rows
+        }
+
+    def get(self, key: DefinitionKey) -> Optional[Any]:
+        return self.ids.get(key)
+
+
+class RepoIndexCache:
+    """
+    Per-process LRU of one index per repo, each tagged with the definitions version.
+
+    ``get`` rebuilds an index when the stored version differs from the cached one. Every
+    save records a new version, so a reparse invalidates the index of each process on its
+    next lookup; ``invalidate`` only reaches the local one. Concurrent misses for one repo
+    share a single build.
+    """
+
+    def __init__(self, build: Callable[[List[Dict]], Any], max_repos: int = MAX_CACHED_REPOS):
+        self.build = build
+        self.max_repos = max_repos
+        self._indexes: "OrderedDict[str, Tuple[Optional[str], Any]]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self.logger = logger_instance
+
+    async def get(
+        self,
+        repo_hash: str,
+        version: Optional[str],
+        load_rows: Callable[[], Awaitable[List[Dict]]],
+    ) -> Any:
+        cached = self._indexes.get(repo_hash)
+        if cached is not None and cached[0] == version:
+            self._indexes.move_to_end(repo_hash)
+            return cached[1]
+
+        async with self._locks[repo_hash]:
+            cached = self._indexes.get(repo_hash)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            rows = await load_rows()
+            index = await asyncio.to_thread(self.build, rows)
+            self._indexes[repo_hash] = (version, index)
+            self._indexes.move_to_end(repo_hash)
+            while len(self._indexes) > self.max_repos:
+                evicted, _ = self._indexes.popitem(last=False)
+                self._locks.pop(evicted, None)
+            self.logger.info(f"Built {type(index).__name__} for {repo_hash} from {len(rows)} definitions")
+            return index
+
+    def invalidate(self, repo_hash: str) -> None:
+        self._indexes.pop(repo_hash, None)
+
+
+symbol_index_cache = RepoIndexCache(SymbolIndex)
+definition_key_cache = RepoIndexCache(DefinitionKeyIndex)
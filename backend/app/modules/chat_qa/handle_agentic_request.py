@@ -1,3 +1,4 @@
+import inspect
 import json
 import os
 import sys
@@ -7,16 +8,29 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
 
 from core.llm_clients import llm_client
 from app.modules.auto_generation.service import AutoGenerationService
+from app.modules.auto_generation.service_definations import parse_definitions_service
+from app.modules.git_repo_setup.management_services import GitRepoManagementService
+from utils.file_content_cache import file_content_cache
 
 
 
 # Initialize the auto generation service
 logger_instance.info("Initializing auto generation service")
 auto_gen_service = AutoGenerationService()
+git_repo_management_service = GitRepoManagementService()
 
 
-def read_file_tool(file_path: str) -> str:
-    """Read the contents of a file."""
+def read_file_tool(
+    file_path: str,
+    repo_root: str = None,
+    repo_hash: str = None,
+    commit_hash: str = None,
+) -> str:
+    """Read the contents of a file.
+
+    Files inside repo_root are served through the shared file content cache
+    when the repository commit is known.
+    """
     logger_instance.info(f"Reading file: {file_path}")
     try:
         # Guard: ensure path exists before attempting to open
@@ -24,8 +38,12 @@ def read_file_tool(file_path: str) -> str:
             logger_instance.error(f"read_file_tool: path does not exist: {file_path}")
             return f"Error reading file: path does not exist: {file_path}"
 
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
+        rel_path = os.path.relpath(file_path, repo_root) if repo_root else None
+        if repo_hash and rel_path and not rel_path.startswith(".."):
+            content = file_content_cache.read_text(repo_hash, commit_hash, repo_root, rel_path)
+        else:
+            with open(file_path, "r", encoding="utf-8") as f:
+                content = f.read()
         logger_instance.info(f"Successfully read file: {file_path} ({len(content)} characters)")
         return content
     except Exception as e:
@@ -125,12 +143,58 @@ async def get_project_intro_by_hash_tool(repo_hash: str) -> str:
         return f"Error getting project intro by hash: {str(e)}"
 
 
+def _repo_relative(file_name: str) -> str:
+    # Indexed file names are prefixed with the repository name; lines are 0-based
+    return file_name.split("/", 1)[1] if "/" in file_name else file_name
+
+
+async def find_references_tool(symbol: str, repo_hash: str = None) -> str:
+    """List the call sites of a function or method and the imports of a module, from the reference index."""
+    if not repo_hash:
+        return "Error: no repository selected"
+    logger_instance.info(f"Finding references to {symbol} in {repo_hash}")
+    try:
+        result = await parse_definitions_service.find_references(repo_hash, symbol)
+        lines = []
+        for ref in result["calls"]:
+            caller = f" in {ref['caller']}" if ref.get("caller") else ""
+            lines.append(f"call: {_repo_relative(ref['file_name'])}:{ref['line'] + 1}{caller}")
+        for ref in result["imports"]:
+            lines.append(f"import {ref['symbol']}: {_repo_relative(ref['file_name'])}:{ref['line'] + 1}")
+        if not lines:
+            return f"No references to {symbol} found"
+        return f"References to {symbol}:\n" + "\n".join(lines)
+    except Exception as e:
+        logger_instance.error(f"Error finding references to {symbol}: {str(e)}")
+        return f"Error finding references: {str(e)}"
+
+
+async def get_file_imports_tool(file_path: str, repo_hash: str = None) -> str:
+    """List the modules imported by a file, from the reference index."""
+    if not repo_hash:
+        return "Error: no repository selected"
+    logger_instance.info(f"Getting imports of {file_path} in {repo_hash}")
+    try:
+        imports = await parse_definitions_service.get_file_imports(repo_hash, file_path)
+        if not imports:
+            return f"No imports found for {file_path}"
+        return f"Imports of {file_path}:\n" + "\n".join(imports)
+    except Exception as e:
+        logger_instance.error(f"Error getting imports of {file_path}: {str(e)}")
+        return f"Error getting imports: {str(e)}"
+
+
 TOOL_MAPPING = {
     "read_file": read_file_tool,
     "search_files": search_files_tool,
     "list_directory": list_directory_tool,
+    "find_references": find_references_tool,
+    "get_file_imports": get_file_imports_tool,
 }
 
+# Tools answered from the repo's indexes take repo-relative paths and the repo hash
+INDEX_TOOLS = {"find_references", "get_file_imports"}
+
 TOOLS = [
     {
         "type": "function",
@@ -187,6 +251,40 @@ TOOLS = [
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_references",
+            "description": "Find where a function, method or class is called and which files import a module, using the precomputed reference index",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "symbol": {
+                        "type": "string",
+                        "description": "The function, method, class or module name (e.g. parse_files or Service.save)",
+                    }
+                },
+                "required": ["symbol"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_file_imports",
+            "description": "List the modules imported by a file, using the precomputed reference index",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {
+                        "type": "string",
+                        "description": "The path of the file relative to the repository root",
+                    }
+                },
+                "required": ["file_path"],
+            },
+        },
+    },
 ]
 
 
@@ -239,12 +337,14 @@ def call_llm(msgs):
     raise last_exception
 
 
-def get_tool_response(response, dir_path: str = None):
+async def get_tool_response(response, dir_path: str = None, repo_hash: str = None, commit_hash: str = None):
     """Execute a tool call returned by the LLM, resolving relative paths using dir_path.
 
     Args:
         response: The LLM response object containing a tool call.
         dir_path: Optional target directory to resolve relative file/directory paths.
+        repo_hash: Optional repository hash, used to key the file content cache.
+        commit_hash: Optional commit of the checkout at dir_path, used to key the file content cache.
     """
     tool_call = response.choices[0].message.tool_calls[0]
     tool_name = tool_call.function.name
@@ -257,22 +357,29 @@ def get_tool_response(response, dir_path: str = None):
     # Resolve relative paths for common arg names
     resolved_args = dict(tool_args)
     try:
-        if "file_path" in tool_args and dir_path:
+        if tool_name in INDEX_TOOLS:
+            resolved_args["repo_hash"] = repo_hash
+        elif "file_path" in tool_args and dir_path:
             fp = tool_args.get("file_path")
             if fp and not os.path.isabs(fp):
                 resolved_args["file_path"] = os.path.normpath(
                     os.path.join(dir_path, fp)
                 )
 
-        if "directory" in tool_args and dir_path:
+        if "directory" in tool_args and dir_path and tool_name not in INDEX_TOOLS:
             d = tool_args.get("directory")
             if d and not os.path.isabs(d):
                 resolved_args["directory"] = os.path.normpath(os.path.join(dir_path, d))
 
         logger_instance.info(f"Resolved tool args for {tool_name}: {resolved_args}")
 
+        if tool_name == "read_file" and dir_path and repo_hash:
+            resolved_args.update(repo_root=dir_path, repo_hash=repo_hash, commit_hash=commit_hash)
+
         # Look up the correct tool locally, and call it with the resolved arguments
         tool_result = TOOL_MAPPING[tool_name](**resolved_args)
+        if inspect.isawaitable(tool_result):
+            tool_result = await tool_result
 
         logger_instance.info(f"Tool {tool_name} execution completed")
 
@@ -307,7 +414,7 @@ async def run_agentic_loop(messages, max_iterations=10, repo_hash=None, dir_path
     Project Data Flow Diagram:
     {project_context["project_data_flow_diagram"]}
     Project Cursory Explanation:
-    {project_context["project_cursory_explanation"]}
+    {project_context.get("compact_explanation") or project_context["project_cursory_explanation"]}
     """
 
     messages[0]["content"] = (
@@ -318,6 +425,8 @@ async def run_agentic_loop(messages, max_iterations=10, repo_hash=None, dir_path
         + "\n```"
     )
 
+    commit_hash = await git_repo_management_service.get_stored_commit_hash(repo_hash) if repo_hash else None
+
     logger_instance.info(f"Starting agentic loop with max {max_iterations} iterations")
     iteration_count = 0
 
@@ -332,7 +441,9 @@ async def run_agentic_loop(messages, max_iterations=10, repo_hash=None, dir_path
 
         if resp.choices[0].message.tool_calls is not None:
             logger_instance.info("Tool calls detected, executing tools")
-            messages.append(get_tool_response(resp, dir_path=dir_path))
+            messages.append(
+                await get_tool_response(resp, dir_path=dir_path, repo_hash=repo_hash, commit_hash=commit_hash)
+            )
         else:
             logger_instance.info("No tool calls detected, ending loop")
             break
@@ -344,6 +455,7 @@ async def run_agentic_loop(messages, max_iterations=10, repo_hash=None, dir_path
     with open("messages.json", "w") as f:
         json.dump(messages, f)
     logger_instance.info(f"Agentic loop completed after {iteration_count} iterations")
+    file_content_cache.log_stats(f"chat for {repo_hash}")
     return messages[-1]["content"]
 
 
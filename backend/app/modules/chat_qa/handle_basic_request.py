@@ -5,7 +5,7 @@ from core.llm_clients import llm_client
 from core.config import settings
 from core.logger import logger_instance
 from app.modules.auto_generation.service import AutoGenerationService
-from app.modules.auto_generation.service_definations import ParseDefinitionsService
+from app.modules.auto_generation.service_definations import parse_definitions_service
 
 
 
@@ -20,7 +20,7 @@ if IS_PRO_USER:
 
 
 auto_gen_service = AutoGenerationService()
-parse_definations = ParseDefinitionsService()
+parse_definations = parse_definitions_service
 
 TOOLS = [
     {
@@ -187,7 +187,7 @@ async def run_basic_agentic_loop(messages, max_iterations=MAX_ITERATIONS, repo_h
     project_document = await auto_gen_service.get_project_intro_by_hash(repo_hash)
     project_context = {
         "intro": project_document["project_intro"],
-        "cursory_explanation": project_document["project_cursory_explanation"],
+        "cursory_explanation": project_document.get("compact_explanation") or project_document["project_cursory_explanation"],
         "data_flow_diagram": project_document["project_data_flow_diagram"],
     }
     repo_symbols = []
@@ -236,21 +236,32 @@ async def run_basic_agentic_loop(messages, max_iterations=MAX_ITERATIONS, repo_h
 
 
 async def resolve_definations(message, mentioned_definations: List[Dict], repo_hash: str):
-    definations_full_info = await parse_definations.get_all_node_full_info(repo_hash)
     additional_info = ""
     additional_info += f"""
     The following are the definitions of the mentioned code file, classes or functions mentioned in the user message:\n\n
     """
-    for mentioned_defination in mentioned_definations:
-        for definations in definations_full_info:
-            if definations['node_name'] == mentioned_defination.node_name and definations['file_name'] == mentioned_defination.file_name and definations["start_end_lines"][0] == mentioned_defination.start_end_lines[0] and definations["start_end_lines"][1] == mentioned_defination.start_end_lines[1] and definations["node_type"] == mentioned_defination.node_type:
-                additional_info += f""" \n\n
-                The code snippet of @{mentioned_defination.node_name} which is mentioned above is:
-                ```
-                {definations['code_snippet']}
-                ```\n\n
-                """
-                break
+    keys = [
+        (
+            mentioned_defination.node_type,
+            mentioned_defination.file_name,
+            mentioned_defination.node_name,
+            mentioned_defination.start_end_lines[0],
+            mentioned_defination.start_end_lines[1],
+        )
+        for mentioned_defination in mentioned_definations
+    ]
+    # only the mentioned snippets are fetched, keyed through the cached per-repo index
+    definations_by_key = await parse_definations.get_definitions_by_keys(repo_hash, keys)
+    for mentioned_defination, key in zip(mentioned_definations, keys):
+        definations = definations_by_key.get(key)
+        if definations is None:
+            continue
+        additional_info += f""" \n\n
+        The code snippet of @{mentioned_defination.node_name} which is mentioned above is:
+        ```
+        {definations['code_snippet']}
+        ```\n\n
+        """
     # message = message.replace(f"@{definitions['node_name']}", f"@{definitions['node_name']}")
     return message + additional_info
 
@@ -69,9 +69,9 @@ class ChatQaService:
                             "project_data_flow_diagram": intro_data.get(
                                 "project_data_flow_diagram", ""
                             ),
-                            "project_cursory_explanation": intro_data.get(
-                                "project_cursory_explanation", ""
-                            ),
+                            # The compact encoding costs fewer prompt tokens than the display tree
+                            "project_cursory_explanation": intro_data.get("compact_explanation")
+                            or intro_data.get("project_cursory_explanation", ""),
                         }
                         self.logger.info(
                             f"Loaded project intro for repo_hash: {repo_hash}"
@@ -310,8 +310,8 @@ class ChatQaService:
                 "project_data_flow_diagram", ""
             )
             project_cursory_explanation = project_context.get(
-                "project_cursory_explanation", ""
-            )
+                "compact_explanation"
+            ) or project_context.get("project_cursory_explanation", "")
             # Generate AI response
             context_message = f"""
             Project Introduction:
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import hashlib
 import httpx
@@ -6,12 +7,13 @@ import shutil
 from datetime import datetime
 import tempfile
 from pymongo.errors import PyMongoError
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any
 from urllib.parse import urlparse
 from core.clients import mongodb_client
 from core.config import settings
 from core.logger import logger_instance
 from utils.s3_utils import s3, zip_folder, upload_file_to_s3, download_and_extract_zip
+from utils.repo_snapshot import RepoSnapshot
 from app.modules.git_repo_setup.models import (
     GitRepoModel,
     MerkleTreeData,
@@ -70,6 +72,28 @@ class MerkleHashService:
                 chunk_hash = self.hash_data(chunk)
                 chunk_hashes.append(chunk_hash)
 
+        return self._merkle_root(chunk_hashes)
+
+
+    def compute_data_hash(self, data: bytes, chunk_size: int = 1_048_576) -> str:
+        """Compute the same Merkle root as compute_file_hash for in-memory content.
+
+        Args:
+            data: File content already read from disk
+            chunk_size: Size of chunks in bytes (default: 1MB)
+
+        Returns:
+            Hexadecimal Merkle root hash
+        """
+        chunk_hashes = [
+            self.hash_data(data[i : i + chunk_size])
+            for i in range(0, len(data), chunk_size)
+        ]
+        return self._merkle_root(chunk_hashes)
+
+
+    def _merkle_root(self, chunk_hashes: List[str]) -> str:
+        """Reduce a list of chunk hashes to a single Merkle root."""
         # Handle empty file
         if len(chunk_hashes) == 0:
             return self.hash_data(b"")
@@ -96,6 +120,18 @@ class MerkleHashService:
         return chunk_hashes[0]
 
 
+    def scan_repo(self, root_dir: str) -> RepoSnapshot:
+        """Walk a checkout once and return a RepoSnapshot shared by all ingest stages.
+
+        Args:
+            root_dir: Root directory to scan
+
+        Returns:
+            RepoSnapshot using this service's ignore rules and file hashing
+        """
+        return RepoSnapshot.scan(root_dir, self.DEFAULT_IGNORE, self.compute_data_hash)
+
+
     def compute_directory_tree_hash(self, root_dir: str) -> Dict[str, str]:
         """Compute Merkle hashes for all files in a directory tree.
 
@@ -128,11 +164,12 @@ class MerkleHashService:
         return file_hashes
 
 
-    def compute_merkle_tree(self, root_dir: str) -> Tuple[str, List[Dict], List[Dict]]:
+    def compute_merkle_tree(self, root_dir: str, snapshot: Optional[RepoSnapshot] = None) -> Tuple[str, List[Dict], List[Dict]]:
         """Compute Git-style directory tree hash with Merkle file hashes.
 
         Args:
             root_dir: Root directory to scan
+            snapshot: Optional RepoSnapshot of root_dir; scanned here if not given
 
         Returns:
             Tuple of (root_hash, file_records, dir_records) where:
@@ -140,40 +177,30 @@ class MerkleHashService:
             - file_records: List of dicts with 'path' and 'hash' for each file
             - dir_records: List of dicts with 'path', 'hash', and 'children' for each directory
         """
+        if snapshot is None:
+            snapshot = self.scan_repo(root_dir)
+
         file_records = []
         dir_records = []
 
-        def compute_tree_hash(dir_path: str) -> str:
+        def compute_tree_hash(rel_dir: str) -> str:
             """Recursively compute hash for a directory."""
             entries = []
             children = []
 
-            try:
-                items = sorted(os.listdir(dir_path))
-            except (IOError, OSError):
-                # Can't read directory, return empty hash
-                return self.hash_data(b"")
-
-            for item in items:
-                if item in self.DEFAULT_IGNORE:
-                    continue
+            for item in snapshot.directories.get(rel_dir, []):
+                item_path = item if rel_dir == "." else f"{rel_dir}/{item}"
 
-                item_path = os.path.join(dir_path, item)
-                relative_path = os.path.relpath(item_path, root_dir)
-
-                if os.path.isfile(item_path):
-                    try:
-                        file_hash = self.compute_file_hash(item_path)
-                        entry = f"blob {item} {file_hash}"
-                        entries.append(entry)
-                        children.append(item)
-                        file_records.append({"path": relative_path, "hash": file_hash})
-                    except (IOError, OSError):
+                if item_path in snapshot.files:
+                    file_hash = snapshot.file_hash(item_path)
+                    if file_hash is None:
                         continue
-                elif os.path.isdir(item_path):
+                    entries.append(f"blob {item} {file_hash}")
+                    children.append(item)
+                    file_records.append({"path": item_path, "hash": file_hash})
+                elif item_path in snapshot.directories:
                     dir_hash = compute_tree_hash(item_path)
-                    entry = f"tree {item} {dir_hash}"
-                    entries.append(entry)
+                    entries.append(f"tree {item} {dir_hash}")
                     children.append(item)
 
             # Compute directory hash from sorted entries
@@ -181,27 +208,17 @@ class MerkleHashService:
             dir_hash = self.hash_data(tree_content.encode("utf-8"))
 
             # Record directory info
-            relative_dir_path = os.path.relpath(dir_path, root_dir)
-            if relative_dir_path != ".":
+            if rel_dir != ".":
                 dir_records.append(
-                    {"path": relative_dir_path, "hash": dir_hash, "children": children}
+                    {"path": rel_dir, "hash": dir_hash, "children": children}
                 )
 
             return dir_hash
 
-        root_hash = compute_tree_hash(root_dir)
+        root_hash = compute_tree_hash(".")
 
         # Add root directory record
-        try:
-            root_children = sorted(
-                [
-                    item
-                    for item in os.listdir(root_dir)
-                    if item not in self.DEFAULT_IGNORE
-                ]
-            )
-        except (IOError, OSError):
-            root_children = []
+        root_children = list(snapshot.directories.get(".", []))
 
         dir_records.insert(
             0, {"path": ".", "hash": root_hash, "children": root_children}
@@ -478,12 +495,14 @@ class GitRepoManagementService:
             }
 
 
-    def clone_repo(self, github_url: str) -> Dict[str, Any]:
+    def clone_repo(self, github_url: str, refresh: bool = False) -> Dict[str, Any]:
         """
         Ensure a GitHub repo is cloned to disk.
 
         Args:
             github_url: GitHub repository URL to clone
+            refresh: If the checkout already exists, bring it to the remote's latest commit
+                instead of reusing it as-is
 
         Returns:
             Dict with keys: github_url, repo_name, repo_hash, local_path,
@@ -505,6 +524,15 @@ class GitRepoManagementService:
             # Create base directory if needed
             os.makedirs(target_base, exist_ok=True)
 
+            # An existing checkout may be stale; update it in place or start over
+            if refresh and os.path.exists(dest):
+                if os.path.isdir(os.path.join(dest, ".git")):
+                    subprocess.run(["git", "-C", dest, "fetch", "--depth", "1", "origin", "HEAD"], check=True)
+                    subprocess.run(["git", "-C", dest, "reset", "--hard", "FETCH_HEAD"], check=True)
+                    subprocess.run(["git", "-C", dest, "clean", "-fdx"], check=True)
+                else:
+                    shutil.rmtree(dest)
+
             # Clone repo if it doesn't exist
             if not os.path.exists(dest):
                 try:
@@ -637,6 +665,34 @@ class GitRepoManagementService:
             return {"error": str(e)}
 
 
+    async def get_stored_commit_hash(self, repo_hash: str) -> Optional[str]:
+        """Return the commit hash recorded for repo_hash without loading its merkle tree."""
+        try:
+            await self._ensure_indexes()
+            repo_doc = await self.git_repos_collection.find_one(
+                {"repo_hash": repo_hash}, projection={"latest_commit_hash": 1, "_id": 0}
+            )
+            return repo_doc.get("latest_commit_hash") if repo_doc else None
+        except Exception as e:
+            logger_instance.error(f"Error getting stored commit hash for {repo_hash}: {str(e)}")
+            return None
+
+
+    async def get_file_hashes(self, repo_hash: str) -> Dict[str, str]:
+        """Return {path: merkle hash} of every file in the stored tree, without roles or directories."""
+        try:
+            await self._ensure_indexes()
+            repo_doc = await self.git_repos_collection.find_one(
+                {"repo_hash": repo_hash},
+                projection={"merkle_tree.files.path": 1, "merkle_tree.files.hash": 1, "_id": 0},
+            )
+            files = ((repo_doc or {}).get("merkle_tree") or {}).get("files") or []
+            return {f["path"]: f["hash"] for f in files}
+        except Exception as e:
+            logger_instance.error(f"Error getting file hashes for {repo_hash}: {str(e)}")
+            return {}
+
+
     async def insert_role_hash(self, repo_model: GitRepoModel, filedir_path: str, filedir_hash: str, filedir_role: str) -> Dict[str, Any]:
         """
         Update both the hash and role for a file or directory in the repository's merkle tree.
@@ -756,6 +812,23 @@ class GitRepoManagementService:
             # Be safe: never block updates due to errors here
             logger_instance.error(f"_preserve_unchanged_roles skipped due to error: {e}")
 
+    def _carry_token_counts(self, old_tree: MerkleTreeData, new_tree: MerkleTreeData) -> None:
+        """
+        Copy cached token counts onto new file records whose content hash is unchanged.
+        Token counts are a pure function of content, so they are keyed by hash, not path.
+        """
+        known_counts = {
+            record.hash: record.token_count
+            for record in (old_tree.files or [])
+            if record.token_count is not None
+        }
+        carried = 0
+        for record in (new_tree.files or []):
+            if record.token_count is None and record.hash in known_counts:
+                record.token_count = known_counts[record.hash]
+                carried += 1
+        logger_instance.info(f"Carried token counts for {carried} unchanged files")
+
     async def get_updated_repo_by_hash(self, repo_hash: str) -> Dict[str, Any]:
         """
         Get updated repository by comparing latest commit hash with stored version.
@@ -772,6 +845,7 @@ class GitRepoManagementService:
                 - merkle_diff: Dict with merkle tree differences (only if changed)
                 - local_path: str path to extracted/cloned repo
                 - repo_model: Dict of GitRepoModel document
+                - snapshot: RepoSnapshot of the fresh checkout (only if changed)
                 - error: str error message if failed
                 - not_found: bool indicating if repo was not found
         """
@@ -839,15 +913,20 @@ class GitRepoManagementService:
                 # Commits differ - clone fresh and update
                 logger_instance.info(f"Changes detected for repo {repo_hash}. Cloning fresh...")
                 
-                # Clone the repo
-                clone_result = self.clone_repo(normalized_url)
+                # Clone the repo; git fetch/reset/clean block, so keep them off the event loop
+                clone_result = await asyncio.to_thread(self.clone_repo, normalized_url, refresh=True)
                 if "error" in clone_result:
                     return clone_result
                 
                 new_local_path = clone_result["local_path"]
                 
-                # Compute new merkle tree
-                new_root_hash, new_file_records, new_dir_records = self.merkle_service.compute_merkle_tree(new_local_path)
+                # Scan the checkout once; the snapshot is reused by the ingest stages
+                snapshot = await asyncio.to_thread(self.merkle_service.scan_repo, new_local_path)
+
+                # Compute new merkle tree (reads and hashes every file)
+                new_root_hash, new_file_records, new_dir_records = await asyncio.to_thread(
+                    self.merkle_service.compute_merkle_tree, new_local_path, snapshot=snapshot
+                )
                 
                 # Create new merkle tree data
                 new_merkle_tree = MerkleTreeData(
@@ -861,6 +940,7 @@ class GitRepoManagementService:
                 # Compare merkle trees (if old tree exists)
                 merkle_diff = None
                 if repo_model.merkle_tree:
+                    self._carry_token_counts(repo_model.merkle_tree, new_merkle_tree)
                     old_merkle_dict = repo_model.merkle_tree.model_dump()
                     new_merkle_dict = new_merkle_tree.model_dump()
                     merkle_diff = self.merkle_service.compare_merkle_trees(old_merkle_dict, new_merkle_dict)
@@ -895,7 +975,8 @@ class GitRepoManagementService:
                     "changed": True,
                     "merkle_diff": merkle_diff,
                     "local_path": new_local_path,
-                    "repo_model": repo_model.model_dump()
+                    "repo_model": repo_model.model_dump(),
+                    "snapshot": snapshot,
                 }
             
         except Exception as e:
@@ -903,7 +984,7 @@ class GitRepoManagementService:
             return {"error": f"Failed to get updated repository: {str(e)}"}
 
 
-    async def upsert_git_repo_model(self, github_url: str, repo_hash: str, repo_path: str, latest_commit_hash: str, file_roles: Dict[str, Any]) -> Dict[str, Any]:
+    async def upsert_git_repo_model(self, github_url: str, repo_hash: str, repo_path: str, latest_commit_hash: str, file_roles: Dict[str, Any], snapshot: Optional[RepoSnapshot] = None) -> Dict[str, Any]:
         """
         Upsert a git repository model with merkle tree generation and file role assignment.
         
@@ -916,6 +997,7 @@ class GitRepoManagementService:
             repo_path: Local path to the repository
             latest_commit_hash: Latest commit hash from GitHub
             file_roles: Dict of file roles in format "absolute_file_path": "role_description"
+            snapshot: Optional RepoSnapshot of repo_path, so file hashes reuse contents already read
             
         Returns:
             Dict with keys:
@@ -934,7 +1016,7 @@ class GitRepoManagementService:
             logger_instance.info(f"Uploaded repository to S3 with key: {s3_key}")
             
             # Compute merkle tree
-            root_hash, file_records, dir_records = self.merkle_service.compute_merkle_tree(repo_path)
+            root_hash, file_records, dir_records = self.merkle_service.compute_merkle_tree(repo_path, snapshot=snapshot)
             
             logger_instance.info(f"Generated merkle tree with root hash: {root_hash}")
             
@@ -952,10 +1034,12 @@ class GitRepoManagementService:
             for fr in file_records:
                 file_path = fr["path"]
                 role = role_map.get(file_path, None)
+                entry = snapshot.get(file_path) if snapshot is not None else None
                 merkle_files.append(MerkleFileRecord(
                     path=file_path,
                     hash=fr["hash"],
-                    role=role
+                    role=role,
+                    token_count=entry.token_count if entry is not None else None,
                 ))
             
             # Create MerkleDirectoryRecord instances with roles
@@ -1017,7 +1101,7 @@ class GitRepoManagementService:
             return {"error": f"Failed to upsert git repo model: {str(e)}"}
 
 
-    async def update_git_repo_model(self, repo_path: str, new_repo_model: GitRepoModel, merkle_diff: Dict[str, Any], file_roles: Dict[str, str]) -> Dict[str, Any]:
+    async def update_git_repo_model(self, repo_path: str, new_repo_model: GitRepoModel, merkle_diff: Dict[str, Any], file_roles: Dict[str, str], snapshot: Optional[RepoSnapshot] = None) -> Dict[str, Any]:
         """
         Update an existing repository model with new merkle tree data and file roles.
         
@@ -1029,6 +1113,7 @@ class GitRepoManagementService:
             new_repo_model: GitRepoModel with updated merkle tree data
             merkle_diff: Dictionary containing merkle tree differences (from compare_merkle_trees)
             file_roles: Dict mapping absolute file/directory paths to their role descriptions
+            snapshot: Optional RepoSnapshot whose cached token counts are stored on file records
             
         Returns:
             Dict with keys:
@@ -1038,6 +1123,10 @@ class GitRepoManagementService:
                 - error: error message if failed
         """
         try:
+            # get_updated_repo_by_hash hands the model over as a dict
+            if isinstance(new_repo_model, dict):
+                new_repo_model = GitRepoModel(**new_repo_model)
+
             # Check if merkle_tree exists in new_repo_model
             if not new_repo_model.merkle_tree:
                 return {"error": "Repository model does not have a merkle tree"}
@@ -1083,6 +1172,13 @@ class GitRepoManagementService:
                     file_record.role = role_map[file_record.path]
                     updated_count += 1
             
+            # Store token counts computed during this ingest
+            if snapshot is not None:
+                for file_record in new_repo_model.merkle_tree.files:
+                    entry = snapshot.get(file_record.path)
+                    if entry is not None and entry.token_count is not None:
+                        file_record.token_count = entry.token_count
+
             # Update roles for directories (only for changed/new paths unless merkle_diff is None)
             for dir_record in new_repo_model.merkle_tree.directories:
                 if (
@@ -1114,13 +1210,15 @@ class GitRepoManagementService:
             logger_instance.error(f"Failed to update git repo model: {str(e)}")
             return {"error": f"Failed to update git repo model: {str(e)}"}
 
-    def get_all_role_map(self, repo_model: GitRepoModel, repo_path: str) -> Dict[str, str]:
+    def get_all_role_map(self, repo_model: GitRepoModel, repo_path: str, include_directories: bool = False) -> Dict[str, str]:
         """
-        Aggregate roles for all files and directories from the repository's merkle tree.
+        Aggregate roles for all files (and optionally directories) from the repository's merkle tree.
 
         Args:
             repo_model: GitRepoModel for the repository
             repo_path: Absolute path to the repository root
+            include_directories: Also include directory summaries; off for callers that
+                render the file tree, where a directory must not appear as a file
 
         Returns:
             Dict mapping absolute paths to role strings for all entries where role is not None.
@@ -1148,7 +1246,7 @@ class GitRepoManagementService:
                     roles[abs_path] = record.role
                     file_count += 1
 
-            for record in (repo_model.merkle_tree.directories or []):
+            for record in (repo_model.merkle_tree.directories or []) if include_directories else []:
                 if record.role is not None:
                     abs_path = os.path.normpath(os.path.join(repo_path, record.path))
                     roles[abs_path] = record.role
@@ -12,6 +12,9 @@ class MerkleFileRecord(BaseModel):
     role: Optional[str] = Field(
         default=None, description="Human-readable description of the file"
     )
+    token_count: Optional[int] = Field(
+        default=None, description="cl100k_base token count of the file content identified by hash"
+    )
 
 class MerkleDirectoryRecord(BaseModel):
     """Model representing a directory with its Merkle tree hash."""
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from starlette import status
 from core.logger import logger_instance
 import traceback
@@ -6,6 +7,7 @@ from typing import List
 from .schemas import CreateGitRepoRequest, CreateGitRepoResponse, GetGitRepoResponse, UpdateGitRepoResponse
 from .services import GitRepoSetupService
 from .management_services import GitRepoManagementService
+from utils.ingest_progress import ingest_progress
 
 router = APIRouter()
 
@@ -28,8 +30,12 @@ async def create_git_repo(payload: CreateGitRepoRequest):
                 detail=intro_result["error"],
             )
         
-        # parsing and saving new definitions to db (do not overwrite intro_result)
-        parse_result = await git_repo_setup_service.parse_and_save_definitions(repo_url=str(payload.github_url))
+        # parsing and saving new definitions to db (do not overwrite intro_result),
+        # unless generate_intro already refreshed them
+        if isinstance(intro_result, dict) and intro_result.get("definitions_refreshed"):
+            parse_result = {"success": True}
+        else:
+            parse_result = await git_repo_setup_service.parse_and_save_definitions(repo_url=str(payload.github_url))
         logger_instance.info(f"Parsed and saved definitions to db: {parse_result}")
         if "error" in parse_result:
             raise HTTPException(
@@ -44,6 +50,50 @@ async def create_git_repo(payload: CreateGitRepoRequest):
         )
 
 
+def _progress_stream(repo_hash: str, request: Request) -> StreamingResponse:
+    """Wrap the progress channel of repo_hash in an SSE response, resuming after Last-Event-ID."""
+    try:
+        last_event_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_event_id = 0
+    return StreamingResponse(
+        ingest_progress.subscribe(repo_hash, last_event_id=last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/git-repo/create/stream")
+async def create_git_repo_stream(payload: CreateGitRepoRequest, request: Request):
+    """
+    Start (or attach to) the ingest of a GitHub URL and stream its progress as server-sent events.
+
+    Events: stage, file_role, agent, agent_delta (streamed P2 markdown), agent_output,
+    then a final done (with repo_hash) or error. The ingest keeps running if the client
+    disconnects; reconnect with GET /git-repo/{repo_hash}/progress and Last-Event-ID.
+    """
+    try:
+        logger_instance.info(f"Starting streamed ingest for URL: {payload.github_url}")
+        repo_hash = git_repo_setup_service.start_create_ingest(str(payload.github_url))
+        return _progress_stream(repo_hash, request)
+    except Exception as e:
+        logger_instance.error(f"Unexpected error in create_git_repo_stream: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        )
+
+
+@router.get("/git-repo/{repo_hash}/progress")
+async def git_repo_progress(repo_hash: str, request: Request):
+    """Stream (or replay, after Last-Event-ID) the progress events of the latest ingest of repo_hash."""
+    if not ingest_progress.has_channel(repo_hash):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No ingest progress for repo_hash: {repo_hash}",
+        )
+    return _progress_stream(repo_hash, request)
+
+
 @router.get("/git-repo/{repo_hash}", response_model=GetGitRepoResponse)
 async def get_git_repo(repo_hash: str):
     """Retrieve repository metadata by its repo_hash."""
@@ -83,9 +133,8 @@ async def update_git_repo(payload: CreateGitRepoRequest):
     try:
         logger_instance.info(f"Updating git repo for URL: {payload.github_url}")
         
+        # definitions are refreshed by the background update once the checkout is current
         result = await git_repo_setup_service.update_repo_by_url(str(payload.github_url))
-        # parsing and saving new definitions to db
-        await git_repo_setup_service.parse_and_save_definitions(repo_url=str(payload.github_url))
 
         await git_repo_setup_service.update_repo_indexer(repo_url=str(payload.github_url))
         
@@ -2,13 +2,14 @@ import hashlib
 import os
 import subprocess
 import asyncio
-from app.modules.auto_generation.service_definations import ParseDefinitionsService
+from app.modules.auto_generation.service_definations import parse_definitions_service
 from core.config import settings
 from core.logger import logger_instance
 from app.modules.auto_generation.service import AutoGenerationService
 from utils.s3_utils import zip_folder, upload_file_to_s3
 from app.modules.git_repo_setup.management_services import GitRepoManagementService
-from typing import Dict, Any, List
+from utils.ingest_progress import ingest_progress, DONE_EVENT, ERROR_EVENT
+from typing import Dict, Any, List, Set
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,6 +19,8 @@ if pro_user:
     from pro_features.request_indexer import request_indexer
 
 class GitRepoSetupService:
+    _background_tasks: Set[asyncio.Task] = set()
+
     def __init__(self):
         self.auto_generation_service = AutoGenerationService()
         self.git_repo_management_service = GitRepoManagementService()
@@ -89,11 +92,14 @@ class GitRepoSetupService:
                     )
             # Run git clone
             self.logger.info(f"Cloning repo to disk: {github_url}")
-            subprocess.run(["git", "clone", github_url, dest], check=True)
+            ingest_progress.publish(repo_hash, "stage", stage="clone", status="started")
+            await asyncio.to_thread(subprocess.run, ["git", "clone", github_url, dest], check=True)
+            ingest_progress.publish(repo_hash, "stage", stage="clone", status="completed")
 
             # zip the repo and upload to s3
-            zip_file_path = zip_folder(dest, f"{repo_hash}.zip")
-            upload_file_to_s3(zip_file_path, f"{repo_hash}")
+            zip_file_path = await asyncio.to_thread(zip_folder, dest, f"{repo_hash}.zip")
+            await asyncio.to_thread(upload_file_to_s3, zip_file_path, f"{repo_hash}")
+            ingest_progress.publish(repo_hash, "stage", stage="upload", status="completed")
 
             # generate intro and save to db
             self.logger.info(f"Generating new intro for repo: {repo_hash}")
@@ -129,7 +135,7 @@ class GitRepoSetupService:
 
     async def update_repo_by_url(self, github_url: str) -> Dict[str, Any]:
         """
-        Update repo metadata (generated intro) by its hash.
+        Update repo metadata (generated intro) by its hash, then refresh its definitions.
 
         Returns a dict with repo data or an error dict.
         """
@@ -148,28 +154,110 @@ class GitRepoSetupService:
         # Run generate_intro in background task without waiting
         async def run_generate_intro():
             try:
-                await self.auto_generation_service.generate_intro(
+                result = await self.auto_generation_service.generate_intro(
                     github_url=github_url,
                     repo_hash=repo_hash,
                     name=self._repo_name_from_url(github_url),
                 )
                 self.logger.info(f"Background intro generation completed for hash: {repo_hash}")
+                if not isinstance(result, dict) or "error" in result:
+                    ingest_progress.finish(repo_hash, ERROR_EVENT, error=self._result_error(result))
+                    return
+
+                parse_result = await self._ensure_definitions(github_url, repo_hash, result)
+                if "error" in parse_result:
+                    ingest_progress.finish(repo_hash, ERROR_EVENT, error=parse_result["error"])
+                    return
+                ingest_progress.finish(repo_hash, DONE_EVENT, repo_hash=repo_hash)
             except Exception as e:
                 self.logger.error(f"Error in background intro generation: {str(e)}")
+                ingest_progress.finish(repo_hash, ERROR_EVENT, error=str(e))
         
-        asyncio.create_task(run_generate_intro())
+        # Like start_create_ingest: a running create or update of this repo already refreshes
+        # the checkout and owns the progress channel, so attach to it instead of racing it
+        if ingest_progress.is_running(repo_hash):
+            self.logger.info(f"Ingest already running for {repo_hash}; attaching")
+            return {"up_to_date": False}
+
+        ingest_progress.start(repo_hash)
+        self._spawn(run_generate_intro())
         
         self.logger.info(f"Started background intro generation for hash: {repo_hash}")
         return {"up_to_date": False}
 
+    def start_create_ingest(self, github_url: str) -> str:
+        """
+        Start the create pipeline (clone, intro generation, definitions) as a detached task.
+
+        The task is not tied to any request, so a client that disconnects does not cancel
+        it. If an ingest of the same repo is already running, it is reused instead of
+        starting another one.
+
+        Returns:
+            The repo_hash whose progress channel reports the ingest
+        """
+        github_url = self._normalize_github_url(github_url)
+        repo_hash = self._generate_repo_hash(github_url)
+        if ingest_progress.is_running(repo_hash):
+            self.logger.info(f"Ingest already running for {repo_hash}; attaching")
+            return repo_hash
+
+        ingest_progress.start(repo_hash)
+        self._spawn(self._run_create_ingest(github_url, repo_hash))
+        return repo_hash
+
+    async def _run_create_ingest(self, github_url: str, repo_hash: str) -> None:
+        try:
+            intro_result = await self.clone_repo_to_disk(github_url)
+            if not isinstance(intro_result, dict) or "error" in intro_result:
+                ingest_progress.finish(repo_hash, ERROR_EVENT, error=self._result_error(intro_result))
+                return
+
+            parse_result = await self._ensure_definitions(github_url, repo_hash, intro_result)
+            if "error" in parse_result:
+                ingest_progress.finish(repo_hash, ERROR_EVENT, error=parse_result["error"])
+                return
+
+            ingest_progress.finish(repo_hash, DONE_EVENT, repo_hash=repo_hash)
+        except Exception as e:
+            self.logger.error(f"Error in create ingest for {repo_hash}: {str(e)}")
+            ingest_progress.finish(repo_hash, ERROR_EVENT, error=str(e))
+
+    def _spawn(self, coro) -> None:
+        # Keep a reference so the detached task is not garbage collected mid-run
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    @staticmethod
+    def _result_error(result: Any) -> str:
+        if isinstance(result, dict):
+            return str(result.get("error", "Unknown error"))
+        return str(result)
+
+    async def _ensure_definitions(self, github_url: str, repo_hash: str, intro_result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Parse definitions unless generate_intro already refreshed them during this ingest.
+
+        generate_intro refreshes the index alongside its agents; a stored intro returned
+        as-is (or a failed refresh) still gets a parse here, reported as the definitions stage.
+        """
+        if intro_result.get("definitions_refreshed"):
+            return {"success": True}
+        # The checkout and merkle tree are current now, so only changed files are reparsed
+        ingest_progress.publish(repo_hash, "stage", stage="definitions", status="started")
+        parse_result = await self.parse_and_save_definitions(repo_url=github_url)
+        if "error" not in parse_result:
+            ingest_progress.publish(repo_hash, "stage", stage="definitions", status="completed")
+        return parse_result
+
     async def parse_and_save_definitions(self, repo_url: str):
         """
         Parse and save definitions to db.
         """
         try:
             repo_hash = self._generate_repo_hash(repo_url)
-            parse_definitions = ParseDefinitionsService()
-            await parse_definitions.parse_definitions(repo_hash=repo_hash, github_url=repo_url)
+            await parse_definitions_service.parse_definitions(repo_hash=repo_hash, github_url=repo_url)
             return {"success": True}
         except Exception as e:
             self.logger.error(f"Error in parse_and_save_definitions: {str(e)}")
@@ -1,5 +1,6 @@
 # from openai import OpenAI
 from types import SimpleNamespace
+from typing import Union
 from langfuse.openai import openai
 from langfuse.openai import AsyncOpenAI
 from core.config import settings
@@ -28,11 +29,18 @@ class UnifiedLLMClient:
     """
     Unified LLM client that automatically routes requests to the appropriate backend
     (Azure or OpenRouter) based on the model name.
+
+    Works with both sync (openai.OpenAI) and async (AsyncOpenAI) clients; with async
+    clients ``create`` returns a coroutine that must be awaited.
     """
     
     AZURE_MODELS = {"gpt-5", "gpt-5-mini", "gpt-4o-mini", "gpt-5.1-codex-mini", "gpt-5.1", "gpt-5.1-chat", "gpt-5-nano"}
     
-    def __init__(self, azure_client: openai.OpenAI, openrouter_client: openai.OpenAI):
+    def __init__(
+        self,
+        azure_client: Union[openai.OpenAI, AsyncOpenAI],
+        openrouter_client: Union[openai.OpenAI, AsyncOpenAI],
+    ):
         self._azure_client = azure_client
         self._openrouter_client = openrouter_client
         
@@ -49,6 +57,9 @@ class UnifiedLLMClient:
 # Create a single unified client instance
 llm_client = UnifiedLLMClient(_azure_openai_client, _open_router_client)
 
+# Async counterpart with the same routing, for code running on the event loop
+async_llm_client = UnifiedLLMClient(async_azure_client, async_OR_client)
+
 
 """
 
@@ -64,4 +75,10 @@ llm_client = UnifiedLLMClient(_azure_openai_client, _open_router_client)
         model="anthropic/claude-3.7-sonnet",
         messages=[{"role": "user", "content": "Hello"}]
     )
+
+    # Inside a coroutine, use the async client so the event loop is not blocked
+    response = await async_llm_client.chat.completions.create(
+        model="gpt-5-mini",
+        messages=[{"role": "user", "content": "Hello"}]
+    )
 """
\ No newline at end of file
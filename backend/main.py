@@ -26,6 +26,7 @@ from core.config import settings
 # Database
 from core.postgres_db import engine, init_tables, verify_postgres_connection
 from core.clients import mongodb_client, redis_client
+from app.modules.auto_generation.service_definations import parse_definitions_service
 
  # Import custom logger
 from core.logger import logger_instance 
@@ -46,6 +47,9 @@ async def lifespan(app: FastAPI):
         await mongodb_client.admin.command("ping")
         logger_instance.info("MongoDB connection validated successfully")
 
+        # Definitions indexes and the one-off legacy migration, before any ingest runs
+        await parse_definitions_service.initialize()
+
         # Postgres init and connectivity check
         await init_tables()
         await verify_postgres_connection()
@@ -99,6 +103,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["ETag", "X-Next-Cursor"],  # Read by the definitions picker
 )
 
 # Include auto generation routes
@@ -0,0 +1,28 @@
+import os
+
+
+# core.config requires every setting at import time. The tests only exercise modules that
+# need no database or LLM, so placeholders are enough; a local .env still takes precedence.
+for _name in (
+    "OPENROUTER_API_KEY",
+    "AZURE_API_KEY",
+    "AZURE_API_BASE",
+    "MONGODB_URI",
+    "DB_NAME",
+    "DATABASE_URL",
+    "PARENT_DIR",
+    "AWS_ACCESS_KEY_ID",
+    "AWS_SECRET_ACCESS_KEY",
+    "AWS_REGION",
+    "S3_BUCKET_NAME",
+    "FRONTEND_BASE_URL",
+    "LANGFUSE_SECRET_KEY",
+    "LANGFUSE_BASE_URL",
+    "LANGFUSE_PUBLIC_KEY",
+    "CLERK_SECRET_KEY",
+    "REDIS_REST_URL",
+    "REDIS_REST_TOKEN",
+    "IS_PRO_USER",
+):
+    os.environ.setdefault(_name, "test")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
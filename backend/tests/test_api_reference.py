@@ -0,0 +1,142 @@
+from app.modules.auto_generation.api_reference import ApiSymbol, build_api_symbols, flatten, render_api_reference
+
+
+def definition(name, node_type="function", file_name="repo/app.py", lines=(0, 1), **extra):
+    row = {
+        "_id": f"{file_name}:{name}:{lines[0]}",
+        "node_name": name,
+        "node_type": node_type,
+        "file_name": file_name,
+        "start_end_lines": list(lines),
+    }
+    row.update(extra)
+    return row
+
+
+def qualified(symbols):
+    return [symbol.qualified_name for symbol in flatten(symbols)]
+
+
+def test_methods_nest_under_classes_and_local_functions_are_skipped():
+    definitions = [
+        definition("Client", "class", lines=(0, 20), signature="class Client"),
+        definition("__init__", lines=(1, 3)),
+        definition("get", lines=(4, 10), signature="def get(self, path)"),
+        definition("_retry", lines=(6, 8)),
+        definition("_reset", lines=(11, 12)),
+        definition("connect", lines=(22, 30)),
+        definition("parse", lines=(24, 26)),
+    ]
+
+    symbols, omitted = build_api_symbols(definitions, "library")
+
+    assert omitted == 0
+    assert [(s.kind, s.name) for s in symbols] == [("class", "Client"), ("function", "connect")]
+    # __init__ is public; _retry is local to get and _reset is private
+    assert [(m.kind, m.qualified_name) for m in symbols[0].members] == [("method", "Client.__init__"), ("method", "Client.get")]
+    assert symbols[0].members[1].signature == "def get(self, path)"
+    # Without a stored signature the name stands in
+    assert symbols[1].signature == "connect"
+    assert symbols[0].path == "app.py"
+
+
+def test_members_of_private_classes_are_skipped():
+    definitions = [
+        definition("_Internal", "class", lines=(0, 5)),
+        definition("run", lines=(1, 2)),
+        definition("main", lines=(7, 8)),
+    ]
+
+    symbols, _ = build_api_symbols(definitions, "library")
+
+    assert qualified(symbols) == ["main"]
+
+
+def test_test_example_and_doc_files_are_excluded():
+    definitions = [
+        definition("api", file_name="repo/pkg/api_impl.py"),
+        definition("test_api", file_name="repo/tests/test_api.py"),
+        definition("helper", file_name="repo/pkg/conftest.py"),
+        definition("demo", file_name="repo/examples/demo.py"),
+        definition("render", file_name="repo/web/button.test.ts"),
+        definition("TestMain", file_name="repo/cmd/main_test.go"),
+    ]
+
+    symbols, _ = build_api_symbols(definitions, "library")
+
+    assert qualified(symbols) == ["api"]
+
+
+def test_go_exports_by_capitalization():
+    definitions = [
+        definition("Serve", file_name="repo/server.go"),
+        definition("listen", file_name="repo/server.go", lines=(3, 4)),
+    ]
+
+    symbols, _ = build_api_symbols(definitions, "library")
+
+    assert qualified(symbols) == ["Serve"]
+
+
+def test_services_document_only_route_files_when_there_are_any():
+    definitions = [
+        definition("create_user", file_name="repo/app/routes/users.py"),
+        definition("hash_password", file_name="repo/app/utils/crypto.py"),
+    ]
+
+    service_symbols, _ = build_api_symbols(definitions, "service")
+    library_symbols, _ = build_api_symbols(definitions, "library")
+    without_routes, _ = build_api_symbols(definitions[1:], "application")
+
+    assert qualified(service_symbols) == ["create_user"]
+    assert qualified(library_symbols) == ["create_user", "hash_password"]
+    assert qualified(without_routes) == ["hash_password"]
+
+
+def test_shallowest_modules_fill_max_symbols_and_the_rest_are_counted():
+    definitions = [
+        definition("deep", file_name="repo/a/b/c.py"),
+        definition("Top", "class", file_name="repo/top.py", lines=(0, 5)),
+        definition("method", file_name="repo/top.py", lines=(1, 2)),
+        definition("middle", file_name="repo/a/mid.py"),
+        definition("other", file_name="repo/a/mid.py", lines=(3, 4)),
+    ]
+
+    symbols, omitted = build_api_symbols(definitions, "library", max_symbols=3)
+
+    # Members count towards the limit
+    assert qualified(symbols) == ["Top", "Top.method", "middle"]
+    assert omitted == 2
+
+
+def test_render_api_reference_layout():
+    method = ApiSymbol("m", "method", "get", "Client.get", "client.py", 4, "def get(self, path)", description="Fetch a path.")
+    client = ApiSymbol(
+        "c", "class", "Client", "Client", "client.py", 0, "class Client",
+        docstring="HTTP client.\n\nReuses one session.", members=[method],
+    )
+    helper = ApiSymbol("h", "function", "helper", "helper", "util.go", 9, "func helper()")
+
+    markdown = render_api_reference([client, helper], "library", overview="  Talks to the API.  ", omitted=7)
+
+    assert markdown.startswith("# API Reference\n\n## Overview\n\nTalks to the API.\n")
+    assert "| `client.py` | `Client` |" in markdown
+    assert "| `util.go` | `helper` |" in markdown
+    assert "*7 more symbols in deeper modules are not listed.*" in markdown
+    assert "### class `Client`\n\n```python\nclass Client\n```\n\n*Defined in `client.py` at line 1.*" in markdown
+    # Members are one heading level deeper
+    assert "#### method `Client.get`" in markdown
+    assert "```go\nfunc helper()\n```" in markdown
+    # Without a description the first paragraph of the docstring is used
+    assert "*Defined in `client.py` at line 1.*\n\nHTTP client.\n\n####" in markdown
+    assert "Fetch a path." in markdown
+    assert "Reuses one session." not in markdown
+    assert markdown.endswith("*Defined in `util.go` at line 10.*\n")
+
+
+def test_render_api_reference_titles_by_repo_type():
+    symbol = ApiSymbol("f", "function", "run", "run", "main.py", 0, "def run()")
+
+    assert render_api_reference([symbol], "service").startswith("# API Documentation\n")
+    assert render_api_reference([symbol], "unknown").startswith("# API Reference\n")
+    assert "not listed" not in render_api_reference([symbol], "library")
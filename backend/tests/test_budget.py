@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.modules.auto_generation.budget import (
+    STOP_COMPLETED,
+    STOP_COST,
+    STOP_ITERATIONS,
+    STOP_TIME,
+    STOP_TOKENS,
+    AgentBudget,
+    BudgetController,
+)
+
+
+def usage(prompt, completion, cached=0):
+    return SimpleNamespace(
+        prompt_tokens=prompt,
+        completion_tokens=completion,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached),
+    )
+
+
+def controller(**limits):
+    return BudgetController(agent_name="p1", model="gpt-5-mini", budget=AgentBudget(**limits))
+
+
+def test_no_stop_reason_within_budget():
+    budget = controller()
+    budget.record(usage(1_000, 100))
+    assert budget.stop_reason_for_next_turn() is None
+
+
+def test_tokens_count_the_next_prompt_against_the_limit():
+    budget = controller(max_tokens=10_000)
+    # 4k spent plus a next prompt of at least 4k stays under 90% of the limit
+    budget.record(usage(4_000, 0))
+    assert budget.stop_reason_for_next_turn() is None
+    budget.record(usage(4_500, 0))
+    assert budget.stop_reason_for_next_turn() == STOP_TOKENS
+
+
+def test_cost_limit_includes_cached_input_discount():
+    budget = controller(max_cost_usd=0.01)
+    # 40k prompt tokens, all cached: 40k * 0.25 * 0.1 / 1M = $0.001
+    budget.record(usage(40_000, 0, cached=40_000))
+    assert budget.cost_usd == pytest.approx(0.001)
+    assert budget.stop_reason_for_next_turn() is None
+    budget.record(usage(0, 5_000))
+    assert budget.stop_reason_for_next_turn() == STOP_COST
+
+
+def test_time_limit():
+    budget = controller(max_seconds=10.0)
+    budget.started_at -= 9.5
+    assert budget.stop_reason_for_next_turn() == STOP_TIME
+
+
+def test_iteration_limit_counts_responses_without_usage():
+    budget = controller(max_iterations=2)
+    budget.record(None)
+    budget.record(None)
+    assert budget.stop_reason_for_next_turn() == STOP_ITERATIONS
+
+
+def test_finish_keeps_the_first_stop_reason():
+    budget = controller()
+    budget.stop_reason = STOP_TOKENS
+    budget.finish()
+    assert budget.summary()["stop_reason"] == STOP_TOKENS
+    fresh = controller()
+    fresh.finish()
+    assert fresh.summary()["stop_reason"] == STOP_COMPLETED
+
+
+def test_compact_stubs_old_tool_results_only_past_the_threshold():
+    budget = controller(compact_prompt_tokens=1_000, keep_recent_tool_results=1)
+    messages = [{"role": "system", "content": "s"}] + [
+        {"role": "tool", "tool_call_id": str(i), "content": f"file{i}.py\n" + "x" * 100}
+        for i in range(3)
+    ]
+    budget.record(usage(500, 0))
+    budget.compact(messages)
+    assert budget.compactions == 0
+
+    budget.record(usage(1_500, 0))
+    budget.compact(messages)
+    assert budget.compactions == 1
+    assert messages[1]["content"].startswith("file0.py\n\n[content omitted")
+    assert messages[2]["content"].startswith("file1.py\n\n[content omitted")
+    assert messages[3]["content"].endswith("x" * 100)
+    # Already stubbed results are not compacted again
+    budget.compact(messages)
+    assert budget.compactions == 1
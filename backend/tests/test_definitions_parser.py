@@ -0,0 +1,185 @@
+import threading
+
+import pytest
+
+from app.modules.auto_generation import definitions_parser
+from app.modules.auto_generation.definitions_parser import extract_file, language_for_path, parse_files
+
+
+def requires(lang):
+    return pytest.mark.skipif(not definitions_parser.is_available(lang), reason=f"{lang} grammar not installed")
+
+
+def shapes(definitions):
+    return [(row["node_type"], row["node_name"]) for row in definitions]
+
+
+def by_name(definitions):
+    return {row["node_name"]: row for row in definitions if row["node_type"] != "file"}
+
+
+def refs(references):
+    return [(row["kind"], row["symbol"], row["caller"]) for row in references]
+
+
+PYTHON_SOURCE = b'''import os
+from .util import helper
+
+
+class Store(Base):
+    """Keeps users.
+
+    Backed by a dict."""
+
+    @staticmethod
+    def load(user_id: int) -> dict:
+        return helper(user_id)
+
+
+def main():
+    os.path.join("a")
+'''
+
+
+@requires("python")
+def test_python_definitions_signatures_and_docstrings():
+    definitions, _ = extract_file(PYTHON_SOURCE, "python", "repo/store.py")
+
+    assert shapes(definitions) == [("file", "store.py"), ("class", "Store"), ("function", "load"), ("function", "main")]
+    rows = by_name(definitions)
+    assert rows["Store"]["signature"] == "class Store(Base)"
+    assert rows["Store"]["docstring"] == "Keeps users.\n\nBacked by a dict."
+    # Decorators are part of the signature
+    assert rows["load"]["signature"] == "@staticmethod\ndef load(user_id: int) -> dict"
+    assert rows["main"]["start_end_lines"] == [14, 15]
+    assert all(row["file_name"] == "repo/store.py" for row in definitions)
+
+
+@requires("python")
+def test_python_references_are_attributed_to_the_innermost_scope():
+    _, references = extract_file(PYTHON_SOURCE, "python", "repo/store.py")
+
+    assert refs(references) == [
+        ("import", "os", None),
+        ("import", ".util", None),
+        ("call", "helper", "load"),
+        # Qualified calls keep their last segment
+        ("call", "join", "main"),
+    ]
+
+
+@requires("typescript")
+def test_typescript_interfaces_methods_and_arrow_functions():
+    source = b'''import { load } from "./db";
+
+/** Shape of a user. */
+interface User { name: string }
+
+export class Store {
+  get(id: string): User { return load(id); }
+}
+
+export const make = (n: number): Store => new Store();
+'''
+    definitions, references = extract_file(source, "typescript", "repo/store.ts")
+
+    assert shapes(definitions) == [
+        ("file", "store.ts"), ("class", "User"), ("class", "Store"), ("function", "get"), ("function", "make"),
+    ]
+    rows = by_name(definitions)
+    assert rows["User"]["docstring"] == "Shape of a user."
+    assert rows["get"]["signature"] == "get(id: string): User"
+    assert rows["make"]["signature"] == "const make = (n: number): Store =>"
+    assert refs(references) == [("import", "./db", None), ("call", "load", "get"), ("call", "Store", "make")]
+
+
+@requires("javascript")
+def test_javascript_functions_and_classes():
+    source = b'''import fs from "fs";
+
+// Reads a file
+function read(p) { return fs.readFileSync(p); }
+
+class Reader { run() { read("x"); } }
+'''
+    definitions, references = extract_file(source, "javascript", "repo/read.js")
+
+    assert shapes(definitions) == [("file", "read.js"), ("function", "read"), ("class", "Reader"), ("function", "run")]
+    assert by_name(definitions)["read"]["docstring"] == "Reads a file"
+    assert refs(references) == [("import", "fs", None), ("call", "readFileSync", "read"), ("call", "read", "run")]
+
+
+@requires("go")
+def test_go_structs_and_methods():
+    source = b'''package main
+
+import "fmt"
+
+// Server serves requests.
+type Server struct { addr string }
+
+func (s *Server) Start(port int) error {
+	fmt.Println(port)
+	return nil
+}
+'''
+    definitions, references = extract_file(source, "go", "repo/server.go")
+
+    assert shapes(definitions) == [("file", "server.go"), ("class", "Server"), ("function", "Start")]
+    rows = by_name(definitions)
+    assert rows["Server"]["docstring"] == "Server serves requests."
+    assert rows["Start"]["signature"] == "func (s *Server) Start(port int) error"
+    assert refs(references) == [("import", "fmt", None), ("call", "Println", "Start")]
+
+
+@requires("java")
+def test_java_classes_constructors_and_methods():
+    source = b'''import java.util.List;
+
+/** The application. */
+public class App {
+    public App() {}
+    public int run(String[] args) { return helper(args.length); }
+}
+'''
+    definitions, references = extract_file(source, "java", "repo/App.java")
+
+    assert shapes(definitions) == [("file", "App.java"), ("class", "App"), ("function", "App"), ("function", "run")]
+    app_class, constructor, run = definitions[1:]
+    assert app_class["docstring"] == "The application."
+    assert constructor["signature"] == "public App()"
+    assert run["signature"] == "public int run(String[] args)"
+    assert refs(references) == [("import", "java.util.List", None), ("call", "helper", "run")]
+
+
+def test_language_for_path_uses_the_extension():
+    assert language_for_path("src/App.TSX") == ("tsx" if definitions_parser.is_available("tsx") else None)
+    assert language_for_path("lib/index.mjs") == ("javascript" if definitions_parser.is_available("javascript") else None)
+    assert language_for_path("src/main.rs") is None
+    assert language_for_path("Makefile") is None
+
+
+@requires("python")
+def test_parse_files_skips_unreadable_files(tmp_path):
+    path = tmp_path / "app.py"
+    path.write_bytes(b"def run():\n    start()\n")
+
+    definitions, references = parse_files([
+        (str(path), "python", "repo/app.py"),
+        (str(tmp_path / "missing.py"), "python", "repo/missing.py"),
+    ])
+
+    assert shapes(definitions) == [("file", "app.py"), ("function", "run")]
+    assert refs(references) == [("call", "start", "run")]
+
+
+@requires("python")
+def test_parsers_are_per_thread():
+    main_parser = definitions_parser.get_parser("python")
+    other = []
+    thread = threading.Thread(target=lambda: other.append(definitions_parser.get_parser("python")))
+    thread.start()
+    thread.join()
+
+    assert definitions_parser.get_parser("python") is main_parser
+    assert other[0] is not main_parser
@@ -0,0 +1,67 @@
+import pytest
+
+from utils.file_content_cache import FileContentCache
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.py").write_text("b = 2\n")
+    return tmp_path
+
+
+def test_repeated_reads_are_served_from_memory(repo):
+    cache = FileContentCache()
+    assert cache.read_text("r", "c1", str(repo), "pkg/a.py") == "a = 1\n"
+    (repo / "pkg" / "a.py").write_text("changed\n")
+    # Same commit and normalized path: the cached contents, not the disk
+    assert cache.read_text("r", "c1", str(repo), "/pkg/./a.py") == "a = 1\n"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_a_new_commit_reads_the_disk_again(repo):
+    cache = FileContentCache()
+    cache.read_text("r", "c1", str(repo), "b.py")
+    (repo / "b.py").write_text("b = 3\n")
+    assert cache.read_text("r", "c2", str(repo), "b.py") == "b = 3\n"
+
+
+def test_reads_without_commit_bypass_the_cache(repo):
+    cache = FileContentCache()
+    cache.read_text("r", None, str(repo), "b.py")
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["misses"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(repo):
+    cache = FileContentCache(max_bytes=12)
+    cache.read_text("r", "c1", str(repo), "pkg/a.py")
+    cache.read_text("r", "c1", str(repo), "b.py")
+    cache.read_text("r", "c1", str(repo), "pkg/a.py")
+    (repo / "c.py").write_text("c = 4\n")
+    cache.read_text("r", "c1", str(repo), "c.py")
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["size_bytes"] == 12
+    # b.py was the least recently used, a.py is still cached
+    (repo / "pkg" / "a.py").write_text("changed\n")
+    assert cache.read_text("r", "c1", str(repo), "pkg/a.py") == "a = 1\n"
+
+
+def test_oversized_files_are_not_cached(repo):
+    cache = FileContentCache(max_entry_bytes=4)
+    cache.read_text("r", "c1", str(repo), "b.py")
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_keeps_only_the_current_commit(repo):
+    cache = FileContentCache()
+    cache.read_text("r", "c1", str(repo), "b.py")
+    cache.read_text("r", "c2", str(repo), "pkg/a.py")
+    cache.read_text("other", "c1", str(repo), "b.py")
+    cache.invalidate("r", keep_commit="c2")
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["size_bytes"] == 12
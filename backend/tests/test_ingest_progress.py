@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+from utils.ingest_progress import DONE_EVENT, IngestProgressHub
+
+
+async def collect(hub, repo_hash, last_event_id=0):
+    frames = []
+    async for frame in hub.subscribe(repo_hash, last_event_id=last_event_id, keepalive_seconds=1.0):
+        frames.append(frame)
+    return frames
+
+
+def parse(frame):
+    lines = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+    return int(lines["id"]), lines["event"], json.loads(lines["data"])
+
+
+def test_replay_resumes_after_the_last_event_id():
+    async def run():
+        hub = IngestProgressHub()
+        hub.start("r")
+        hub.publish("r", "stage", stage="clone", status="started")
+        hub.publish("r", "stage", stage="clone", status="completed")
+        hub.finish("r", DONE_EVENT, repo_hash="r")
+        await asyncio.sleep(0)
+        return await collect(hub, "r"), await collect(hub, "r", last_event_id=2)
+
+    everything, resumed = asyncio.run(run())
+    assert [parse(frame)[:2] for frame in everything] == [(1, "stage"), (2, "stage"), (3, DONE_EVENT)]
+    assert [parse(frame)[:2] for frame in resumed] == [(3, DONE_EVENT)]
+
+
+def test_transient_events_cannot_push_out_milestones():
+    async def run():
+        hub = IngestProgressHub(history_size=3)
+        hub.start("r")
+        hub.publish("r", "stage", stage="roles", status="started")
+        for i in range(10):
+            hub.publish("r", "agent_delta", agent="p1", delta=str(i))
+        hub.publish("r", "stage", stage="roles", status="completed")
+        hub.finish("r")
+        return await collect(hub, "r")
+
+    replay = [parse(frame) for frame in asyncio.run(run())]
+    assert [event for _, event, _ in replay] == ["stage", "agent_delta", "agent_delta", "agent_delta", "stage", DONE_EVENT]
+    # Ids stay in publish order across both buffers; only the last deltas are kept
+    assert [event_id for event_id, _, _ in replay] == [1, 9, 10, 11, 12, 13]
+    assert [data["delta"] for _, event, data in replay if event == "agent_delta"] == ["7", "8", "9"]
+
+
+def test_live_subscriber_receives_events_published_from_threads():
+    async def run():
+        hub = IngestProgressHub()
+        hub.start("r")
+        subscriber = asyncio.ensure_future(collect(hub, "r"))
+        await asyncio.sleep(0)
+        await asyncio.to_thread(hub.publish, "r", "file_role", path="a.py")
+        await asyncio.sleep(0)
+        hub.finish("r")
+        return await asyncio.wait_for(subscriber, timeout=2.0)
+
+    assert [parse(frame)[1] for frame in asyncio.run(run())] == ["file_role", DONE_EVENT]
+
+
+def test_finished_channels_are_evicted_after_the_grace_period():
+    async def run():
+        hub = IngestProgressHub(finished_ttl_seconds=0.01)
+        hub.start("r")
+        hub.finish("r")
+        assert hub.has_channel("r") and not hub.is_running("r")
+        await asyncio.sleep(0.05)
+        return hub
+
+    hub = asyncio.run(run())
+    assert not hub.has_channel("r")
+
+
+def test_eviction_spares_a_newer_ingest_of_the_same_repo():
+    async def run():
+        hub = IngestProgressHub(finished_ttl_seconds=0.01)
+        hub.start("r")
+        hub.finish("r")
+        hub.start("r")
+        await asyncio.sleep(0.05)
+        return hub
+
+    hub = asyncio.run(run())
+    assert hub.is_running("r")
+
+
+def test_publish_and_subscribe_without_a_channel():
+    async def run():
+        hub = IngestProgressHub()
+        hub.publish("missing", "stage", stage="clone")
+        return await collect(hub, "missing")
+
+    frames = asyncio.run(run())
+    assert len(frames) == 1
+    assert parse(frames[0])[1] == "error"
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+# The validator module builds the LLM clients at import time
+pytest.importorskip("langfuse")
+
+from utils.mermaid_generation_validation import MermaidGenerationValidator  # noqa: E402
+
+
+VALID = "graph TD\n    A[Start] --> B[End]"
+ONE_ISSUE = "graph TD\n    A[Start (x)] --> B[End]"
+TWO_ISSUES = "graph TD\n    A[Start (x)] --> B[End]\n    B --> C[Done (y)]"
+
+
+def validator_with(rounds):
+    """
+    Validator whose LLM calls return the diagrams of ``rounds``, one list per iteration.
+
+    Returns the validator and the error feedback each iteration was prompted with.
+    """
+    validator = MermaidGenerationValidator()
+    lock = threading.Lock()
+    feedback = []
+    served = {}
+
+    def generate(cursory_explanation, previous_error_code):
+        with lock:
+            if previous_error_code not in feedback:
+                feedback.append(previous_error_code)
+            served[previous_error_code] = served.get(previous_error_code, 0) + 1
+            return rounds[feedback.index(previous_error_code)][served[previous_error_code] - 1]
+
+    validator._generate_diagram_from_llm = generate
+    return validator, feedback
+
+
+def test_first_valid_candidate_wins():
+    validator, feedback = validator_with([[ONE_ISSUE, VALID, TWO_ISSUES]])
+
+    diagram, is_valid = validator.generate_mermaid_diagram("explanation", candidates=3)
+
+    assert (diagram, is_valid) == (VALID, True)
+    assert feedback == [None]
+
+
+def test_best_failure_is_fed_into_the_next_round():
+    validator, feedback = validator_with([[TWO_ISSUES, ONE_ISSUE], [VALID, VALID]])
+
+    diagram, is_valid = validator.generate_mermaid_diagram("explanation", candidates=2)
+
+    assert (diagram, is_valid) == (VALID, True)
+    assert len(feedback) == 2
+    # The candidate with the fewest issues is the one shown to the next round
+    assert ONE_ISSUE in feedback[1] and TWO_ISSUES not in feedback[1]
+
+
+def test_gives_up_with_the_best_failure():
+    validator, _ = validator_with([[TWO_ISSUES, ONE_ISSUE], [TWO_ISSUES, ONE_ISSUE]])
+
+    diagram, is_valid = validator.generate_mermaid_diagram("explanation", max_iterations=2, candidates=2)
+
+    assert (diagram, is_valid) == (ONE_ISSUE, False)
+
+
+def test_generation_errors_only_fail_when_no_candidate_arrives():
+    validator, _ = validator_with([["Error: timeout", VALID]])
+    assert validator.generate_mermaid_diagram("explanation", candidates=2) == (VALID, True)
+
+    validator, _ = validator_with([["Error: timeout"]])
+    assert validator.generate_mermaid_diagram("explanation") == ("Error: timeout", False)
@@ -0,0 +1,80 @@
+import pytest
+
+from utils.mermaid_syntax import validate_mermaid
+
+
+VALID_FLOWCHART = """
+---
+title: Ingest
+---
+flowchart TD
+    %% entry point
+    A["1. Client (browser)"] -->|POST /ingest| B[API]
+    B --> C[(MongoDB)]
+    B --> D{{Parse}}:::proc
+    D --> E & F
+    subgraph workers [Workers]
+        E[Roles] --- F([Agents])
+    end
+    classDef proc fill:#E8F5E8,color:#000
+    style A fill:#E1F5FE
+"""
+
+VALID_SEQUENCE = """
+sequenceDiagram
+    autonumber
+    participant U as User
+    U->>API: Start ingest
+    loop Every agent
+        API-->>U: progress
+    end
+    alt failed
+        API--xU: error
+    else ok
+        API->>+U: done
+    end
+    Note over U,API: finished
+"""
+
+
+@pytest.mark.parametrize("code", [VALID_FLOWCHART, VALID_SEQUENCE, "graph LR; A-->B", "pie\n  \"a\": 1"])
+def test_valid_diagrams(code):
+    result = validate_mermaid(code)
+    assert result.is_valid, result.error_message
+    assert result.error_message is None
+
+
+@pytest.mark.parametrize(
+    "code, line, message",
+    [
+        ("", 1, "Empty diagram"),
+        ("flowcart TD\n A-->B", 1, "Unknown diagram type"),
+        ("graph LR; A[x (y)] --> B", 1, "Parentheses or brackets inside node label"),
+        ("flowchart TD\n A[Start (here)] --> B", 2, "Parentheses or brackets inside node label"),
+        ('flowchart TD\n A[Say "hi" now] --> B', 2, "Quotes inside node label"),
+        ('flowchart TD\n A["Say" now] --> B', 2, "must wrap the whole label"),
+        ("flowchart TD\n A[Start --> B", 2, "Unclosed node label"),
+        ("flowchart TD\n A --> B :::proc", 2, "Unexpected space before ':::'"),
+        ("flowchart TD\n A:::procB[x]", 2, "Missing separator"),
+        ("flowchart TD\n A --> end", 2, "cannot be used as a node id"),
+        ("flowchart TD\n A --> end[Finish]", 2, "cannot be used as a node id"),
+        ("flowchart TD\n classDef end fill:#fff", 2, "cannot be used as a class name"),
+        ("flowchart TD\n A -->|label B", 2, "Unclosed edge label"),
+        ("flowchart TD\n subgraph S\n A --> B", 2, "subgraph is never closed"),
+        ("flowchart TD\n A --> B\n end", 3, "'end' without a matching subgraph"),
+        ("sequenceDiagram\n participant end", 2, "cannot be used as a participant"),
+        ("sequenceDiagram\n A sends to B", 2, "Expected a message"),
+        ("sequenceDiagram\n loop Forever\n A->>B: hi", 2, "Block is never closed"),
+    ],
+)
+def test_reported_issues(code, line, message):
+    result = validate_mermaid(code)
+    assert not result.is_valid
+    assert result.issues[0].line == line
+    assert message in result.issues[0].message
+    assert result.error_message.startswith(f"Parse error on line {line}: ")
+
+
+def test_every_issue_is_reported():
+    result = validate_mermaid("flowchart TD\n A[x (y)] --> B\n subgraph S\n C --> D")
+    assert [issue.line for issue in result.issues] == [2, 3]
@@ -0,0 +1,64 @@
+import hashlib
+import json
+
+import pytest
+
+from app.modules.auto_generation import repo_classifier
+from app.modules.auto_generation.repo_classifier import score_repo_type
+from utils.repo_snapshot import RepoSnapshot
+
+
+needs_toml = pytest.mark.skipif(repo_classifier.tomllib is None, reason="TOML manifests need Python 3.11+")
+
+
+def scan(root, files):
+    for rel_path, content in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return RepoSnapshot.scan(str(root), {".git"}, lambda data: hashlib.sha256(data).hexdigest())
+
+
+@needs_toml
+def test_python_package_without_entry_points_is_a_library(tmp_path):
+    scores = score_repo_type(scan(tmp_path, {
+        "pyproject.toml": '[project]\nname = "fastparse"\ndependencies = ["regex"]\n',
+        "fastparse/__init__.py": "",
+        "docs/index.md": "",
+    }))
+    assert scores.confident_type() == "library"
+
+
+@needs_toml
+def test_web_framework_with_routes_and_dockerfile_is_a_service(tmp_path):
+    scores = score_repo_type(scan(tmp_path, {
+        "pyproject.toml": '[project]\nname = "api"\ndependencies = ["fastapi>=0.100", "uvicorn[standard]"]\n',
+        "Dockerfile": "FROM python:3.12\n",
+        "app/routes/items.py": "",
+    }))
+    assert scores.confident_type() == "service"
+    assert any("fastapi, uvicorn" in reason for reason in scores.evidence)
+
+
+def test_frontend_and_backend_together_are_an_application(tmp_path):
+    scores = score_repo_type(scan(tmp_path, {
+        "frontend/package.json": json.dumps({"private": True, "dependencies": {"next": "15", "react": "19"}}),
+        "frontend/app/page.tsx": "",
+        "backend/package.json": json.dumps({"private": True, "dependencies": {"express": "5"}}),
+        "backend/src/routes/users.js": "",
+    }))
+    assert scores.confident_type() == "application"
+
+
+def test_weak_evidence_is_left_to_the_llm(tmp_path):
+    scores = score_repo_type(scan(tmp_path, {"go.mod": "module example.com/x\n", "x.go": ""}))
+    assert scores.ranked[0] == "library"
+    assert scores.confident_type() is None
+
+
+def test_unparsable_and_deep_manifests_are_skipped(tmp_path):
+    scores = score_repo_type(scan(tmp_path, {
+        "package.json": "{not json",
+        "vendor/a/b/c/package.json": json.dumps({"dependencies": {"express": "5"}}),
+    }))
+    assert scores.scores == {"application": 0.0, "library": 0.0, "service": 0.0}
@@ -0,0 +1,123 @@
+import asyncio
+
+from app.modules.auto_generation.symbol_index import RepoIndexCache, SymbolIndex
+
+
+def definition(name, file_name="repo/app.py", line=0):
+    return {"node_name": name, "node_type": "function", "file_name": file_name, "start_end_lines": [line, line + 1]}
+
+
+NAMES = [
+    "get_definitions",
+    "getDefinition",
+    "get",
+    "get_user",
+    "target",
+    "budget",
+    "parse_definitions",
+    "DefinitionKeyIndex",
+    "save_definitions_batch",
+    "_private_helper",
+]
+
+
+def names(results):
+    return [row["node_name"] for row in results]
+
+
+def test_tiers_rank_exact_then_prefix_then_substring():
+    index = SymbolIndex([definition(name) for name in NAMES])
+    # "get" exactly, then prefixes (shortest first), then names containing it
+    assert names(index.search("get", limit=10)) == [
+        "get", "get_user", "getDefinition", "get_definitions", "budget", "target",
+    ]
+
+
+def test_search_is_case_insensitive():
+    index = SymbolIndex([definition(name) for name in NAMES])
+    assert names(index.search("DEFINITIONKEY"))[0] == "DefinitionKeyIndex"
+
+
+def test_subsequence_matches_after_substrings():
+    index = SymbolIndex([definition(name) for name in NAMES])
+    assert names(index.search("gtdef")) == ["getDefinition", "get_definitions"]
+
+
+def test_typos_fall_back_to_trigram_similarity():
+    index = SymbolIndex([definition(name) for name in NAMES])
+    assert names(index.search("definitons", limit=3))[0] in {"get_definitions", "parse_definitions"}
+
+
+def test_short_queries_return_the_shortest_names_first():
+    index = SymbolIndex([definition(name) for name in NAMES])
+    # The prefix match first, then substring matches shortest first
+    assert names(index.search("_", limit=3)) == ["_private_helper", "get_user", "get_definitions"]
+    assert names(index.search("e", limit=2)) == ["get", "budget"]
+
+
+def test_limit_counts_definitions_not_names():
+    rows = [definition("run", file_name=f"repo/m{i}.py") for i in range(5)] + [definition("runner")]
+    index = SymbolIndex(rows)
+    results = index.search("run", limit=3)
+    assert names(results) == ["run", "run", "run"]
+    assert [row["file_name"] for row in results] == ["repo/m0.py", "repo/m1.py", "repo/m2.py"]
+
+
+def test_empty_query_or_index():
+    assert SymbolIndex([definition("a")]).search("  ") == []
+    assert SymbolIndex([]).search("a") == []
+
+
+def test_cache_rebuilds_when_the_version_changes():
+    async def run():
+        cache = RepoIndexCache(SymbolIndex)
+        loads = []
+
+        async def load_rows():
+            loads.append(1)
+            return [definition("alpha")]
+
+        first = await cache.get("r", "c1", load_rows)
+        same = await cache.get("r", "c1", load_rows)
+        rebuilt = await cache.get("r", "c2", load_rows)
+        return first, same, rebuilt, len(loads)
+
+    first, same, rebuilt, loads = asyncio.run(run())
+    assert first is same
+    assert rebuilt is not first
+    assert loads == 2
+
+
+def test_cache_rebuilds_after_a_reparse_at_the_same_commit():
+    async def run():
+        cache = RepoIndexCache(SymbolIndex)
+        rows = [definition("alpha")]
+
+        async def load_rows():
+            return list(rows)
+
+        # Versions as recorded by save_definitions: commit, schema version, last save
+        before = await cache.get("r", "c1-v3-20260101000000000000", load_rows)
+        rows.append(definition("beta"))
+        after = await cache.get("r", "c1-v4-20260102000000000000", load_rows)
+        return before, after
+
+    before, after = asyncio.run(run())
+    assert names(before.search("beta")) == []
+    assert names(after.search("beta")) == ["beta"]
+
+
+def test_concurrent_misses_share_one_build():
+    async def run():
+        cache = RepoIndexCache(SymbolIndex)
+        loads = []
+
+        async def load_rows():
+            loads.append(1)
+            await asyncio.sleep(0.01)
+            return [definition("alpha")]
+
+        await asyncio.gather(*[cache.get("r", "c1", load_rows) for _ in range(5)])
+        return len(loads)
+
+    assert asyncio.run(run()) == 1
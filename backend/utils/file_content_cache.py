@@ -0,0 +1,113 @@
+"""Process-wide LRU cache of repository file contents shared by the agent and chat read_file tools."""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from core.logger import logger_instance
+
+
+# (repo_hash, commit_hash, repo-relative path)
+CacheKey = Tuple[str, str, str]
+
+
+class FileContentCache:
+    """
+    Size-bounded LRU cache of decoded file contents keyed by (repo_hash, commit, path).
+
+    A commit pins the file contents, so entries never need revalidation against the
+    disk; a new ingest produces new keys and drops those of older commits with
+    ``invalidate``. Reads without a commit bypass the cache.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entry_bytes: int = 2 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[CacheKey, Tuple[str, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return os.path.normpath(path).replace(os.sep, "/").lstrip("/")
+
+    def read_text(self, repo_hash: str, commit_hash: Optional[str], repo_path: str, rel_path: str) -> str:
+        """
+        Return the UTF-8 contents of ``rel_path`` inside ``repo_path``, serving repeats from memory.
+
+        Args:
+            repo_hash: Hash identifying the repository
+            commit_hash: Commit the checkout at ``repo_path`` corresponds to; None disables caching
+            repo_path: Root directory of the checkout
+            rel_path: Path of the file relative to ``repo_path``
+
+        Returns:
+            The file contents. Raises the same errors as ``open``/``decode`` on a miss.
+        """
+        rel_path = self._normalize(rel_path)
+        if not commit_hash:
+            return self._read_from_disk(os.path.join(repo_path, rel_path))[0]
+
+        key = (repo_hash, commit_hash, rel_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        content, size = self._read_from_disk(os.path.join(repo_path, rel_path))
+        if size <= self.max_entry_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = (content, size)
+                    self._size += size
+                    self._evict()
+        return content
+
+    def _read_from_disk(self, path: str) -> Tuple[str, int]:
+        with open(path, "rb") as f:
+            data = f.read()
+        return data.decode("utf-8"), len(data)
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+
+    def invalidate(self, repo_hash: str, keep_commit: Optional[str] = None) -> None:
+        """Drop cached files of ``repo_hash``, except those belonging to ``keep_commit``."""
+        with self._lock:
+            stale = [k for k in self._entries if k[0] == repo_hash and k[1] != keep_commit]
+            for key in stale:
+                self._size -= self._entries.pop(key)[1]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+            }
+
+    def log_stats(self, context: str = "") -> None:
+        stats = self.stats()
+        logger_instance.info(
+            f"File content cache{' (' + context + ')' if context else ''}: "
+            f"hit_rate={stats['hit_rate']} hits={stats['hits']} misses={stats['misses']} "
+            f"evictions={stats['evictions']} entries={stats['entries']} size={stats['size_bytes']}B"
+        )
+
+
+# Single cache per worker process
+file_content_cache = FileContentCache()
@@ -0,0 +1,146 @@
+"""Per-repository progress events for ingest runs, consumed by the SSE progress endpoint."""
+
+import asyncio
+import heapq
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+
+# Terminal events; a subscriber's stream ends after one of these
+DONE_EVENT = "done"
+ERROR_EVENT = "error"
+# High-volume events (one per streamed token or per file); only the most recent are replayed
+TRANSIENT_EVENTS = {"agent_delta", "file_role"}
+
+
+class _Channel:
+    def __init__(self, history_size: int):
+        # Stage, agent and terminal events: few per ingest, always replayed in full
+        self.milestones: List[Dict[str, Any]] = []
+        self.transient: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.next_id = 1
+        self.finished = False
+        self.condition = asyncio.Condition()
+
+    def history(self) -> List[Dict[str, Any]]:
+        # Both buffers are in id order; merge them into one replay
+        return list(heapq.merge(self.milestones, list(self.transient), key=lambda item: item["id"]))
+
+
+class IngestProgressHub:
+    """
+    In-process publish/subscribe of ingest progress, one channel per repo_hash.
+
+    Events are kept per repo, so a client that reconnects (sending the last event id it
+    saw) resumes where it left off instead of restarting the ingest. Stage, agent and
+    terminal events are all kept; of the high-volume ``TRANSIENT_EVENTS`` only the last
+    ``history_size`` are, so token streaming cannot push the milestones out. A finished
+    channel is dropped ``finished_ttl_seconds`` after its terminal event. ``publish`` may
+    be called from worker threads; events are then handed to the event loop thread-safely. Channels live in the worker process that runs the
+    ingest, so progress clients must reach the same worker.
+    """
+
+    def __init__(self, history_size: int = 5000, finished_ttl_seconds: float = 300.0):
+        self.history_size = history_size
+        self.finished_ttl_seconds = finished_ttl_seconds
+        self._channels: Dict[str, _Channel] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self, repo_hash: str) -> None:
+        """Open a fresh channel for a new ingest of repo_hash."""
+        self._loop = asyncio.get_running_loop()
+        self._channels[repo_hash] = _Channel(self.history_size)
+
+    def is_running(self, repo_hash: str) -> bool:
+        channel = self._channels.get(repo_hash)
+        return channel is not None and not channel.finished
+
+    def has_channel(self, repo_hash: str) -> bool:
+        return repo_hash in self._channels
+
+    def publish(self, repo_hash: str, event: str, /, **data: Any) -> None:
+        """Record an event for repo_hash and wake its subscribers. No-op without a channel."""
+        if repo_hash not in self._channels:
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._append(repo_hash, event, data)
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._append, repo_hash, event, data)
+
+    def finish(self, repo_hash: str, event: str = DONE_EVENT, /, **data: Any) -> None:
+        """Publish the terminal event of the current ingest."""
+        self.publish(repo_hash, event, **data)
+
+    def _append(self, repo_hash: str, event: str, data: Dict[str, Any]) -> None:
+        channel = self._channels.get(repo_hash)
+        if channel is None or channel.finished:
+            return
+        item = {"id": channel.next_id, "event": event, "data": {**data, "ts": time.time()}}
+        (channel.transient if event in TRANSIENT_EVENTS else channel.milestones).append(item)
+        channel.next_id += 1
+        if event in (DONE_EVENT, ERROR_EVENT):
+            channel.finished = True
+            # Late reconnects can still replay the outcome for a while
+            asyncio.get_running_loop().call_later(self.finished_ttl_seconds, self._evict, repo_hash, channel)
+        asyncio.ensure_future(self._notify(channel))
+
+    def _evict(self, repo_hash: str, channel: _Channel) -> None:
+        # A newer ingest of the same repo may have replaced the channel meanwhile
+        if self._channels.get(repo_hash) is channel:
+            del self._channels[repo_hash]
+
+    async def _notify(self, channel: _Channel) -> None:
+        async with channel.condition:
+            channel.condition.notify_all()
+
+    async def subscribe(
+        self, repo_hash: str, last_event_id: int = 0, keepalive_seconds: float = 15.0
+    ) -> AsyncIterator[str]:
+        """
+        Yield server-sent-event frames for repo_hash until its ingest finishes.
+
+        Args:
+            repo_hash: Repository whose ingest to follow
+            last_event_id: Id of the last event the client already has (0 for all)
+            keepalive_seconds: Idle interval after which an SSE comment is sent
+
+        Yields:
+            Encoded SSE frames ("id:", "event:", "data:" lines)
+        """
+        channel = self._channels.get(repo_hash)
+        if channel is None:
+            yield self._frame(0, ERROR_EVENT, {"error": f"No ingest in progress for {repo_hash}"})
+            return
+
+        cursor = last_event_id
+        while True:
+            for item in channel.history():
+                if item["id"] > cursor:
+                    cursor = item["id"]
+                    yield self._frame(item["id"], item["event"], item["data"])
+            if channel.finished:
+                return
+            timed_out = False
+            async with channel.condition:
+                # Events appended since the history pass are picked up without waiting
+                if channel.next_id - 1 <= cursor:
+                    try:
+                        await asyncio.wait_for(channel.condition.wait(), timeout=keepalive_seconds)
+                    except asyncio.TimeoutError:
+                        timed_out = True
+            if timed_out:
+                yield ": keep-alive\n\n"
+
+    @staticmethod
+    def _frame(event_id: int, event: str, data: Dict[str, Any]) -> str:
+        return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# Single hub per worker process
+ingest_progress = IngestProgressHub()
@@ -0,0 +1,50 @@
+"""Redis cache of LLM fixes of broken Mermaid diagrams, keyed by a hash of the broken source."""
+
+import hashlib
+from typing import Optional
+
+from core.clients import redis_client
+from core.logger import logger_instance
+
+
+# Bump when the offline validator changes so fixes it would now reject are not reused
+VALIDATOR_VERSION = "1"
+MERMAID_CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+
+class MermaidDiagramCache:
+    """
+    Maps the sha256 of a Mermaid source that failed validation to the source the LLM fixer
+    returned for it, so regenerated P2 output containing the same broken block is repaired
+    without another LLM call.
+
+    Validity itself is not cached: the offline validator is cheaper than a Redis round
+    trip. Redis failures are logged and treated as cache misses.
+    """
+
+    def __init__(self, ttl_seconds: int = MERMAID_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.logger = logger_instance
+
+    @staticmethod
+    def _key(source: str) -> str:
+        normalized = source.replace("\r\n", "\n").strip()
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"mermaid-fix:v{VALIDATOR_VERSION}:{digest}"
+
+    async def get_fix(self, source: str) -> Optional[str]:
+        try:
+            return await redis_client.get(self._key(source))
+        except Exception as e:
+            self.logger.error(f"Mermaid cache read failed: {e}")
+            return None
+
+    async def set_fix(self, source: str, fixed: str) -> None:
+        """Remember ``fixed`` as the repair of the broken ``source``."""
+        try:
+            await redis_client.set(self._key(source), fixed, ex=self.ttl_seconds)
+        except Exception as e:
+            self.logger.error(f"Mermaid cache write failed: {e}")
+
+
+mermaid_cache = MermaidDiagramCache()
@@ -2,12 +2,13 @@
 
 from __future__ import annotations
 
-from core.config import settings
 from core.logger import logger_instance
 from core.llm_clients import llm_client
-from typing import Optional, Tuple
-
-import httpx
+from app.modules.auto_generation.prompts import build_repo_context_messages
+from utils.mermaid_syntax import validate_mermaid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+from typing import Iterator, List, Optional, Tuple
 
 
 
@@ -20,36 +21,66 @@ class MermaidGenerationValidator:
         self.logger = logger_instance
 
     def generate_mermaid_diagram(
-        self, cursory_explanation: str, max_iterations: int = 10
+        self, cursory_explanation: str, max_iterations: int = 10, candidates: int = 1
     ) -> Tuple[str, bool]:
-        """Iteratively generate and validate Mermaid diagrams."""
+        """
+        Iteratively generate and validate Mermaid diagrams.
+
+        Each iteration requests ``candidates`` diagrams concurrently and validates them
+        offline as they arrive; the first valid one is returned without waiting for the
+        rest. Only when every candidate of an iteration fails is the one with the fewest
+        issues fed back into the next iteration, so with several candidates far fewer
+        sequential LLM round trips are needed in the worst case.
+
+        Args:
+            cursory_explanation: Project structure and file roles used as context
+            max_iterations: Number of generate and validate rounds before giving up
+            candidates: Diagrams requested concurrently per round (1 is fully sequential)
+
+        Returns:
+            (diagram, is_valid); the best failing diagram when none validated
+        """
 
         previous_error_code: Optional[str] = None
+        project_diagram = ""
         for iteration in range(1, max_iterations + 1):
             self.logger.info(
-                "Mermaid validation iteration %s/%s", iteration, max_iterations
-            )
-
-            project_diagram = self._generate_diagram_from_llm(
-                cursory_explanation, previous_error_code
+                "Mermaid validation iteration %s/%s with %s candidate(s)",
+                iteration,
+                max_iterations,
+                candidates,
             )
 
-            if project_diagram.startswith("Error:"):
-                self.logger.error("Diagram generation failed: %s", project_diagram)
-                return (project_diagram, False)
-
-            _, error_message = self._validate_mermaid_code(project_diagram)
-
-            if error_message is None or "error" not in error_message.lower():
-                self.logger.info(
-                    "Mermaid diagram validated successfully after %s iteration(s)",
-                    iteration,
+            failures: List[Tuple[int, str, str]] = []
+            generation_error: Optional[str] = None
+            with closing(
+                self._generate_candidates(
+                    cursory_explanation, previous_error_code, candidates
                 )
-                return (project_diagram, True)
-
+            ) as diagrams:
+                for diagram in diagrams:
+                    if diagram.startswith("Error:"):
+                        generation_error = diagram
+                        continue
+
+                    result = validate_mermaid(diagram)
+                    if result.is_valid:
+                        self.logger.info(
+                            "Mermaid diagram validated successfully after %s iteration(s)",
+                            iteration,
+                        )
+                        return (diagram, True)
+                    failures.append((len(result.issues), diagram, result.error_message))
+
+            if not failures:
+                self.logger.error("Diagram generation failed: %s", generation_error)
+                return (generation_error, False)
+
+            _, project_diagram, error_message = min(failures, key=lambda failure: failure[0])
             self.logger.error(
-                "Iteration %s: Mermaid validation failed: %s",
+                "Iteration %s: Mermaid validation failed for %s candidate(s); best: %s",
                 iteration,
+                len(failures),
                 error_message,
             )
             previous_error_code = self._build_error_context(
@@ -57,11 +88,34 @@ class MermaidGenerationValidator:
             )
 
         self.logger.error(
-            "Mermaid validation failed after %s iterations. Returning last diagram.",
+            "Mermaid validation failed after %s iterations. Returning best diagram.",
             max_iterations,
         )
         return (project_diagram, False)
 
+    def _generate_candidates(
+        self, cursory_explanation: str, previous_error_code: Optional[str], candidates: int
+    ) -> Iterator[str]:
+        """Yield candidate diagrams in the order they finish, requested concurrently."""
+
+        if candidates <= 1:
+            yield self._generate_diagram_from_llm(cursory_explanation, previous_error_code)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=candidates)
+        try:
+            futures = [
+                executor.submit(
+                    self._generate_diagram_from_llm, cursory_explanation, previous_error_code
+                )
+                for _ in range(candidates)
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # Once a candidate is accepted the slower requests are not waited for
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def _generate_diagram_from_llm(
         self, cursory_explanation: str, previous_error_code: Optional[str]
     ) -> str:
@@ -74,7 +128,8 @@ class MermaidGenerationValidator:
 
             diagram_response = llm_client.chat.completions.create(
                 model="anthropic/claude-3.7-sonnet",
-                messages=[
+                # Shared repo context first; the per-iteration error feedback goes last
+                messages=build_repo_context_messages(cursory_explanation) + [
                     {
                         "role": "system",
                         "content": (
@@ -98,49 +153,13 @@ class MermaidGenerationValidator:
         except Exception as exc:
             return f"Error: {exc}"
 
-    def _validate_mermaid_code(self, mermaid_code: str) -> Tuple[bool, Optional[str]]:
-        """Validate Mermaid diagram syntax via the frontend validation API."""
-
-        try:
-            frontend_url = settings.FRONTEND_BASE_URL
-            validation_url = f"{frontend_url}/api/mermaid/validate"
-            self.logger.info("Validating Mermaid diagram via %s", validation_url)
-
-            with httpx.Client(timeout=30.0) as client:
-                response = client.post(
-                    validation_url,
-                    json={"mermaidCode": mermaid_code},
-                    headers={"Content-Type": "application/json"},
-                )
-
-            if response.status_code == 200:
-                result = response.json()
-                is_valid = result.get("isValid", False)
-                error_message = result.get("error") if not is_valid else None
-                return (is_valid, error_message)
-
-            self.logger.error(
-                "Validation API returned status %s: %s",
-                response.status_code,
-                response.text,
-            )
-            return (True, None)
-        except httpx.RequestError as exc:
-            self.logger.error("Error connecting to validation API: %s", exc)
-            return (True, None)
-        except Exception as exc:
-            self.logger.error("Unexpected error during validation: %s", exc)
-            return (True, None)
-
     def _build_diagram_prompt(
         self, cursory_explanation: str, previous_error_code: Optional[str]
     ) -> str:
         """Build the prompt used to request Mermaid diagrams from the LLM."""
 
         error_context = self._format_error_context(previous_error_code)
-        return f"""Based on the following project structure and file descriptions, create a Mermaid diagram showing the data flow and component interactions. Focus on the logical flow of data through the system.
-{error_context}Project Structure and File Roles:
-{cursory_explanation}
+        return f"""Based on the project structure and file descriptions given above, create a Mermaid diagram showing the data flow and component interactions. Focus on the logical flow of data through the system.
 
 Analyze the project structure and create a Mermaid flowchart that shows:
 
@@ -172,7 +191,8 @@ Analyze the project structure and create a Mermaid flowchart that shows:
 - Use hexagons [Node] for processing steps
 - Use diamonds [Node] for decision points
 
-Provide only the Mermaid diagram code, properly formatted and functional with enhanced styling."""
+Provide only the Mermaid diagram code, properly formatted and functional with enhanced styling.
+{error_context}"""
 
     def _cleanup_mermaid_response(self, project_diagram: str) -> str:
         """Remove Markdown code fences from Mermaid responses."""
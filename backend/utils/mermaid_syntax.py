@@ -0,0 +1,288 @@
+"""Offline syntax checks for Mermaid flowchart and sequence diagrams.
+
+This is not a full Mermaid grammar. It catches the mistakes the LLM keeps making
+(see ``previous_mermaid_mistakes_compressed``) without a round-trip to the frontend
+validator: the reserved ``end`` keyword, a space before ``:::``, parentheses,
+brackets or stray quotes inside node labels, and unbalanced blocks.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+
+FLOWCHART_HEADER = re.compile(r"^(graph|flowchart)(\s+(TB|TD|BT|RL|LR))?\s*;?$")
+OTHER_DIAGRAM_TYPES = (
+    "classDiagram", "stateDiagram", "stateDiagram-v2", "erDiagram", "gantt", "pie",
+    "journey", "mindmap", "gitGraph", "timeline", "quadrantChart", "requirementDiagram",
+    "C4Context", "sankey-beta", "xychart-beta", "block-beta", "architecture-beta",
+)
+
+# Node shape openers and their closers, longest openers first so "([" wins over "("
+NODE_SHAPES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("(((", (")))",)),
+    ("([", ("])",)),
+    ("[[", ("]]",)),
+    ("[(", (")]",)),
+    ("((", ("))",)),
+    ("{{", ("}}",)),
+    ("[/", ("/]", "\\]")),
+    ("[\\", ("\\]", "/]")),
+    ("(", (")",)),
+    ("[", ("]",)),
+    ("{", ("}",)),
+    (">", ("]",)),
+]
+LABEL_FORBIDDEN = set('()[]{}"')
+
+FLOWCHART_DIRECTIVES = ("classDef", "class", "style", "linkStyle", "click", "direction")
+IDENTIFIER = re.compile(r"[A-Za-z0-9_]+")
+CLASS_SUFFIX = re.compile(r":::([A-Za-z0-9_\-]*)")
+ARROW_TAIL = re.compile(r"(-->|---|==>|-\.->|--[ox]|<-->|==|-\.-)\s*$")
+
+SEQUENCE_BLOCK_OPENERS = ("loop", "alt", "opt", "par", "critical", "break", "rect", "box")
+SEQUENCE_KEYWORDS = (
+    "participant", "actor", "autonumber", "activate", "deactivate", "note", "else",
+    "and", "option", "title", "create", "destroy", "link", "links", "properties", "details",
+)
+SEQUENCE_MESSAGE = re.compile(r"^[^:]+?\s*(-->>|->>|-->|->|--x|-x|--\)|-\))\s*[+-]?[^:]+:")
+
+
+@dataclass
+class MermaidSyntaxIssue:
+    line: int
+    message: str
+    source: str = ""
+
+
+@dataclass
+class MermaidValidationResult:
+    issues: List[MermaidSyntaxIssue] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.issues
+
+    @property
+    def error_message(self) -> Optional[str]:
+        """Issues formatted like Mermaid's own "Parse error on line N" messages, None when valid."""
+        if self.is_valid:
+            return None
+        return "\n".join(
+            f"Parse error on line {issue.line}: {issue.message}\n{issue.source.strip()}"
+            for issue in self.issues
+        )
+
+
+def validate_mermaid(code: str) -> MermaidValidationResult:
+    """
+    Check a Mermaid diagram for the syntax errors the frontend renderer rejects most often.
+
+    Args:
+        code: Mermaid source without the surrounding code fence
+
+    Returns:
+        MermaidValidationResult listing every issue found (empty when the diagram passes)
+    """
+    result = MermaidValidationResult()
+    lines = _statement_lines(code)
+    if not lines:
+        result.issues.append(MermaidSyntaxIssue(1, "Empty diagram"))
+        return result
+
+    header_no, header = lines[0]
+    # One-line diagrams: "graph LR; A-->B" puts the first statements after the header
+    head, separator, rest = header.partition(";")
+    if separator and FLOWCHART_HEADER.match(head.strip()) and rest.strip():
+        header = head.strip()
+        lines.insert(1, (header_no, rest.strip()))
+    if FLOWCHART_HEADER.match(header):
+        _check_flowchart(lines[1:], result)
+    elif header == "sequenceDiagram":
+        _check_sequence(lines[1:], result)
+    elif header.split()[0] not in OTHER_DIAGRAM_TYPES:
+        result.issues.append(MermaidSyntaxIssue(header_no, f"Unknown diagram type '{header.split()[0]}'", header))
+    return result
+
+
+def _statement_lines(code: str) -> List[Tuple[int, str]]:
+    """Return (1-based line number, stripped text), skipping blanks, comments, directives and front matter."""
+    raw_lines = code.replace("\r\n", "\n").split("\n")
+    lines = []
+    in_front_matter = False
+    for number, raw in enumerate(raw_lines, start=1):
+        text = raw.strip()
+        if text == "---" and (in_front_matter or not lines):
+            in_front_matter = not in_front_matter
+            continue
+        if in_front_matter or not text or text.startswith("%%"):
+            continue
+        lines.append((number, text))
+    return lines
+
+
+# ----------------------------------------------------------------------
+# Flowcharts
+# ----------------------------------------------------------------------
+
+def _check_flowchart(lines: List[Tuple[int, str]], result: MermaidValidationResult) -> None:
+    open_subgraphs: List[Tuple[int, str]] = []
+    for number, text in lines:
+        statement = text.rstrip(";").strip()
+        keyword = statement.split()[0]
+
+        def issue(message: str) -> None:
+            result.issues.append(MermaidSyntaxIssue(number, message, text))
+
+        if statement == "end":
+            if not open_subgraphs:
+                issue("'end' without a matching subgraph")
+            else:
+                open_subgraphs.pop()
+            continue
+        if keyword == "subgraph":
+            open_subgraphs.append((number, text))
+            parts = statement.split()
+            if len(parts) > 1 and parts[1] == "end":
+                issue("'end' is a reserved word and cannot be used as a subgraph id")
+            continue
+        if keyword in FLOWCHART_DIRECTIVES:
+            _check_flowchart_directive(keyword, statement, issue)
+            continue
+        _check_flowchart_statement(statement, issue)
+
+    for number, text in open_subgraphs:
+        result.issues.append(MermaidSyntaxIssue(number, "subgraph is never closed with 'end'", text))
+
+
+def _check_flowchart_directive(keyword: str, statement: str, issue) -> None:
+    parts = statement.split()
+    if keyword == "classDef" and len(parts) > 1 and "end" in parts[1].split(","):
+        issue("'end' is a reserved word and cannot be used as a class name")
+    elif keyword == "class" and len(parts) > 2 and parts[2] == "end":
+        issue("'end' is a reserved word and cannot be used as a class name")
+
+
+def _check_flowchart_statement(statement: str, issue) -> None:
+    i = 0
+    length = len(statement)
+    while i < length:
+        char = statement[i]
+        if char == "|":
+            # Edge label: -->|text|
+            close = statement.find("|", i + 1)
+            if close == -1:
+                issue("Unclosed edge label '|'")
+                return
+            i = close + 1
+            continue
+        if char.isspace() and statement.startswith(":::", _skip_spaces(statement, i)):
+            issue("Unexpected space before ':::'")
+            return
+        match = IDENTIFIER.match(statement, i)
+        if not match:
+            i += 1
+            continue
+
+        node_id = match.group(0)
+        i = match.end()
+        shape = _match_shape(statement, i)
+        if shape is not None:
+            opener, closers = shape
+            i, error = _consume_label(statement, i + len(opener), closers)
+            if error:
+                issue(error)
+                return
+        class_match = CLASS_SUFFIX.match(statement, i)
+        # A bare id is a node when it ends the statement (or an "&" group) right after an arrow
+        bare_edge_target = shape is None and not class_match and (
+            not statement[i:].strip() or statement[i:].lstrip().startswith("&")
+        )
+        if node_id == "end" and (shape is not None or class_match or (
+            bare_edge_target and ARROW_TAIL.search(statement[:match.start()])
+        )):
+            issue("'end' is a reserved word and cannot be used as a node id")
+            return
+        if class_match:
+            if class_match.group(1) == "end":
+                issue("'end' is a reserved word and cannot be used as a class name")
+                return
+            i = class_match.end()
+            if _match_shape(statement, i) is not None:
+                issue("Missing separator between ':::class' and the next node")
+                return
+
+
+def _skip_spaces(text: str, i: int) -> int:
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return i
+
+
+def _match_shape(statement: str, i: int) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    for opener, closers in NODE_SHAPES:
+        if statement.startswith(opener, i):
+            return opener, closers
+    return None
+
+
+def _consume_label(statement: str, start: int, closers: Tuple[str, ...]) -> Tuple[int, Optional[str]]:
+    """Read a node label starting at ``start``; return (index after the closer, error or None)."""
+    if statement.startswith('"', start):
+        end_quote = statement.find('"', start + 1)
+        if end_quote == -1:
+            return len(statement), "Unclosed quote in node label"
+        after = end_quote + 1
+        for closer in closers:
+            if statement.startswith(closer, after):
+                return after + len(closer), None
+        return len(statement), "Quotes inside a node label must wrap the whole label"
+
+    positions = [(statement.find(closer, start), closer) for closer in closers]
+    positions = [(pos, closer) for pos, closer in positions if pos != -1]
+    if not positions:
+        return len(statement), f"Unclosed node label, expected '{closers[0]}'"
+    pos, closer = min(positions)
+    label = statement[start:pos]
+    bad = sorted(LABEL_FORBIDDEN.intersection(label))
+    if bad:
+        kind = "Quotes" if bad == ['"'] else "Parentheses or brackets"
+        return len(statement), (
+            f"{kind} inside node label '{label}' ({' '.join(bad)}); remove them or quote the whole label"
+        )
+    return pos + len(closer), None
+
+
+# ----------------------------------------------------------------------
+# Sequence diagrams
+# ----------------------------------------------------------------------
+
+def _check_sequence(lines: List[Tuple[int, str]], result: MermaidValidationResult) -> None:
+    open_blocks: List[Tuple[int, str]] = []
+    for number, text in lines:
+        keyword = text.split()[0]
+        lowered = keyword.lower()
+
+        if text == "end":
+            if not open_blocks:
+                result.issues.append(MermaidSyntaxIssue(number, "'end' without a matching block", text))
+            else:
+                open_blocks.pop()
+            continue
+        if lowered in SEQUENCE_BLOCK_OPENERS:
+            open_blocks.append((number, text))
+            continue
+        if lowered in SEQUENCE_KEYWORDS:
+            parts = text.split()
+            if lowered in ("participant", "actor") and len(parts) > 1 and parts[1] == "end":
+                result.issues.append(MermaidSyntaxIssue(
+                    number, "'end' is a reserved word and cannot be used as a participant", text
+                ))
+            continue
+        if not SEQUENCE_MESSAGE.match(text):
+            result.issues.append(MermaidSyntaxIssue(
+                number, "Expected a message like 'A->>B: text' or a sequence keyword", text
+            ))
+
+    for number, text in open_blocks:
+        result.issues.append(MermaidSyntaxIssue(number, "Block is never closed with 'end'", text))
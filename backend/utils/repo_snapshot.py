@@ -0,0 +1,160 @@
+"""Single-pass view of a repository checkout shared by every ingest stage."""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+
+# Number of leading bytes inspected when classifying a file as binary (same as git)
+BINARY_SNIFF_BYTES = 8000
+
+
+@dataclass
+class SnapshotEntry:
+    """A single file discovered during the scan, with lazily populated content data."""
+
+    rel_path: str
+    abs_path: str
+    size: int
+    mtime: float
+    content: Optional[bytes] = field(default=None, repr=False)
+    hash: Optional[str] = None
+    is_binary: Optional[bool] = None
+    token_count: Optional[int] = None
+    unreadable: bool = False
+
+
+class RepoSnapshot:
+    """
+    In-memory listing of a repository built with one ``os.scandir`` pass.
+
+    The snapshot records every file (path and stat info) and every directory
+    (its immediate children) up front. File contents are read at most once, on
+    first access, and the hash, binary classification and token count are all
+    derived from that single read and cached on the entry.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        ignore: Set[str],
+        hash_func: Callable[[bytes], str],
+    ):
+        self.root_dir = os.path.normpath(root_dir)
+        self.ignore = ignore
+        self._hash_func = hash_func
+        self.files: Dict[str, SnapshotEntry] = {}
+        # Directory relative path ("." for root) -> sorted names of non-ignored children
+        self.directories: Dict[str, List[str]] = {}
+
+    @classmethod
+    def scan(
+        cls,
+        root_dir: str,
+        ignore: Iterable[str],
+        hash_func: Callable[[bytes], str],
+    ) -> "RepoSnapshot":
+        """Walk ``root_dir`` once and return the populated snapshot."""
+        snapshot = cls(root_dir, set(ignore), hash_func)
+        snapshot._scan_dir(snapshot.root_dir, ".")
+        return snapshot
+
+    def _scan_dir(self, dir_path: str, rel_dir: str) -> None:
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(
+                    (e for e in it if e.name not in self.ignore), key=lambda e: e.name
+                )
+        except OSError:
+            self.directories[rel_dir] = []
+            return
+
+        self.directories[rel_dir] = [e.name for e in entries]
+        for entry in entries:
+            rel_path = entry.name if rel_dir == "." else f"{rel_dir}/{entry.name}"
+            try:
+                if entry.is_file():
+                    st = entry.stat()
+                    self.files[rel_path] = SnapshotEntry(
+                        rel_path=rel_path,
+                        abs_path=entry.path,
+                        size=st.st_size,
+                        mtime=st.st_mtime,
+                    )
+                elif entry.is_dir():
+                    self._scan_dir(entry.path, rel_path)
+            except OSError:
+                continue
+
+    # ------------------------------------------------------------------
+    # Path helpers
+    # ------------------------------------------------------------------
+
+    def rel_path(self, path: str) -> str:
+        """Return the snapshot key for an absolute or repo-relative path."""
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.root_dir)
+        return os.path.normpath(path).replace(os.sep, "/")
+
+    def abs_path(self, rel_path: str) -> str:
+        return os.path.join(self.root_dir, rel_path)
+
+    def get(self, path: str) -> Optional[SnapshotEntry]:
+        return self.files.get(self.rel_path(path))
+
+    def iter_files(self) -> Iterator[SnapshotEntry]:
+        return iter(self.files.values())
+
+    @property
+    def file_count(self) -> int:
+        return len(self.files)
+
+    # ------------------------------------------------------------------
+    # Lazily cached content data
+    # ------------------------------------------------------------------
+
+    def _load(self, entry: SnapshotEntry) -> Optional[bytes]:
+        if entry.content is None and not entry.unreadable:
+            try:
+                with open(entry.abs_path, "rb") as f:
+                    entry.content = f.read()
+            except OSError:
+                entry.unreadable = True
+                return None
+            entry.is_binary = b"\0" in entry.content[:BINARY_SNIFF_BYTES]
+            entry.hash = self._hash_func(entry.content)
+        return entry.content
+
+    def read_bytes(self, path: str) -> Optional[bytes]:
+        """Return file bytes, reading from disk only on first access."""
+        entry = self.get(path)
+        if entry is None:
+            return None
+        return self._load(entry)
+
+    def read_text(self, path: str) -> Optional[str]:
+        data = self.read_bytes(path)
+        if data is None:
+            return None
+        return data.decode("utf-8", errors="ignore")
+
+    def file_hash(self, path: str) -> Optional[str]:
+        entry = self.get(path)
+        if entry is None:
+            return None
+        self._load(entry)
+        return entry.hash
+
+    def is_binary(self, path: str) -> bool:
+        entry = self.get(path)
+        if entry is None:
+            return False
+        self._load(entry)
+        return bool(entry.is_binary)
+
+    def release_contents(self) -> None:
+        """Drop cached file bytes once the ingest no longer needs them."""
+        for entry in self.files.values():
+            entry.content = None
@@ -26,7 +26,7 @@ export default function PageView() {
   const params = useParams();
   const pageId = params.pageId as string;
   const repoId = params.repoId as string;
-  const { findMatches } = useDefinitions(repoId);
+  const { findMatches, searchMentions } = useDefinitions(repoId);
   const { currentPage, loading, error, savePage } = usePageData(pageId);
 
   // Page state
@@ -419,6 +419,7 @@ export default function PageView() {
                       className={getMarginClass(block.type)}
                       repoId={repoId}
                       findMatches={findMatches}
+                      searchMentions={searchMentions}
 
                       // Autocompletion caret and ghost props
                       blockIndex={index}
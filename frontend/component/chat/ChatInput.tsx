@@ -4,7 +4,7 @@ import React, { useRef, useEffect, useState } from 'react';
 import { Send, Network, Brain, FileText, Code, FunctionSquare } from 'lucide-react';
 import { Button } from '@/components/ui/button';
 import { Textarea } from '@/components/ui/textarea';
-import { useDefinitions } from '@/hooks/useDefinitions';
+import { useDefinitions, extractMentions } from '@/hooks/useDefinitions';
 
 interface ChatInputProps {
   inputValue: string;
@@ -47,7 +47,12 @@ export const ChatInput: React.FC<ChatInputProps> = ({
   const [mentionQuery, setMentionQuery] = useState('');
   const [selectedIndex, setSelectedIndex] = useState(0);
 
-  const { findMatches } = useDefinitions(repoId || '');
+  const { findMatches, searchMentions } = useDefinitions(repoId || '');
+
+  // Look up every @mention in the input and the one being typed; findMatches only reads the results
+  useEffect(() => {
+    searchMentions([...extractMentions(inputValue), mentionQuery]);
+  }, [inputValue, mentionQuery, searchMentions]);
 
   // Find all @mentions in the input that match definitions
   const getMatchedMentions = () => {
@@ -5,6 +5,7 @@ import { Input } from '@/components/ui/input';
 import { Textarea } from '@/components/ui/textarea';
 import { cn } from '@/lib/utils';
 import { DefinitionMentionDropdown } from '@/component/page_components/DefinitionMentionDropdown';
+import { extractMentions } from '@/hooks/useDefinitions';
 import { X, Undo } from 'lucide-react';
 
 export type BlockType = 'h1' | 'h2' | 'h3' | 'text' | 'code' | 'command';
@@ -49,6 +50,7 @@ interface SingleLineMarkdownBlockProps {
   className?: string;
   repoId?: string;
   findMatches?: (query: string) => Definition[];
+  searchMentions?: (queries: string[]) => void;
   onCommandSubmit?: (value: string) => void;
   commandState?: { loading: boolean; error: string | null; insertedCount?: number };
   onClose?: () => void;
@@ -83,6 +85,7 @@ export function SingleLineMarkdownBlock({
   className,
   repoId,
   findMatches,
+  searchMentions,
   onCommandSubmit,
   commandState,
   onClose,
@@ -114,6 +117,12 @@ export function SingleLineMarkdownBlock({
   const prevLoadingRef = useRef<boolean>(false);
   const prevContentRef = useRef(content);
   const [ghostExtraHeight, setGhostExtraHeight] = useState(0);
+
+  // Look up every @mention in the block and the one being typed; findMatches only reads the results
+  useEffect(() => {
+    if (!repoId || !searchMentions) return;
+    searchMentions([...extractMentions(content), mentionQuery]);
+  }, [repoId, content, mentionQuery, searchMentions]);
   
   // Sync overlay heights and compute ghost extra height
   useEffect(() => {
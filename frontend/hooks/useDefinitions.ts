@@ -1,4 +1,4 @@
-import { useState, useEffect, useMemo } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { autoGenerationApi } from '@/lib/api';
 
 interface Definition {
@@ -9,119 +9,142 @@ interface Definition {
   file_name: string;
 }
 
-interface CachedDefinitions {
-  definitions: Definition[];
-  timestamp: number;
-}
+const SEARCH_DEBOUNCE_MS = 200;
+const SEARCH_LIMIT = 10;
+const MAX_RESULTS = 5;
+const MAX_CACHED_QUERIES = 500;
+
+// Search results shared by every hook instance, keyed by repo and query, so a mention
+// resolved while typing in one component is already known to the one that sends it
+const searchCache = new Map<string, Definition[]>();
+const listeners = new Set<() => void>();
+
+const cacheKey = (repoId: string, query: string) => `${repoId}\u0000${query}`;
+
+const storeResults = (key: string, results: Definition[]) => {
+  if (searchCache.size >= MAX_CACHED_QUERIES) {
+    // Maps iterate in insertion order: drop the oldest query
+    const oldest = searchCache.keys().next().value;
+    if (oldest !== undefined) searchCache.delete(oldest);
+  }
+  searchCache.set(key, results);
+  listeners.forEach(listener => listener());
+};
+
+// Results of the longest already-searched prefix, narrowed locally while the search runs
+const narrowFromPrefix = (repoId: string, searchTerm: string): Definition[] => {
+  for (let end = searchTerm.length - 1; end > 0; end--) {
+    const cached = searchCache.get(cacheKey(repoId, searchTerm.slice(0, end)));
+    if (cached) {
+      return cached.filter(def => def.node_name.toLowerCase().includes(searchTerm));
+    }
+  }
+  return [];
+};
 
-const CACHE_KEY_PREFIX = 'definitions_cache_';
-const CACHE_DURATION_MS = 60 * 60 * 1000; // 1 hour
+const dedupe = (results: Definition[]): Definition[] => {
+  const unique = new Map<string, Definition>();
+  results.forEach(def => {
+    const key = `${def.node_type}-${def.node_name}-${def.file_name}`;
+    if (!unique.has(key)) unique.set(key, def);
+  });
+  return Array.from(unique.values()).slice(0, MAX_RESULTS);
+};
+
+// Names mentioned as @name in a text, in order
+export const extractMentions = (text: string): string[] => {
+  const mentions: string[] = [];
+  const regex = /@([\w.]+)/g;
+  let match: RegExpExecArray | null;
+  while ((match = regex.exec(text)) !== null) {
+    mentions.push(match[1]);
+  }
+  return mentions;
+};
 
 export const useDefinitions = (repoId: string) => {
-  const [definitions, setDefinitions] = useState<Definition[]>([]);
+  const [version, setVersion] = useState(0);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const timerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
+  const pendingRef = useRef(new Set<string>());
+  const inFlight = useRef(new Set<string>());
 
-  const cacheKey = `${CACHE_KEY_PREFIX}${repoId}`;
-
-  // Load definitions from cache or API
+  // Re-render when any instance stores new results
   useEffect(() => {
-    const loadDefinitions = async () => {
-      if (!repoId) return;
-
-      setIsLoading(true);
-      setError(null);
-
-      try {
-        // Check local storage first
-        const cached = localStorage.getItem(cacheKey);
-        if (cached) {
-          const cachedData: CachedDefinitions = JSON.parse(cached);
-          const now = Date.now();
-
-          // Check if cache is still valid (less than 1 hour old)
-          if (now - cachedData.timestamp < CACHE_DURATION_MS) {
-            setDefinitions(cachedData.definitions);
-            setIsLoading(false);
-            return;
-          }
-        }
-
-        // Fetch from API if no cache or cache is expired
-        const freshDefinitions = await autoGenerationApi.getDefinitions(repoId);
-
-        // Update state
-        setDefinitions(freshDefinitions);
-
-        // Update cache
-        const cacheData: CachedDefinitions = {
-          definitions: freshDefinitions,
-          timestamp: Date.now(),
-        };
-        localStorage.setItem(cacheKey, JSON.stringify(cacheData));
-
-      } catch (err) {
-        console.error('Failed to load definitions:', err);
-        setError(err instanceof Error ? err.message : 'Failed to load definitions');
-      } finally {
-        setIsLoading(false);
-      }
+    const listener = () => setVersion(v => v + 1);
+    listeners.add(listener);
+    const pending = pendingRef.current;
+    return () => {
+      listeners.delete(listener);
+      if (timerRef.current) clearTimeout(timerRef.current);
+      timerRef.current = null;
+      // Nothing is scheduled any more, so these can be requested again after a remount
+      pending.clear();
     };
-
-    loadDefinitions();
-  }, [repoId, cacheKey]);
-
-  // Lexical matching function
-  const findMatches = useMemo(() => (query: string): Definition[] => {
-    if (!query.trim() || definitions.length === 0) return [];
-
-    const searchTerm = query.toLowerCase().trim();
-
-    // Score each definition based on lexical similarity
-    const scored = definitions.map(def => {
-      const nodeName = def.node_name.toLowerCase();
-      const fileName = def.file_name.toLowerCase();
-
-      let score = 0;
-
-      // Exact match gets highest score
-      if (nodeName === searchTerm) score += 100;
-    //   else if (fileName === searchTerm) score += 90;
-
-      // Starts with gets high score
-      else if (nodeName.startsWith(searchTerm)) score += 80;
-    //   else if (fileName.startsWith(searchTerm)) score += 70;
-
-      // Contains gets medium score
-      else if (nodeName.includes(searchTerm)) score += 60;
-    //   else if (fileName.includes(searchTerm)) score += 50;
-
-
-      return { definition: def, score };
-    });
-
-    // Sort by score descending, deduplicate, and return top 7
-    const uniqueResults = new Map();
-    
-    scored
-      .filter(item => item.score > 0)
-      .sort((a, b) => b.score - a.score)
-      .forEach(item => {
-        const key = `${item.definition.node_type}-${item.definition.node_name}-${item.definition.file_name}`;
-        if (!uniqueResults.has(key) || uniqueResults.get(key).score < item.score) {
-          uniqueResults.set(key, item);
-        }
+  }, []);
+
+  const search = useCallback(async (searchTerm: string) => {
+    const key = cacheKey(repoId, searchTerm);
+    if (inFlight.current.has(key)) return;
+    inFlight.current.add(key);
+    setIsLoading(true);
+    setError(null);
+    try {
+      // The server ranks by exact, prefix, then substring match on the definitions index
+      const results = await autoGenerationApi.searchDefinitions(repoId, searchTerm, SEARCH_LIMIT);
+      storeResults(key, results);
+    } catch (err) {
+      console.error('Failed to search definitions:', err);
+      setError(err instanceof Error ? err.message : 'Failed to search definitions');
+    } finally {
+      inFlight.current.delete(key);
+      setIsLoading(inFlight.current.size > 0);
+    }
+  }, [repoId]);
+
+  // Schedules a debounced search for each query not known yet. Call it from effects or
+  // event handlers, never during render; results re-render every instance when they arrive
+  const searchMentions = useCallback((queries: string[]) => {
+    if (!repoId) return;
+    const pending = pendingRef.current;
+    const requested = new Set(queries.map(query => query.toLowerCase().trim()));
+    let added = false;
+    requested.forEach(searchTerm => {
+      if (!searchTerm || pending.has(searchTerm) || searchCache.has(cacheKey(repoId, searchTerm))) return;
+      // A longer query supersedes the keystrokes typed before it, not other mentions
+      pending.forEach(term => {
+        if (searchTerm.startsWith(term) && !requested.has(term)) pending.delete(term);
       });
+      pending.add(searchTerm);
+      added = true;
+    });
+    if (!added) return;
+    if (timerRef.current) clearTimeout(timerRef.current);
+    timerRef.current = setTimeout(() => {
+      timerRef.current = null;
+      const terms = Array.from(pending);
+      pending.clear();
+      terms.forEach(term => search(term));
+    }, SEARCH_DEBOUNCE_MS);
+  }, [repoId, search]);
+
+  // Pure lookup, safe during render: the results known for the query, or those of its
+  // longest searched prefix narrowed locally until its own search (see searchMentions) lands
+  const findMatches = useCallback((query: string): Definition[] => {
+    const searchTerm = query.toLowerCase().trim();
+    if (!repoId || !searchTerm) return [];
 
-    return Array.from(uniqueResults.values())
-      .slice(0, 5)
-      .map(item => item.definition);
-  }, [definitions]);
+    const cached = searchCache.get(cacheKey(repoId, searchTerm));
+    if (cached) return dedupe(cached);
+    return dedupe(narrowFromPrefix(repoId, searchTerm));
+    // version: a new identity when results arrive, so memoized consumers re-run it
+  }, [repoId, version]);
 
   return {
-    definitions,
     isLoading,
     error,
     findMatches,
+    searchMentions,
   };
 };
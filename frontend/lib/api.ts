@@ -307,6 +307,11 @@ export const autoGenerationApi = {
   getDefinitions: async (repoHash: string): Promise<any[]> => {
     return apiRequest(`/auto-generation/definitions/${encodeURIComponent(repoHash)}`);
   },
+  // Fuzzy search definitions by name on the server (for repos too large to filter client-side)
+  searchDefinitions: async (repoHash: string, query: string, limit = 10): Promise<any[]> => {
+    const params = new URLSearchParams({ q: query, limit: String(limit) });
+    return apiRequest(`/auto-generation/definitions/${encodeURIComponent(repoHash)}/search?${params.toString()}`);
+  },
 };
 
 export const mermaidApi = {